@@ -0,0 +1,328 @@
+"""Benchmarks of the speed and accuracy of confitti.
+
+Run from the root of the repository with
+
+    python benchmarks/bench_confitti.py [--quick] [--json FILE] [--compare FILE]
+
+Each benchmark reports the time per call and, for the fits, how well
+the parameters of the synthetic conics are recovered, so that changes
+that make things faster cannot silently make the fits worse. Save the
+results of one run with --json and compare a later run against them
+with --compare, which lists any case that has become more than
+--tolerance slower or less accurate, and exits with status 1 if there
+are any.
+
+The synthetic conics have points spread over part of the curve on
+either side of the apex, with gaussian noise in x and y. They are
+rotated to the same 12 orientations used in demo05, as well as to
+orientations where theta0 is just either side of 0 and 360 degrees.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import confitti
+
+# Orientations of the axis (degrees): those of demo05, plus some near
+# to where theta0 wraps around
+ORIENTATIONS = list(-3.0 + np.arange(12) * 30) + [-0.5, 0.5, 359.5, 179.5]
+
+# Eccentricities of the synthetic conics: ellipse, parabola, hyperbola
+ECCENTRICITIES = {"ellipse": 0.6, "parabola": 1.0, "hyperbola": 1.5}
+
+
+def make_conic_points(rng, npts, theta0, eccentricity=1.0, noise=0.02, r0=1.0):
+    """
+    Points along a conic with focus at a random position, scale r0 and
+    axis angle theta0 (degrees), with gaussian noise of noise * r0.
+    The points cover 60% of the angular range of the curve on either
+    side of the axis. Returns x, y and a dict of the true parameters.
+    """
+    x0, y0 = rng.uniform(-10.0, 10.0, 2)
+    e = eccentricity
+    thmax = np.pi if e < 1 else np.pi - np.arctan(np.sqrt(e**2 - 1))
+    th = np.sort(rng.uniform(-0.6 * thmax, 0.6 * thmax, npts))
+    r = r0 * (1 + e) / (1 + e * np.cos(th))
+    phi = np.deg2rad(theta0) + th
+    x = x0 + r * np.cos(phi) + noise * r0 * rng.normal(size=npts)
+    y = y0 + r * np.sin(phi) + noise * r0 * rng.normal(size=npts)
+    truth = dict(zip(confitti.PARAM_NAMES, (x0, y0, r0, theta0, e)))
+    return x, y, truth
+
+
+def recovery_errors(params, truth):
+    """
+    Errors in the recovered parameters: distance of the apex and of the
+    focus from the true ones, in units of the true r0, relative error in
+    the radius of curvature at the apex, the angle error (degrees,
+    allowing for wrap-around) and the eccentricity error
+    """
+    p = [params[k] for k in confitti.PARAM_NAMES]
+    t = [truth[k] for k in confitti.PARAM_NAMES]
+    d = confitti.conic_derived_quantities(np.array([p, t]))
+    r0 = truth["r0"]
+    return {
+        "apex": np.hypot(*(d[k][0] - d[k][1] for k in ("x_apex", "y_apex"))) / r0,
+        "focus": np.hypot(p[0] - t[0], p[1] - t[1]) / r0,
+        "curvature": abs(d["r_curvature"][0] / d["r_curvature"][1] - 1),
+        "theta0": abs((p[3] - t[3] + 180.0) % 360.0 - 180.0),
+        "eccentricity": abs(p[4] - t[4]),
+    }
+
+
+def time_call(func, min_time=0.2, max_repeat=1000):
+    """
+    Median wall time per call of func(), repeating until min_time has
+    elapsed (or max_repeat calls). Returns the time and the last return
+    value of func.
+    """
+    times = []
+    start = time.perf_counter()
+    while len(times) < max_repeat:
+        t = time.perf_counter()
+        value = func()
+        times.append(time.perf_counter() - t)
+        if t - start > min_time:
+            break
+    return float(np.median(times)), value
+
+
+class Report:
+    """Collects the results of each benchmark case and prints them"""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, section, case, seconds, **accuracy):
+        row = {"section": section, "case": case, "seconds": seconds, **accuracy}
+        self.rows.append(row)
+        extra = "  ".join(f"{k}={v:.3g}" for (k, v) in accuracy.items())
+        print(
+            f"{section:<22} {case:<32} {1e3 * seconds:12.4f} ms  {extra}", flush=True
+        )
+
+
+def bench_import(report, budget):
+    """Time a fresh `import confitti` in a subprocess"""
+    code = (
+        "import time; t = time.perf_counter(); import confitti; "
+        "print(time.perf_counter() - t)"
+    )
+    command = [sys.executable, "-c", code]
+    times = [
+        float(
+            subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        )
+        for _ in range(5)
+    ]
+    seconds = min(times)
+    report.add("import", "import confitti", seconds, budget=budget)
+    return seconds <= budget
+
+
+def bench_residual(report, rng, sizes):
+    pars = confitti.init_conic_from_xy(*make_conic_points(rng, 10, 30.0)[:2])
+    import lmfit
+
+    params = lmfit.create_params(**pars)
+    for n in sizes:
+        x, y, _ = make_conic_points(rng, n, 30.0)
+        seconds, _ = time_call(lambda: confitti.residual(params, x, y))
+        report.add("residual", f"n={n}", seconds)
+        p = [pars[k] for k in confitti.PARAM_NAMES]
+        out, work = np.empty(n), np.empty((2, n))
+        seconds, _ = time_call(
+            lambda: confitti.conic_residual(p, x, y, out=out, work=work)
+        )
+        report.add("conic_residual", f"n={n}", seconds)
+
+
+def bench_init(report, rng, sizes):
+    for n in sizes:
+        x, y, _ = make_conic_points(rng, n, 30.0)
+        seconds, _ = time_call(lambda: confitti.init_conic_from_xy(x, y))
+        report.add("init_conic_from_xy", f"n={n}", seconds)
+
+
+def bench_fit(report, rng, sizes, noise=0.02):
+    """Single fits over all orientations, for each type of conic"""
+    for kind, e in ECCENTRICITIES.items():
+        only_parabola = kind == "parabola"
+        for n in sizes:
+            seconds, errors = [], []
+            for theta0 in ORIENTATIONS:
+                x, y, truth = make_conic_points(rng, n, theta0, e, noise)
+                t, result = time_call(
+                    lambda: confitti.fit_conic_to_xy(x, y, only_parabola=only_parabola),
+                    min_time=0.0,
+                    max_repeat=1,
+                )
+                seconds.append(t)
+                errors.append(recovery_errors(result.params.valuesdict(), truth))
+            # Median error over the orientations, and also the worst
+            # apex error, which shows up any orientation that fails
+            accuracy = {
+                k: float(np.median([err[k] for err in errors])) for k in errors[0]
+            }
+            accuracy["worst_apex"] = float(max(err["apex"] for err in errors))
+            report.add(f"fit {kind}", f"n={n}", float(np.median(seconds)), **accuracy)
+
+
+def bench_batch(report, rng, batch_sizes, npts=30, noise=0.02):
+    """Many fits at once, with fit_conics_batch() and fit_many()"""
+    for nsets in batch_sizes:
+        data = [
+            make_conic_points(rng, npts, rng.choice(ORIENTATIONS), 1.0, noise)
+            for _ in range(nsets)
+        ]
+        xs, ys, truths = zip(*data)
+        start = time.perf_counter()
+        catalog = confitti.fit_conics_batch(xs, ys)
+        seconds = (time.perf_counter() - start) / nsets
+        apex = [
+            recovery_errors(row.params, truth)["apex"]
+            for row, truth in zip(catalog, truths)
+        ]
+        report.add(
+            "fit_conics_batch",
+            f"N={nsets} (per fit)",
+            seconds,
+            apex=float(np.median(apex)),
+        )
+        if nsets <= 1000:
+            start = time.perf_counter()
+            results = dict(confitti.fit_many(zip(xs, ys)))
+            seconds = (time.perf_counter() - start) / nsets
+            apex = [
+                recovery_errors(results[i].params, truths[i])["apex"]
+                for i in range(nsets)
+            ]
+            report.add(
+                "fit_many", f"N={nsets} (per fit)", seconds, apex=float(np.median(apex))
+            )
+
+
+def bench_curves(report, rng, batch_sizes):
+    params = dict(zip(confitti.PARAM_NAMES, (0.0, 0.0, 1.0, 30.0, 0.8)))
+    seconds, _ = time_call(lambda: confitti.XYconic(**params))
+    report.add("XYconic", "construct", seconds)
+    seconds, _ = time_call(lambda: confitti.XYconic(**params).x_pts)
+    report.add("XYconic", "construct + x_pts", seconds)
+    for n in batch_sizes:
+        P = np.column_stack(
+            [rng.normal(0, 1, n), rng.normal(0, 1, n), rng.uniform(0.5, 2, n),
+             rng.uniform(0, 360, n), rng.uniform(0.3, 1.8, n)]
+        )
+        seconds, _ = time_call(lambda: confitti.XYconics(P).x_pts)
+        report.add("XYconics", f"N={n} curves", seconds)
+
+
+def bench_io(report, rng, batch_sizes):
+    x, y, _ = make_conic_points(rng, 30, 30.0)
+    result = confitti.ConicFitResult(
+        confitti.fit_conic_to_xy(x, y, only_parabola=False)
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for suffix in ("json", "yaml"):
+            filename = str(Path(tmp) / f"result.{suffix}")
+            seconds, _ = time_call(lambda: result.write(filename))
+            report.add("ConicFitResult.write", suffix, seconds)
+            seconds, _ = time_call(lambda: confitti.ConicFitResult.read(filename))
+            report.add("ConicFitResult.read", suffix, seconds)
+        for n in batch_sizes:
+            catalog = confitti.ConicFitCatalog.from_results([result] * n)
+            filename = str(Path(tmp) / "catalog.npz")
+            seconds, _ = time_call(lambda: catalog.write(filename))
+            report.add("ConicFitCatalog.write", f"N={n} npz", seconds)
+            seconds, _ = time_call(
+                lambda: confitti.ConicFitCatalog.read(filename).x0.sum()
+            )
+            report.add("ConicFitCatalog.read", f"N={n} npz", seconds)
+
+
+def compare(rows, baseline_rows, tolerance):
+    """
+    List the cases that are slower, or less accurate, than in the
+    baseline by more than the fractional tolerance
+    """
+    baseline = {(r["section"], r["case"]): r for r in baseline_rows}
+    regressions = []
+    for row in rows:
+        old = baseline.get((row["section"], row["case"]))
+        if old is None:
+            continue
+        for k, v in row.items():
+            if k in ("section", "case", "budget") or k not in old:
+                continue
+            # Allow a little absolute slack for accuracies that are
+            # close to zero
+            slack = 0.0 if k == "seconds" else 1e-3
+            if v > old[k] * (1 + tolerance) + slack:
+                regressions.append(
+                    f"{row['section']} {row['case']}: {k} {old[k]:.4g} -> {v:.4g}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Smaller problem sizes")
+    parser.add_argument("--json", help="Save the results to this file")
+    parser.add_argument("--compare", help="Compare with the results saved in this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument(
+        "--import-budget",
+        type=float,
+        default=0.5,
+        help="Maximum time for `import confitti` (s)",
+    )
+    parser.add_argument("--seed", type=int, default=2024)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.quick:
+        point_sizes = [5, 100, 10_000]
+        fit_sizes = [5, 100, 1000]
+        batch_sizes = [1, 100, 1000]
+    else:
+        point_sizes = [5, 100, 1000, 10_000, 100_000]
+        fit_sizes = [5, 30, 100, 1000, 10_000, 100_000]
+        batch_sizes = [1, 10, 100, 1000, 10_000, 100_000]
+
+    report = Report()
+    import_ok = bench_import(report, args.import_budget)
+    bench_residual(report, rng, point_sizes)
+    bench_init(report, rng, point_sizes)
+    bench_fit(report, rng, fit_sizes)
+    bench_batch(report, rng, batch_sizes)
+    bench_curves(report, rng, batch_sizes)
+    bench_io(report, rng, batch_sizes)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report.rows, f, indent=1)
+    status = 0
+    if not import_ok:
+        print(f"\nImport time exceeds the budget of {args.import_budget} s")
+        status = 1
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report.rows, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regressions compared with {args.compare}:")
+            print("\n".join(regressions))
+            status = 1
+        else:
+            print(f"\nNo regressions compared with {args.compare}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
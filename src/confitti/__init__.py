@@ -1,7 +1,24 @@
-from importlib.metadata import version
 from .confitti import *
+from .catalog import *
+from .batch import *
+from .parallel import *
+from .sampling import *
+from .envelope import *
+from .uncertainty import *
+from .pipeline import *
+from .profiling import *
+from .tracking import *
+from .cache import *
 
-__version__ = version("confitti")
+
+def __getattr__(name):
+    # Look up the version only when it is asked for, since
+    # importlib.metadata is slow to import
+    if name == "__version__":
+        from importlib.metadata import version
+
+        return version("confitti")
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def hello() -> str:
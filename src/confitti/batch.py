@@ -0,0 +1,590 @@
+"""Fit conic section curves to many independent sets of points at once.
+
+Everything here works on padded 2d arrays, with one row per point set,
+so that the whole batch is handled by a few NumPy operations per
+iteration instead of one Python-level fit per point set.
+"""
+
+import time
+import numpy as np
+from .confitti import PARAM_NAMES, init_conic_from_xy
+from .catalog import ConicFitCatalog
+from . import profiling
+
+__all__ = [
+    "pad_point_sets",
+    "init_conics_from_xy",
+    "init_conic_multistart",
+    "init_conic_algebraic",
+    "fit_conics_algebraic",
+    "fit_conics_batch",
+]
+
+
+def pad_point_sets(xs, ys, eps=None):
+    """Pack a sequence of point sets into padded 2d arrays.
+
+    The point sets may be given either as ragged sequences of 1d
+    arrays or as 2d arrays with one row per set, in which case missing
+    points are indicated by NaN. Returns arrays X, Y, E of shape (nsets,
+    npts) together with a boolean mask that is True for real data
+    points. Padding points have X = Y = 0 and E = 1.
+    """
+    if isinstance(xs, np.ndarray) and xs.ndim == 2:
+        X = np.array(xs, dtype=float)
+        Y = np.array(ys, dtype=float)
+    else:
+        nsets = len(xs)
+        assert len(ys) == nsets
+        npts = max(len(x) for x in xs)
+        X = np.full((nsets, npts), np.nan)
+        Y = np.full((nsets, npts), np.nan)
+        for i, (x, y) in enumerate(zip(xs, ys)):
+            assert len(x) == len(y)
+            X[i, : len(x)] = x
+            Y[i, : len(y)] = y
+    mask = np.isfinite(X) & np.isfinite(Y)
+    E = np.ones_like(X)
+    if eps is not None:
+        if np.ndim(eps) == 0:
+            E[:] = eps
+        elif isinstance(eps, np.ndarray) and eps.ndim == 2:
+            E[:] = eps
+        else:
+            # Ragged sequence of per-set uncertainties, each of which
+            # may be an array or a scalar
+            for i, e in enumerate(eps):
+                E[i, : np.size(xs[i])] = e
+    X[~mask] = 0.0
+    Y[~mask] = 0.0
+    E[~mask] = 1.0
+    return X, Y, E, mask
+
+
+def _residual_batch(P, X, Y, E):
+    """
+    Conic residuals for many parameter vectors at once. P has shape
+    (nsets, 5) in the order of PARAM_NAMES, while X, Y, E are either 2d
+    arrays with one row per parameter vector, or 1d arrays of points
+    that are shared by all the parameter vectors.
+    """
+    x0, y0, r0, theta0, ecc = (P[:, [i]] for i in range(5))
+    theta0 = np.deg2rad(theta0)
+    dx = X - x0
+    dy = Y - y0
+    e_times_d = (1 + ecc) * r0 - ecc * (dx * np.cos(theta0) + dy * np.sin(theta0))
+    return (np.hypot(dx, dy) - e_times_d) / E
+
+
+def _jacobian_batch(P, X, Y, E, ivary):
+    """
+    Jacobian of _residual_batch() with respect to the parameters
+    listed in ivary. Returns an array of shape (nsets, npts, len(ivary)).
+    """
+    x0, y0, r0, theta0, ecc = (P[:, [i]] for i in range(5))
+    theta0 = np.deg2rad(theta0)
+    cth0 = np.cos(theta0)
+    sth0 = np.sin(theta0)
+    dx = X - x0
+    dy = Y - y0
+    r = np.hypot(dx, dy)
+    r = np.where(r > 0.0, r, 1.0)
+    columns = [
+        -dx / r - ecc * cth0,
+        -dy / r - ecc * sth0,
+        np.broadcast_to(-(1 + ecc), dx.shape),
+        ecc * (dy * cth0 - dx * sth0) * (np.pi / 180.0),
+        dx * cth0 + dy * sth0 - r0,
+    ]
+    return np.stack([columns[i] for i in ivary], axis=-1) / E[..., None]
+
+
+def init_conics_from_xy(X, Y, mask):
+    """
+    Vectorized version of init_conic_from_xy() for padded arrays of
+    point sets. Returns an array of shape (nsets, 5) of initial
+    parameters in the order of PARAM_NAMES.
+    """
+    n = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        x0 = np.where(mask, X, 0.0).sum(axis=1) / n
+        y0 = np.where(mask, Y, 0.0).sum(axis=1) / n
+    dx = X - x0[:, None]
+    dy = Y - y0[:, None]
+    r = np.where(mask, np.hypot(dx, dy), np.inf)
+    # Average radius and circular mean angle of the 5 closest points
+    kmax = min(5, r.shape[1])
+    closest = np.argpartition(r, kmax - 1, axis=1)[:, :kmax]
+    rc = np.take_along_axis(r, closest, axis=1)
+    th = np.arctan2(
+        np.take_along_axis(dy, closest, axis=1),
+        np.take_along_axis(dx, closest, axis=1),
+    )
+    r0 = rc.mean(axis=1)
+    theta0 = np.arctan2(np.sin(th).mean(axis=1), np.cos(th).mean(axis=1))
+    theta0 = np.rad2deg(theta0 % (2 * np.pi))
+    return np.stack([x0, y0, r0, theta0, np.ones_like(x0)], axis=1)
+
+
+def _bounds_batch(P0, X, Y, mask, restrict_xy, restrict_theta, allow_negative_theta):
+    """Lower and upper bounds on the parameters, same as fit_conic_to_xy()"""
+    lo = np.full_like(P0, -np.inf)
+    hi = np.full_like(P0, np.inf)
+    lo[:, 2] = 0.0
+    lo[:, 3] = -90.0 if allow_negative_theta else 0.0
+    hi[:, 3] = 360.0
+    lo[:, 4] = 0.0
+    if restrict_xy:
+        for i, A in enumerate([X, Y]):
+            amin = np.where(mask, A, np.inf).min(axis=1)
+            amax = np.where(mask, A, -np.inf).max(axis=1)
+            lo[:, i] = 2 * amin - amax
+            hi[:, i] = 2 * amax - amin
+    if restrict_theta:
+        lo[:, 3] = P0[:, 3] - 45.0
+        hi[:, 3] = P0[:, 3] + 45.0
+    return lo, hi
+
+
+def _levenberg_marquardt_batch(
+    P, X, Y, E, mask, ivary, lo, hi, max_iter=200, ftol=1.5e-8, xtol=1.5e-8
+):
+    """
+    Damped Gauss-Newton (Levenberg-Marquardt) minimization of the sum
+    of squared conic residuals, carried out simultaneously for all the
+    point sets. Parameter bounds are enforced by projecting each trial
+    step back into the box [lo, hi]. Returns the best-fit parameters,
+    the sum of squared residuals, the number of residual evaluations and
+    a convergence flag for each point set.
+    """
+    nsets = len(P)
+    P = P.copy()
+    f = np.where(mask, _residual_batch(P, X, Y, E), 0.0)
+    cost = np.sum(f**2, axis=1)
+    lam = np.full(nsets, 1e-3)
+    nu = np.full(nsets, 2.0)
+    nfev = np.ones(nsets, dtype=int)
+    converged = np.zeros(nsets, dtype=bool)
+    active = np.isfinite(cost) & np.all(np.isfinite(P), axis=1)
+    # The jacobian only changes when a step is accepted
+    J = np.zeros(X.shape + (len(ivary),))
+    need_jac = active.copy()
+    for _ in range(max_iter):
+        if not np.any(active):
+            break
+        k = np.flatnonzero(need_jac)
+        if len(k):
+            J[k] = _jacobian_batch(P[k], X[k], Y[k], E[k], ivary)
+            J[k] *= mask[k, :, None]
+        a = np.flatnonzero(active)
+        Ja = J[a]
+        JTJ = np.einsum("nmi,nmj->nij", Ja, Ja)
+        g = np.einsum("nmi,nm->ni", Ja, f[a])
+        diag = np.einsum("nii->ni", JTJ)
+        diag = np.maximum(diag, 1e-12 * diag.max(axis=1, keepdims=True) + 1e-300)
+        A = JTJ + (lam[a, None] * diag)[..., None] * np.eye(len(ivary))
+        # Parameters that sit on a bound and are being pushed against
+        # it are held fixed for this step
+        pa = P[a][:, ivary]
+        held = ((pa <= lo[a][:, ivary]) & (g > 0)) | ((pa >= hi[a][:, ivary]) & (g < 0))
+        A[held[:, :, None] | held[:, None, :]] = 0.0
+        A[:, np.arange(len(ivary)), np.arange(len(ivary))] += held
+        step = -np.linalg.solve(A, np.where(held, 0.0, g)[..., None])[..., 0]
+        Ptrial = P[a].copy()
+        Ptrial[:, ivary] += step
+        Ptrial = np.clip(Ptrial, lo[a], hi[a])
+        step = Ptrial[:, ivary] - P[a][:, ivary]
+        ftrial = np.where(mask[a], _residual_batch(Ptrial, X[a], Y[a], E[a]), 0.0)
+        ctrial = np.sum(ftrial**2, axis=1)
+        nfev[a] += 1
+        # Ratio of actual to predicted reduction in the cost
+        predicted = -2 * np.einsum("ni,ni->n", g, step) - np.einsum(
+            "ni,nij,nj->n", step, JTJ, step
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rho = (cost[a] - ctrial) / predicted
+        better = (ctrial < cost[a]) & (rho > 0)
+        # Convergence tests are modelled on those of MINPACK lmdif
+        small_step = np.all(
+            np.abs(step) <= xtol * (np.abs(P[a][:, ivary]) + xtol), axis=1
+        )
+        small_change = better & (cost[a] - ctrial <= ftol * cost[a])
+        stuck = lam[a] > 1e16
+        acc = a[better]
+        P[acc] = Ptrial[better]
+        f[acc] = ftrial[better]
+        cost[acc] = ctrial[better]
+        # Update the damping as recommended by Nielsen (1999)
+        lam[a] = np.where(
+            better,
+            lam[a] * np.maximum(1 / 3, 1 - (2 * np.clip(rho, 0, 1) - 1) ** 3),
+            lam[a] * nu[a],
+        )
+        nu[a] = np.where(better, 2.0, 2 * nu[a])
+        need_jac[:] = False
+        need_jac[acc] = True
+        done = small_step | small_change | stuck | (cost[a] == 0.0)
+        converged[a[done]] = ~stuck[done]
+        active[a[done]] = False
+    return P, cost, nfev, converged
+
+
+def fit_conics_batch(
+    xs,
+    ys,
+    eps=None,
+    only_parabola=True,
+    restrict_xy=False,
+    restrict_theta=False,
+    allow_negative_theta=True,
+    max_iter=200,
+    block_size=4096,
+    init=None,
+):
+    """Fit conic section curves to many independent sets of (x, y) points.
+
+    The point sets may be given as ragged sequences of arrays, or as
+    NaN-padded 2d arrays with one row per set (see pad_point_sets). The
+    options have the same meaning as for fit_conic_to_xy(), and the best
+    fit parameters should agree with those from fit_conic_to_xy() to
+    within the convergence tolerance. Point sets are processed in
+    blocks of block_size to limit the memory used by the jacobian. With
+    init="algebraic", the fits start from the direct algebraic fit
+    (see fit_conics_algebraic) instead of init_conics_from_xy().
+
+    Returns a ConicFitCatalog of the best-fit parameters and their
+    uncertainties and covariance matrices, with the "chisqr", "redchi",
+    "nfev" and "success" statistics for each fit.
+    """
+    prof = profiling._active
+    if prof is not None:
+        t_start = time.perf_counter()
+    X, Y, E, mask = pad_point_sets(xs, ys, eps)
+    nsets = len(X)
+    ivary = [0, 1, 2, 3] if only_parabola else [0, 1, 2, 3, 4]
+    nvary = len(ivary)
+    if init is None:
+        P0 = init_conics_from_xy(X, Y, mask)
+    elif init == "algebraic":
+        P0, _ = _algebraic_init_batch(X, Y, mask, only_parabola)
+    else:
+        raise ValueError(f"Unknown init option: {init!r}")
+    # Need at least 5 points to fit a conic
+    P0[mask.sum(axis=1) <= 4] = np.nan
+    lo, hi = _bounds_batch(
+        P0, X, Y, mask, restrict_xy, restrict_theta, allow_negative_theta
+    )
+    if prof is not None:
+        t_init = time.perf_counter()
+    P = np.empty_like(P0)
+    U = np.zeros_like(P0)
+    C = np.zeros((nsets, len(PARAM_NAMES), len(PARAM_NAMES)))
+    ii, jj = np.ix_(ivary, ivary)
+    chisqr = np.empty(nsets)
+    redchi = np.empty(nsets)
+    nfev = np.empty(nsets, dtype=int)
+    success = np.empty(nsets, dtype=bool)
+    for start in range(0, nsets, block_size):
+        s = slice(start, start + block_size)
+        P[s], chisqr[s], nfev[s], success[s] = _levenberg_marquardt_batch(
+            P0[s], X[s], Y[s], E[s], mask[s], ivary, lo[s], hi[s], max_iter=max_iter
+        )
+        # Parameter uncertainties from the covariance matrix, scaled
+        # by the reduced chi-square as is done by lmfit
+        J = _jacobian_batch(P[s], X[s], Y[s], E[s], ivary) * mask[s, :, None]
+        JTJ = np.einsum("nmi,nmj->nij", J, J)
+        ok = np.all(np.isfinite(JTJ), axis=(1, 2))
+        ok[ok] = np.linalg.matrix_rank(JTJ[ok]) == nvary
+        covar = np.full_like(JTJ, np.nan)
+        covar[ok] = np.linalg.inv(JTJ[ok])
+        redchi[s] = chisqr[s] / (mask[s].sum(axis=1) - nvary)
+        covar *= redchi[s, None, None]
+        C[s, ii, jj] = covar
+        U[s, ivary] = np.sqrt(np.einsum("nii->ni", covar))
+    success &= np.all(np.isfinite(P), axis=1)
+    if prof is not None:
+        t_optimize = time.perf_counter()
+    catalog = ConicFitCatalog(
+        P.T,
+        U.T,
+        {
+            "method": "batch",
+            "nfev": nfev,
+            "chisqr": chisqr,
+            "redchi": redchi,
+            "success": success,
+        },
+        np.moveaxis(C, 0, -1),
+    )
+    if prof is not None:
+        prof.add_fit(
+            nfits=nsets,
+            nfev=int(nfev.sum()),
+            init=t_init - t_start,
+            optimize=t_optimize - t_init,
+            result=time.perf_counter() - t_optimize,
+        )
+    return catalog
+
+
+def _multistart_seeds(xdata, ydata, ntheta, only_parabola):
+    """
+    Diverse starting points for a single set of points: the default
+    and algebraic initializations, plus ntheta orientations spaced
+    around the circle. For each orientation, the focus is the mean of
+    the data points and r0 is the distance to the data point that lies
+    closest in angle to the axis, which is the best guess at the apex.
+    """
+    seeds = [
+        [init_conic_from_xy(xdata, ydata)[k] for k in PARAM_NAMES],
+        [init_conic_algebraic(xdata, ydata, only_parabola)[k] for k in PARAM_NAMES],
+    ]
+    x0 = np.mean(xdata)
+    y0 = np.mean(ydata)
+    r = np.hypot(xdata - x0, ydata - y0)
+    th = np.arctan2(ydata - y0, xdata - x0)
+    for theta0 in np.arange(ntheta) * (360.0 / ntheta):
+        dth = np.angle(np.exp(1j * (th - np.deg2rad(theta0))))
+        r0 = r[np.argmin(np.abs(dth))]
+        seeds.append([x0, y0, r0, theta0, 1.0])
+    return np.array(seeds)
+
+
+def init_conic_multistart(
+    xdata,
+    ydata,
+    eps_data=None,
+    only_parabola=True,
+    restrict_xy=False,
+    allow_negative_theta=True,
+    ntheta=8,
+    max_iter=20,
+):
+    """Initialize a conic section curve by trying several starting points.
+
+    A short fit of at most max_iter iterations is run from each of a
+    set of diverse seeds (see _multistart_seeds), all at once using the
+    vectorized minimizer of fit_conics_batch(), and the best result is
+    returned in the same format as init_conic_from_xy().
+
+    Some results are not considered, since they can have deceptively
+    small residuals: those where the focus runs away to a distance of
+    more than 10 times the size of the data or r0 collapses, and those
+    where the data points lie mostly behind the focus of a parabola or
+    hyperbola, or nearer the far vertex of an ellipse than its apex,
+    rather than around the apex.
+    """
+    assert len(xdata) == len(ydata)
+    assert len(xdata) > 4  # Need at least 5 points to fit a conic
+    P0 = _multistart_seeds(xdata, ydata, ntheta, only_parabola)
+    nseeds = len(P0)
+    X = np.broadcast_to(np.asarray(xdata, dtype=float), (nseeds, len(xdata)))
+    Y = np.broadcast_to(np.asarray(ydata, dtype=float), (nseeds, len(ydata)))
+    E = np.broadcast_to(1.0 if eps_data is None else eps_data, X.shape)
+    mask = np.ones(X.shape, dtype=bool)
+    ivary = [0, 1, 2, 3] if only_parabola else [0, 1, 2, 3, 4]
+    lo, hi = _bounds_batch(P0, X, Y, mask, restrict_xy, False, allow_negative_theta)
+    P, cost, _, _ = _levenberg_marquardt_batch(
+        P0, X, Y, E, mask, ivary, lo, hi, max_iter=max_iter
+    )
+    size = np.hypot(np.ptp(xdata), np.ptp(ydata))
+    offset = np.hypot(P[:, 0] - np.mean(xdata), P[:, 1] - np.mean(ydata))
+    x0, y0, r0, theta0, e = (P[:, [i]] for i in range(len(PARAM_NAMES)))
+    cos_theta0, sin_theta0 = np.cos(np.deg2rad(theta0)), np.sin(np.deg2rad(theta0))
+    phi = np.arctan2(Y - y0, X - x0)
+    behind = np.mean(np.cos(phi - np.deg2rad(theta0)), axis=1) <= 0.0
+    # For an ellipse, the points may legitimately lie all around the
+    # focus, but they should not be closer to the far vertex than to
+    # the apex, since then the same ellipse is better described with
+    # the other focus, and the fit tends to run away from there
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rfar = r0 * (1 + e) / (1 - e)
+    d_apex = np.hypot(X - x0 - r0 * cos_theta0, Y - y0 - r0 * sin_theta0).min(axis=1)
+    d_far = np.hypot(X - x0 + rfar * cos_theta0, Y - y0 + rfar * sin_theta0).min(axis=1)
+    ellipse = P[:, 4] < 1.0
+    degenerate = (
+        (offset > 10 * size)
+        | (P[:, 2] < 1e-3 * size)
+        | np.where(ellipse, d_far < d_apex, behind)
+    )
+    cost = np.where(degenerate | ~np.isfinite(cost), np.inf, cost)
+    # Fall back on the default initialization if all else fails
+    best = np.argmin(cost) if np.isfinite(cost).any() else 0
+    return {k: float(P[best, i]) for i, k in enumerate(PARAM_NAMES)}
+
+
+def _algebraic_conics(X, Y, mask):
+    """
+    Direct least-squares fit of the general second-order curve
+
+        A x**2 + B x y + C y**2 + D x + E y + F = 0
+
+    to each row of the padded point set arrays, subject to the
+    normalization A**2 + B**2 + C**2 + D**2 + E**2 + F**2 = 1. The
+    solution is the eigenvector of the scatter matrix with the smallest
+    eigenvalue. The data are first shifted and scaled to have zero mean
+    and unit rms radius, which greatly improves the conditioning.
+    Returns the coefficients (nsets, 6) in the normalized frame, the
+    shift (nsets, 2) and scale (nsets,) that define it, and the
+    normalized coordinates u and v (nsets, npts) of the points, which
+    are zero where mask is False.
+    """
+    n = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shift = np.stack(
+            [np.where(mask, X, 0.0).sum(axis=1), np.where(mask, Y, 0.0).sum(axis=1)],
+            axis=1,
+        ) / n[:, None]
+        u = np.where(mask, X - shift[:, [0]], 0.0)
+        v = np.where(mask, Y - shift[:, [1]], 0.0)
+        scale = np.sqrt(np.sum(u**2 + v**2, axis=1) / n)
+        u /= scale[:, None]
+        v /= scale[:, None]
+    design = np.stack([u**2, u * v, v**2, u, v, mask.astype(float)], axis=-1)
+    design *= mask[..., None]
+    S = np.einsum("nmi,nmj->nij", design, design)
+    ok = np.all(np.isfinite(S), axis=(1, 2)) & (n > 4)
+    coeffs = np.full((len(X), 6), np.nan)
+    if np.any(ok):
+        _, vecs = np.linalg.eigh(S[ok])
+        coeffs[ok] = vecs[..., 0]
+    return coeffs, shift, scale, u, v
+
+
+def _focus_directrix_from_algebraic(coeffs, u, v, mask):
+    """
+    Convert coefficients of the general second-order curve into the
+    (x0, y0, r0, theta0, eccentricity) parameters used by XYconic.
+
+    For ellipses and hyperbolas, the axis is taken to point towards the
+    side of the center where the data points lie, which picks out
+    which of the two foci (ellipse) or branches (hyperbola) is used.
+    Returns an array of shape (nsets, 5), with NaN for sets where the
+    curve is imaginary or degenerate.
+    """
+    A, B, C, D, E, F = coeffs.T
+    M = np.stack([np.stack([A, B / 2], -1), np.stack([B / 2, C], -1)], -2)
+    good = np.all(np.isfinite(M), axis=(1, 2))
+    lam = np.full((len(A), 2), np.nan)
+    vec = np.full((len(A), 2, 2), np.nan)
+    lam[good], vec[good] = np.linalg.eigh(M[good])
+    rows = np.arange(len(A))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Parabolas have one eigenvalue that is zero
+        parabolic = np.abs(lam).min(axis=1) < 1e-9 * np.abs(lam).max(axis=1)
+
+        # Ellipses and hyperbolas: find center and reduce to
+        # lam_1 p**2 + lam_2 q**2 = -F' in the principal axes
+        denom = 4 * A * C - B**2
+        cx = (B * E - 2 * C * D) / denom
+        cy = (B * D - 2 * A * E) / denom
+        Fp = F + (D * cx + E * cy) / 2
+        k = -Fp[:, None] / lam
+        iax = np.argmax(np.where(np.isfinite(k), k, -np.inf), axis=1)
+        axis = vec[rows, :, iax]
+        a2 = k[rows, iax]
+        b2 = k[rows, 1 - iax]
+        a = np.sqrt(a2)
+        ecc = np.sqrt(1 - b2 / a2)
+        # Orient the axis towards the data points
+        side = np.sum(
+            mask * ((u - cx[:, None]) * axis[:, [0]] + (v - cy[:, None]) * axis[:, [1]]),
+            axis=1,
+        )
+        axis *= np.where(side < 0, -1.0, 1.0)[:, None]
+        x0 = cx + a * ecc * axis[:, 0]
+        y0 = cy + a * ecc * axis[:, 1]
+        r0 = a * np.abs(1 - ecc)
+        # The apex is between the focus and the center for hyperbolas,
+        # but on the other side of the focus for ellipses
+        direction = np.where(ecc < 1, 1.0, -1.0)[:, None] * axis
+        central = np.stack([x0, y0, r0, direction[:, 0], direction[:, 1], ecc], axis=1)
+        central[~(a2 > 0)] = np.nan
+
+        # Parabolas: in principal axes (p along the symmetry axis) we
+        # have lam_2 q**2 + D_p p + E_q q + F = 0, which can be written
+        # as (q - qv)**2 = 4 f (p - pv)
+        ipar = np.argmin(np.abs(lam), axis=1)
+        axis = vec[rows, :, ipar]
+        perp = vec[rows, :, 1 - ipar]
+        lam2 = lam[rows, 1 - ipar]
+        Dp = D * axis[:, 0] + E * axis[:, 1]
+        Eq = D * perp[:, 0] + E * perp[:, 1]
+        f = -Dp / (4 * lam2)
+        qv = -Eq / (2 * lam2)
+        pv = -(Eq**2 / (4 * lam2**2) - F / lam2) / (4 * f)
+        px = (pv + f) * axis[:, 0] + qv * perp[:, 0]
+        py = (pv + f) * axis[:, 1] + qv * perp[:, 1]
+        direction = -np.sign(f)[:, None] * axis
+        parabola = np.stack(
+            [px, py, np.abs(f), direction[:, 0], direction[:, 1], np.ones_like(f)],
+            axis=1,
+        )
+    out = np.where(parabolic[:, None], parabola, central)
+    # Degenerate curves, such as the pair of lines fitted to collinear
+    # points, have a vanishing determinant of the full 3 x 3 matrix
+    # (the coefficients are normalized, so this is in absolute terms)
+    det = (
+        A * (C * F - E**2 / 4)
+        - B / 2 * (B / 2 * F - E * D / 4)
+        + D / 2 * (B * E / 4 - C * D / 2)
+    )
+    out[~(np.abs(det) > 1e-10)] = np.nan
+    theta0 = np.rad2deg(np.arctan2(out[:, 4], out[:, 3]) % (2 * np.pi))
+    return np.stack([out[:, 0], out[:, 1], out[:, 2], theta0, out[:, 5]], axis=1)
+
+
+def _algebraic_init_batch(X, Y, mask, only_parabola=False):
+    """
+    Initial parameters (nsets, 5) from the algebraic fit, falling
+    back on init_conics_from_xy() where the algebraic fit fails. If
+    only_parabola is True, then the eccentricity is set to unity,
+    keeping the apex position and its radius of curvature, r0 (1 + e),
+    unchanged.
+    """
+    coeffs, shift, scale, u, v = _algebraic_conics(X, Y, mask)
+    P = _focus_directrix_from_algebraic(coeffs, u, v, mask)
+    P[:, :3] *= scale[:, None]
+    P[:, :2] += shift
+    if only_parabola:
+        theta0 = np.deg2rad(P[:, 3])
+        r0 = P[:, 2] * (1 + P[:, 4]) / 2
+        P[:, 0] += (P[:, 2] - r0) * np.cos(theta0)
+        P[:, 1] += (P[:, 2] - r0) * np.sin(theta0)
+        P[:, 2] = r0
+        P[:, 4] = 1.0
+    failed = ~np.all(np.isfinite(P), axis=1) | (P[:, 2] <= 0.0)
+    if np.any(failed):
+        P[failed] = init_conics_from_xy(X[failed], Y[failed], mask[failed])
+    return P, ~failed
+
+
+def fit_conics_algebraic(xs, ys, only_parabola=False):
+    """Fast approximate conic fits to many sets of (x, y) points.
+
+    This uses a direct (non-iterative) linear least-squares fit of the
+    general second-order curve, which is then converted to the focus,
+    scale, orientation and eccentricity parameters used elsewhere in
+    this package. The point sets are given as for fit_conics_batch().
+    Returns a ConicFitCatalog, in which the "success" column is False
+    for point sets where the algebraic fit failed, and the default
+    initialization is returned instead. No uncertainties are given.
+    """
+    X, Y, _, mask = pad_point_sets(xs, ys)
+    P, success = _algebraic_init_batch(X, Y, mask, only_parabola)
+    return ConicFitCatalog(P.T, stats={"method": "algebraic", "success": success})
+
+
+def init_conic_algebraic(xdata, ydata, only_parabola=False):
+    """Initialize a conic section curve from a direct algebraic fit.
+
+    Returns a dict of parameters in the same format as
+    init_conic_from_xy(), which it falls back on if the algebraic fit
+    fails (for instance, if the points are collinear).
+    """
+    assert len(xdata) == len(ydata)
+    assert len(xdata) > 4  # Need at least 5 points to fit a conic
+    X = np.asarray(xdata, dtype=float)[None, :]
+    Y = np.asarray(ydata, dtype=float)[None, :]
+    P, _ = _algebraic_init_batch(X, Y, np.ones(X.shape, dtype=bool), only_parabola)
+    return {k: float(P[0, i]) for i, k in enumerate(PARAM_NAMES)}
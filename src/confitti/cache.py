@@ -0,0 +1,240 @@
+"""Cache the results of fits, keyed on the data points and fit options."""
+
+import hashlib
+import inspect
+import json
+import os
+from collections import OrderedDict
+from functools import cache
+import numpy as np
+from .confitti import ConicFitResult, fit_conic_to_xy, _init_values
+from .catalog import ConicFitCatalog
+
+__all__ = ["FitCache"]
+
+# Changing this invalidates all existing cache keys, which should be
+# done if a change to the fitting code alters the results, or if the
+# cached files change
+KEY_VERSION = 2
+
+
+@cache
+def _fit_signature():
+    return inspect.signature(fit_conic_to_xy)
+
+
+def _canonical(value):
+    """
+    A version of a fit option that can be serialized to JSON in a
+    unique way, with starting parameters in any form as a dict
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, np.generic):
+        return value.item()
+    # Starting parameters in any of the forms accepted by
+    # fit_conic_to_xy(), as are dicts and sequences of numbers. Note
+    # that lmfit Parameters are also dicts, but of Parameter objects.
+    if isinstance(value, (ConicFitResult, np.ndarray)) or hasattr(value, "valuesdict"):
+        return _init_values(value)
+    if isinstance(value, dict):
+        if not all(isinstance(v, (int, float)) for v in value.values()):
+            return {str(k): _canonical(v) for (k, v) in sorted(value.items())}
+    elif isinstance(value, (list, tuple)):
+        if not all(isinstance(v, (int, float)) for v in value):
+            return [_canonical(v) for v in value]
+    try:
+        return _init_values(value)
+    except (TypeError, ValueError, KeyError):
+        raise TypeError(f"Fit option {value!r} cannot be used in a cache key") from None
+
+
+def _hash_array(h, a):
+    """Add the type, shape and contents of an array to a hash"""
+    a = np.ascontiguousarray(a)
+    h.update(f"{a.dtype.str}{a.shape}".encode())
+    h.update(a.data)
+
+
+class FitCache:
+    """Memoize the results of fit_conic_to_xy().
+
+    Each fit is identified by a key that is a hash of the bytes of the
+    xdata, ydata and eps_data arrays (including their dtypes and
+    shapes), and of all the options of the fit, with the defaults
+    filled in, so that the key does not depend on whether an option is
+    given explicitly. Repeating a fit with the same data and options
+    returns the cached ConicFitResult without doing the fit again.
+
+    The most recently used maxsize results are kept in memory. If
+    directory is given, every result is also saved there, as a one-row
+    bulk .npz catalog file (see ConicFitCatalog), so that it is found
+    again by later sessions or other processes that use the same
+    directory. If max_bytes is given, the least recently used files are
+    deleted whenever their total size exceeds it. Note that only what
+    is kept by ConicFitResult is cached, including all of its stats,
+    but not for instance the weights of a robust fit.
+
+    For example:
+
+        fits = confitti.FitCache("fit-cache")
+        result = fits.fit(xdata, ydata, only_parabola=False)
+
+    The numbers of fits found in the cache and of fits that had to be
+    done are counted by the hits and misses attributes.
+    """
+
+    def __init__(self, directory=None, maxsize=256, max_bytes=None):
+        self.directory = None if directory is None else os.fspath(directory)
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._disk_bytes = sum(size for (_, size, _) in self._disk_entries())
+
+    def key(self, xdata, ydata, eps_data=None, **fit_kws) -> str:
+        """The cache key of a fit with these data and options"""
+        bound = _fit_signature().bind(xdata, ydata, eps_data, **fit_kws)
+        bound.apply_defaults()
+        options = {
+            k: _canonical(v)
+            for (k, v) in bound.arguments.items()
+            if k not in ("xdata", "ydata", "eps_data")
+        }
+        h = hashlib.blake2b(digest_size=20)
+        h.update(f"confitti fit cache {KEY_VERSION}".encode())
+        _hash_array(h, xdata)
+        _hash_array(h, ydata)
+        if eps_data is None:
+            h.update(b"no eps")
+        else:
+            _hash_array(h, eps_data)
+        h.update(json.dumps(options, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def fit(self, xdata, ydata, eps_data=None, **fit_kws) -> ConicFitResult:
+        """
+        Fit a conic to the data with fit_conic_to_xy(), unless the
+        result is already in the cache. The result is shared with the
+        cache, so should not be modified.
+        """
+        key = self.key(xdata, ydata, eps_data, **fit_kws)
+        result = self.get(key)
+        if result is None:
+            self.misses += 1
+            result = ConicFitResult(fit_conic_to_xy(xdata, ydata, eps_data, **fit_kws))
+            self.put(key, result)
+        else:
+            self.hits += 1
+        return result
+
+    def get(self, key):
+        """The cached result with this key, or None if there is none"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                result = ConicFitCatalog.read(path, mmap=False)[0]
+            except FileNotFoundError:
+                return None
+            # Mark the file as recently used, for the eviction
+            os.utime(path)
+            self._remember(key, result)
+            return result
+        return None
+
+    def put(self, key, result: ConicFitResult):
+        """Add a result to the cache with this key"""
+        self._remember(key, result)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first, so that other processes
+        # never see an incomplete file
+        tmp = f"{path[:-4]}.{os.getpid()}.tmp.npz"
+        ConicFitCatalog.from_results([result]).write(tmp)
+        if os.path.exists(path):
+            self._disk_bytes -= os.path.getsize(path)
+        os.replace(tmp, path)
+        self._disk_bytes += os.path.getsize(path)
+        if self.max_bytes is not None and self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def invalidate(self, key):
+        """Remove the result with this key from the cache, if it is there"""
+        self._memory.pop(key, None)
+        if self.directory is not None:
+            path = self._path(key)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                return
+            self._disk_bytes -= size
+
+    def clear(self):
+        """Remove all the results from the cache, both in memory and on disk"""
+        self._memory.clear()
+        if self.directory is not None:
+            for _, _, path in self._disk_entries():
+                os.remove(path)
+            self._disk_bytes = 0
+
+    def __contains__(self, key):
+        return key in self._memory or (
+            self.directory is not None and os.path.exists(self._path(key))
+        )
+
+    def __len__(self):
+        """Number of results held in memory"""
+        return len(self._memory)
+
+    def __repr__(self):
+        disk = "" if self.directory is None else f", directory={self.directory!r}"
+        return (
+            f"FitCache({len(self)} in memory{disk}, "
+            f"{self.hits} hits, {self.misses} misses)"
+        )
+
+    def _remember(self, key, result):
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _path(self, key):
+        # Spread the files over subdirectories by the start of the key
+        return os.path.join(self.directory, key[:2], f"{key}.npz")
+
+    def _disk_entries(self):
+        """The (mtime, size, path) of each cached file"""
+        entries = []
+        for sub in os.scandir(self.directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".npz") and ".tmp." not in entry.name:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict(self):
+        """Delete the least recently used files until under max_bytes"""
+        entries = sorted(self._disk_entries())
+        total = sum(size for (_, size, _) in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._disk_bytes = total
@@ -0,0 +1,534 @@
+"""Columnar storage of the results of many conic fits."""
+
+import os
+import json
+import shutil
+import struct
+import tempfile
+import warnings
+import zipfile
+import numpy as np
+from .confitti import PARAM_NAMES, ConicFitResult
+
+__all__ = ["ConicFitCatalog", "CatalogWriter"]
+
+# Per-fit statistics that are stored as columns, with their dtypes and
+# the values used when they are missing
+STATS_COLUMNS = {
+    "method": (str, ""),
+    "nfev": (np.int64, -1),
+    "njev": (np.int64, -1),
+    "chisqr": (np.float64, np.nan),
+    "redchi": (np.float64, np.nan),
+    "success": (np.bool_, False),
+}
+
+
+
+def _missing(dtype):
+    """
+    Value of an extra stats column, such as the number of outliers of
+    a robust fit, for the fits that do not have that statistic
+    """
+    return {"b": False, "i": -1, "u": 0, "f": np.nan}.get(np.dtype(dtype).kind, "")
+
+
+# Identifies the bulk file format, in case it needs to change in future
+BULK_FORMAT = "confitti-catalog-1"
+
+
+def _memmap_npz(filename):
+    """
+    Memory-map all the arrays in an uncompressed .npz file. This
+    relies on each .npy member being stored contiguously in the zip
+    file, so we only need to find where its data starts.
+    """
+    arrays = {}
+    with zipfile.ZipFile(filename) as zf, open(filename, "rb") as f:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"Cannot memory-map compressed file {filename}")
+            # Skip over the local file header of the zip member
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            arrays[info.filename.removesuffix(".npy")] = np.memmap(
+                filename,
+                dtype=dtype,
+                mode="r",
+                offset=f.tell(),
+                shape=shape,
+                order="F" if fortran_order else "C",
+            )
+    return arrays
+
+
+class ConicFitCatalog:
+    """Results of many conic fits, stored as columns.
+
+    The best-fit parameters and their uncertainties are held in two
+    float64 arrays of shape (5, N), so that each parameter is a
+    contiguous column. The columns can be accessed as attributes (for
+    instance catalog.theta0, with catalog.utheta0 for its uncertainty),
+    or via the params and uparams dicts. The per-fit statistics (see
+    ConicFitResult.stats) are also columns, in the stats dict, which
+    always has those in STATS_COLUMNS, and also any others that some
+    of the fits have, such as "noutliers" for robust fits, with -1,
+    NaN, False or "" (depending on the type) for the fits that do not.
+    Any parameters other than the five conic parameters, such as the
+    __lnsigma of fit_conic_with_emcee(), are not kept. The covariance
+    matrices of the parameters, if available, are stored in
+    an array of shape (5, 5, N), and the covar attribute gives a view
+    of this with shape (N, 5, 5). Optionally, the catalog may also have
+    an array of ids that label each fit, such as the arc identifiers
+    used by fit_groups().
+
+    Indexing with an integer gives a ConicFitResult whose parameter
+    arrays are views into the catalog, while indexing with a slice,
+    boolean mask or integer array gives a new catalog.
+    """
+
+    def __init__(self, values, uvalues=None, stats=None, covar=None, ids=None):
+        # Make sure that each column is contiguous. This does not copy
+        # arrays that are already in the right layout, such as those
+        # memory-mapped by read()
+        self._values = np.ascontiguousarray(values, dtype=float)
+        assert self._values.shape[0] == len(PARAM_NAMES)
+        n = self._values.shape[1]
+        if uvalues is None:
+            uvalues = np.full_like(self._values, np.nan)
+        self._uvalues = np.ascontiguousarray(uvalues, dtype=float)
+        if covar is None:
+            covar = np.full((len(PARAM_NAMES), len(PARAM_NAMES), n), np.nan)
+        self._covar = np.ascontiguousarray(covar, dtype=float)
+        self.ids = None if ids is None else np.asarray(ids)
+        self.stats = {}
+        for k, (dtype, missing) in STATS_COLUMNS.items():
+            if stats is not None and k in stats:
+                column = np.asarray(stats[k])
+                if column.dtype.kind != "U":
+                    column = column.astype(dtype)
+                if column.ndim == 0:
+                    column = np.full(n, column)
+                self.stats[k] = column
+            else:
+                self.stats[k] = np.full(n, missing, dtype=dtype)
+        for k, v in (stats or {}).items():
+            if k not in STATS_COLUMNS:
+                column = np.asarray(v)
+                self.stats[k] = np.full(n, column) if column.ndim == 0 else column
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        """Create a catalog from a dict of columns.
+
+        The dict has "params" and (optionally) "uparams" items, each of
+        which is a dict of arrays keyed by parameter name, in the same
+        layout as ConicFitResult.to_dict(). An optional "covar" item is
+        an array of covariance matrices of shape (N, 5, 5), and an
+        optional "ids" item labels each fit. Any other items are taken to
+        be columns of the per-fit statistics.
+        """
+        values = [d["params"][k] for k in PARAM_NAMES]
+        uvalues = [d["uparams"][k] for k in PARAM_NAMES] if "uparams" in d else None
+        covar = np.moveaxis(np.asarray(d["covar"]), 0, -1) if "covar" in d else None
+        columns = ("params", "uparams", "covar", "ids")
+        stats = {k: v for (k, v) in d.items() if k not in columns}
+        return cls(values, uvalues, stats, covar, d.get("ids"))
+
+    @classmethod
+    def from_results(cls, results):
+        """Create a catalog from an iterable of ConicFitResult objects"""
+        results = list(results)
+        missing = np.full(len(PARAM_NAMES), np.nan)
+        values = np.array(
+            [missing if r._values is None else r._values for r in results]
+        ).reshape(-1, 5)
+        uvalues = np.array(
+            [missing if r._uvalues is None else r._uvalues for r in results]
+        ).reshape(-1, 5)
+        missing_covar = np.full((len(PARAM_NAMES), len(PARAM_NAMES)), np.nan)
+        covar = np.array(
+            [missing_covar if r._covar is None else r._covar for r in results]
+        ).reshape(-1, 5, 5)
+        stats = {}
+        for k, (_, missing) in STATS_COLUMNS.items():
+            column = [r.stats.get(k) for r in results]
+            stats[k] = [missing if v is None else v for v in column]
+        extra = dict.fromkeys(k for r in results for k in r.stats)
+        for k in extra:
+            if k in STATS_COLUMNS:
+                continue
+            column = [r.stats.get(k) for r in results]
+            dtype = np.asarray([v for v in column if v is not None]).dtype
+            if dtype.kind not in "biufU":
+                warnings.warn(f"The {k!r} stats are not kept in the catalog")
+                continue
+            missing = _missing(dtype)
+            stats[k] = np.array([missing if v is None else v for v in column])
+        if any(r._extra_params for r in results):
+            names = sorted({k for r in results for k in (r._extra_params or {})})
+            warnings.warn(f"The extra parameters {names} are not kept in the catalog")
+        return cls(values.T, uvalues.T, stats, np.moveaxis(covar, 0, -1))
+
+    @classmethod
+    def concatenate(cls, catalogs):
+        """Join several catalogs together into one"""
+        catalogs = list(catalogs)
+        # Extra stats columns that only some of the catalogs have are
+        # filled in for the others
+        dtypes = {}
+        for c in catalogs:
+            for k, v in c.stats.items():
+                dtypes.setdefault(k, v.dtype)
+
+        def column(c, k):
+            if k in c.stats:
+                return c.stats[k]
+            return np.full(len(c), _missing(dtypes[k]), dtype=dtypes[k])
+
+        if all(c.ids is not None for c in catalogs):
+            ids = np.concatenate([c.ids for c in catalogs])
+        else:
+            ids = None
+        return cls(
+            np.concatenate([c._values for c in catalogs], axis=1),
+            np.concatenate([c._uvalues for c in catalogs], axis=1),
+            {k: np.concatenate([column(c, k) for c in catalogs]) for k in dtypes},
+            np.concatenate([c._covar for c in catalogs], axis=2),
+            ids,
+        )
+
+    def to_dict(self) -> dict:
+        """Return a dict of columns, the inverse of from_dict()"""
+        d = {
+            "params": self.params,
+            "uparams": self.uparams,
+            "covar": self.covar,
+            **self.stats,
+        }
+        if self.ids is not None:
+            d["ids"] = self.ids
+        return d
+
+    @property
+    def params(self) -> dict:
+        """Columns of best-fit parameters"""
+        return dict(zip(PARAM_NAMES, self._values))
+
+    @property
+    def uparams(self) -> dict:
+        """Columns of uncertainties of best-fit parameters"""
+        return dict(zip(PARAM_NAMES, self._uvalues))
+
+    @property
+    def covar(self):
+        """Covariance matrices of the parameters, shape (N, 5, 5)"""
+        return np.moveaxis(self._covar, -1, 0)
+
+    def __getattr__(self, name):
+        # Only called if normal attribute lookup fails
+        if not name.startswith("_"):
+            if name in PARAM_NAMES:
+                return self._values[PARAM_NAMES.index(name)]
+            if name.startswith("u") and name[1:] in PARAM_NAMES:
+                return self._uvalues[PARAM_NAMES.index(name[1:])]
+            stats = self.__dict__.get("stats", {})
+            if name in stats:
+                return stats[name]
+        raise AttributeError(
+            f"{type(self).__name__!r} object has no attribute {name!r}"
+        )
+
+    def __len__(self):
+        return self._values.shape[1]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return self._row(index)
+        return type(self)(
+            self._values[:, index],
+            self._uvalues[:, index],
+            {k: v[index] for (k, v) in self.stats.items()},
+            self._covar[:, :, index],
+            None if self.ids is None else self.ids[index],
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def _row(self, i):
+        """ConicFitResult that is a view of one row of the catalog"""
+        rslt = ConicFitResult()
+        rslt._values = self._values[:, i]
+        rslt._uvalues = self._uvalues[:, i]
+        covar = self._covar[:, :, i]
+        rslt._covar = None if np.all(np.isnan(covar)) else covar
+        rslt.stats = {k: v[i].item() for (k, v) in self.stats.items()}
+        for k in ("nfev", "njev"):
+            if rslt.stats[k] == -1:
+                rslt.stats[k] = None
+        return rslt
+
+    def __repr__(self):
+        return f"ConicFitCatalog with {len(self)} fits"
+
+    def write(self, filename: str):
+        """Save the catalog to a file.
+
+        If the filename ends in .npz, then all the columns are written
+        to a single uncompressed binary file, which is the recommended
+        format for large catalogs. Otherwise, a JSON or YAML file (if
+        the filename ends in .yaml) is written with a list of the
+        ConicFitResult.to_dict() representations of each fit, with
+        an extra "id" item in each if the catalog has ids.
+        """
+        if filename.lower().endswith(".npz"):
+            ids = {} if self.ids is None else {"ids": self.ids}
+            np.savez(
+                filename,
+                format=np.array(BULK_FORMAT),
+                params=self._values,
+                uparams=self._uvalues,
+                covar=self._covar,
+                **self.stats,
+                **ids,
+            )
+            return
+        rows = [row.to_dict() for row in self]
+        if self.ids is not None:
+            for row, id in zip(rows, self.ids):
+                row["id"] = id.item()
+        with open(filename, "w") as f:
+            if filename.lower().endswith(".yaml"):
+                import yaml
+
+                yaml.safe_dump(rows, f)
+            else:
+                json.dump(rows, f)
+
+    @classmethod
+    def read(cls, filename: str, mmap: bool = True):
+        """Read a catalog from a file written by write().
+
+        For .npz files, the columns are memory-mapped (unless
+        mmap=False), so that only the parts of the file that are used
+        get read from disk. JSON and YAML files may also be read, which
+        should contain a list of dicts in the format of
+        ConicFitResult.to_dict(), and the ids of the catalog are taken
+        from their "id" items, if they all have one.
+        """
+        if filename.lower().endswith(".npz"):
+            if mmap:
+                d = _memmap_npz(filename)
+            else:
+                with np.load(filename) as data:
+                    d = {k: data[k] for k in data.files}
+            if str(d.pop("format", None)) != BULK_FORMAT:
+                raise ValueError(f"{filename} is not a confitti catalog file")
+            # Files written before the covariance was included do not have it
+            return cls(
+                d.pop("params"),
+                d.pop("uparams"),
+                d,
+                d.pop("covar", None),
+                d.pop("ids", None),
+            )
+        with open(filename, "r") as f:
+            if filename.lower().endswith(".yaml"):
+                import yaml
+
+                rows = yaml.safe_load(f)
+            else:
+                rows = json.load(f)
+        catalog = cls.from_results(ConicFitResult.from_dict(d) for d in rows)
+        if rows and all("id" in d for d in rows):
+            catalog.ids = np.array([d["id"] for d in rows])
+        return catalog
+
+
+class CatalogWriter:
+    """Write fit results to a bulk .npz catalog file one at a time.
+
+    This produces the same file as ConicFitCatalog.write(), but only
+    holds flush_every results in memory at once. Each column is
+    appended to its own temporary file, in a directory next to the
+    output file, and the columns are copied into the .npz file when
+    the writer is closed. Use as a context manager:
+
+        with CatalogWriter("fits.npz") as writer:
+            for id, result in ...:
+                writer.append(result, id)
+
+    Either all or none of the results must be given an id, since the
+    ids are a column of the catalog like any other. Extra stats columns
+    (see ConicFitCatalog) are filled in with missing values for the
+    results that were written before one of them first appeared.
+    """
+
+    def __init__(self, filename: str, flush_every: int = 1024):
+        self.filename = os.fspath(filename)
+        self.flush_every = flush_every
+        self._tmpdir = tempfile.mkdtemp(
+            prefix=".confitti-", dir=os.path.dirname(os.path.abspath(self.filename))
+        )
+        self._results = []
+        self._ids = []
+        self._has_ids = None
+        self._id_dtype = None
+        # Types of the stats columns, including any extra ones found
+        # as the results are written
+        self._dtypes = {k: np.dtype(dtype) for (k, (dtype, _)) in STATS_COLUMNS.items()}
+        # Widths of the string columns, found as they are written
+        self._widths = {}
+        # Number of rows written to each part file
+        self._rows = {}
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+    def append(self, result: ConicFitResult, id=None):
+        """Add a ConicFitResult, optionally labelled with an id"""
+        if self._has_ids is None:
+            self._has_ids = id is not None
+        elif self._has_ids != (id is not None):
+            raise ValueError("Either all or none of the results must have an id")
+        self._results.append(result)
+        self._ids.append(id)
+        if len(self._results) >= self.flush_every:
+            self.flush()
+
+    def _part(self, name):
+        return os.path.join(self._tmpdir, name)
+
+    def flush(self):
+        """Append the buffered results to the temporary column files"""
+        if not self._results:
+            return
+        catalog = ConicFitCatalog.from_results(self._results)
+        columns = {}
+        for i, k in enumerate(PARAM_NAMES):
+            columns[f"params.{i}"] = catalog._values[i]
+            columns[f"uparams.{i}"] = catalog._uvalues[i]
+            for j in range(len(PARAM_NAMES)):
+                columns[f"covar.{i}.{j}"] = catalog._covar[i, j]
+        for k, column in catalog.stats.items():
+            if k not in self._dtypes:
+                self._dtypes[k] = column.dtype
+                # Fill in the rows that were written before this column
+                # first appeared
+                self._append_stats(k, np.full(self.count, _missing(column.dtype)))
+        for k, dtype in self._dtypes.items():
+            column = catalog.stats.get(k)
+            if column is None:
+                column = np.full(len(catalog), _missing(dtype))
+            self._append_stats(k, column)
+        for name, column in columns.items():
+            self._append_column(name, column)
+        if self._has_ids:
+            ids = np.asarray(self._ids)
+            if self._id_dtype is None:
+                self._id_dtype = np.int64 if ids.dtype.kind in "iu" else str
+            if self._id_dtype is str:
+                self._append_strings("ids", ids)
+            else:
+                self._append_column("ids", ids.astype(np.int64))
+        self.count += len(self._results)
+        self._results = []
+        self._ids = []
+
+    def _append_stats(self, k, column):
+        """Append a stats column to its part file, in the column type"""
+        dtype = self._dtypes[k]
+        if dtype.kind == "U":
+            self._append_strings(f"stats.{k}", column)
+        else:
+            self._append_column(f"stats.{k}", np.asarray(column, dtype=dtype))
+
+    def _append_column(self, part, column):
+        """Append the raw data of a column to a part file"""
+        with open(self._part(part), "ab") as f:
+            f.write(np.ascontiguousarray(column).tobytes())
+        self._rows[part] = self._rows.get(part, 0) + len(column)
+
+    def _append_strings(self, part, strings):
+        """Append strings to a part file, one per line, since we do not
+        yet know the width needed for the final array"""
+        strings = np.asarray(strings).astype(str)
+        width = max((len(s) for s in strings), default=0)
+        self._widths[part] = max(self._widths.get(part, 1), width)
+        with open(self._part(part), "a") as f:
+            f.writelines(s + "\n" for s in strings)
+        self._rows[part] = self._rows.get(part, 0) + len(strings)
+
+    def _write_strings(self, zf, name, n, part):
+        """Write a .npy member of fixed-width strings from a part file,
+        converting them in blocks"""
+        dtype = f"U{self._widths.get(part, 1)}"
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": (n,),
+        }
+        with zf.open(f"{name}.npy", mode="w", force_zip64=True) as f:
+            np.lib.format.write_array_header_2_0(f, header)
+            if os.path.exists(self._part(part)):
+                with open(self._part(part)) as src:
+                    while block := src.readlines(1 << 20):
+                        strings = [s.removesuffix("\n") for s in block]
+                        f.write(np.array(strings, dtype=dtype).tobytes())
+
+    def _write_member(self, zf, name, dtype, shape, parts):
+        """Write a .npy member from the raw data in the part files"""
+        header = {
+            "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+            "fortran_order": False,
+            "shape": shape,
+        }
+        with zf.open(f"{name}.npy", mode="w", force_zip64=True) as f:
+            np.lib.format.write_array_header_2_0(f, header)
+            for part in parts:
+                if os.path.exists(self._part(part)):
+                    with open(self._part(part), "rb") as src:
+                        shutil.copyfileobj(src, f)
+
+    def close(self):
+        """Write the final .npz file and remove the temporary files"""
+        self.flush()
+        n = self.count
+        npar = len(PARAM_NAMES)
+        # Every member is declared with n rows, so a short part file
+        # would make the .npz file unreadable
+        for part, rows in self._rows.items():
+            assert rows == n, f"{part} has {rows} rows instead of {n}"
+        with zipfile.ZipFile(self.filename, mode="w") as zf:
+            with zf.open("format.npy", mode="w") as f:
+                np.lib.format.write_array(f, np.array(BULK_FORMAT))
+            for name in "params", "uparams":
+                parts = [f"{name}.{i}" for i in range(npar)]
+                self._write_member(zf, name, np.float64, (npar, n), parts)
+            parts = [f"covar.{i}.{j}" for i in range(npar) for j in range(npar)]
+            self._write_member(zf, "covar", np.float64, (npar, npar, n), parts)
+            for k, dtype in self._dtypes.items():
+                if dtype.kind == "U":
+                    self._write_strings(zf, k, n, f"stats.{k}")
+                else:
+                    self._write_member(zf, k, dtype, (n,), [f"stats.{k}"])
+            if self._id_dtype is str:
+                self._write_strings(zf, "ids", n, "ids")
+            elif self._id_dtype is not None:
+                self._write_member(zf, "ids", np.int64, (n,), ["ids"])
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
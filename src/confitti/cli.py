@@ -0,0 +1,245 @@
+"""Command-line interface for fitting conic sections to many point sets."""
+
+import argparse
+import sys
+import time
+import numpy as np
+from .catalog import ConicFitCatalog, CatalogWriter
+from .parallel import fit_many
+from .pipeline import iter_groups_array, iter_groups_csv, fit_groups
+
+
+# The lmfit methods that work with the conic objective function, which
+# excludes those that need finite bounds on all the parameters (shgo
+# accepts infinite bounds, but replaces them with huge finite ones), or
+# derivatives of a scalar objective
+METHODS = (
+    "leastsq",
+    "least_squares",
+    "nelder",
+    "powell",
+    "lbfgsb",
+    "cg",
+    "bfgs",
+    "tnc",
+    "cobyla",
+    "slsqp",
+    "trust-constr",
+    "basinhopping",
+    "ampgo",
+)
+
+# The robust loss functions of least_squares
+LOSSES = ("linear", "soft_l1", "huber", "cauchy", "arctan")
+
+
+def _read_points(filename, x_column, y_column, eps_column):
+    """
+    Read one set of points from a .npy file with columns (x, y) or
+    (x, y, eps), or from a CSV file with a header row naming the columns
+    """
+    if filename.lower().endswith(".npy"):
+        data = np.load(filename)
+        return tuple(data[:, i] for i in range(data.shape[1]))
+    table = np.genfromtxt(filename, delimiter=",", names=True)
+    columns = [x_column, y_column] + ([eps_column] if eps_column else [])
+    return tuple(np.atleast_1d(table[c]) for c in columns)
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="confitti",
+        description=(
+            "Fit conic sections to many sets of points in parallel, "
+            "and write the results to a single catalog file."
+        ),
+    )
+    parser.add_argument(
+        "inputs",
+        nargs="+",
+        help=(
+            "Input files, each with one set of points (CSV with a header row, "
+            "or .npy with columns x, y[, eps]), or a single table of many "
+            "sets of points if --group-by is given"
+        ),
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output catalog file (.npz for the bulk binary format, or .json/.yaml)",
+    )
+    io = parser.add_argument_group("input columns")
+    io.add_argument(
+        "--group-by",
+        metavar="COLUMN",
+        help="Treat the input as one table of point sets, grouped by this id column",
+    )
+    io.add_argument("--x-column", default="x")
+    io.add_argument("--y-column", default="y")
+    io.add_argument("--eps-column", default=None)
+    fit = parser.add_argument_group("fit options (see fit_conic_to_xy)")
+    fit.add_argument(
+        "--only-parabola",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Fix the eccentricity at 1 (default: %(default)s)",
+    )
+    fit.add_argument("--restrict-xy", action="store_true")
+    fit.add_argument("--restrict-theta", action="store_true")
+    fit.add_argument(
+        "--allow-negative-theta",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+    )
+    fit.add_argument("--method", choices=METHODS, default="leastsq")
+    fit.add_argument(
+        "--loss",
+        choices=LOSSES,
+        default="linear",
+        help="Robust loss function, only with --method least_squares",
+    )
+    fit.add_argument("--f-scale", type=float, default=1.0)
+    fit.add_argument("--init", choices=["multistart", "algebraic"], default=None)
+    fit.add_argument(
+        "--robust",
+        choices=["huber", "cauchy", "soft_l1", "clip"],
+        default=None,
+        help="Reweight the points to reduce the influence of outliers",
+    )
+    fit.add_argument("--clip-sigma", type=float, default=3.0)
+    fit.add_argument(
+        "--subsample",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Fit large point sets in stages, starting with a subsample of N points",
+    )
+    run = parser.add_argument_group("execution")
+    run.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    run.add_argument("--chunksize", type=int, default=16)
+    run.add_argument(
+        "--max-pending",
+        type=int,
+        default=None,
+        help="Maximum number of chunks in flight (default: twice the workers)",
+    )
+    return parser
+
+
+def main(argv=None):
+    """Entry point of the confitti console script"""
+    parser = _parser()
+    args = parser.parse_args(argv)
+    if args.loss != "linear" and args.method != "least_squares":
+        parser.error("--loss requires --method least_squares")
+    fit_kws = {
+        "only_parabola": args.only_parabola,
+        "restrict_xy": args.restrict_xy,
+        "restrict_theta": args.restrict_theta,
+        "allow_negative_theta": args.allow_negative_theta,
+        "method": args.method,
+        "loss": args.loss,
+        "f_scale": args.f_scale,
+        "init": args.init,
+        "robust": args.robust,
+        "clip_sigma": args.clip_sigma,
+        "subsample": args.subsample,
+    }
+    run_kws = {
+        "workers": args.workers,
+        "chunksize": args.chunksize,
+        "max_pending": args.max_pending,
+    }
+    columns = {
+        "x_column": args.x_column,
+        "y_column": args.y_column,
+        "eps_column": args.eps_column,
+    }
+    # Count the point sets as they are read, so that the failures are
+    # known at the end
+    ninput = 0
+
+    def counted(iterable):
+        nonlocal ninput
+        for item in iterable:
+            ninput += 1
+            yield item
+
+    def report(name, message):
+        print(f"confitti: cannot fit {name}: {message}", file=sys.stderr)
+
+    if args.group_by is not None:
+        if len(args.inputs) > 1:
+            sys.exit("confitti: only one input table may be given with --group-by")
+        (filename,) = args.inputs
+        if filename.lower().endswith(".npy"):
+            groups = iter_groups_array(filename, id_column=args.group_by, **columns)
+        else:
+            groups = iter_groups_csv(filename, id_column=args.group_by, **columns)
+        # Groups that are too small are passed on, to be counted as failures
+        results = fit_groups(
+            counted(groups), min_points=0, skip_errors=report, **run_kws, **fit_kws
+        )
+    else:
+        # Files that cannot be read are counted as failures, and the
+        # names of the others are kept in the order that they are fitted
+        names = []
+
+        def datasets():
+            for filename in args.inputs:
+                try:
+                    data = _read_points(filename, **columns)
+                except (OSError, ValueError, KeyError, IndexError) as exc:
+                    print(f"confitti: cannot read {filename}: {exc}", file=sys.stderr)
+                    yield None
+                    continue
+                names.append(filename)
+                yield data
+
+        readable = (data for data in counted(datasets()) if data is not None)
+        fits = fit_many(
+            readable,
+            skip_errors=lambda index, message: report(names[index], message),
+            **run_kws,
+            **fit_kws,
+        )
+        results = ((names[i], r) for (i, r) in fits)
+
+    start = time.perf_counter()
+    nfit = nfail_converge = 0
+    if args.output.lower().endswith(".npz"):
+        with CatalogWriter(args.output) as writer:
+            for id, result in results:
+                writer.append(result, id)
+                nfit += 1
+                nfail_converge += not result.stats.get("success", True)
+    else:
+        ids, fits = [], []
+        for id, result in results:
+            ids.append(id)
+            fits.append(result)
+            nfit += 1
+            nfail_converge += not result.stats.get("success", True)
+        catalog = ConicFitCatalog.from_results(fits)
+        catalog.ids = np.asarray(ids)
+        catalog.write(args.output)
+    elapsed = time.perf_counter() - start
+
+    rate = nfit / elapsed if elapsed > 0 else float("inf")
+    print(
+        f"{nfit} fits of {ninput} point sets in {elapsed:.2f} s "
+        f"({rate:.1f} fits/s), {ninput - nfit} failed, "
+        f"{nfail_converge} not converged; written to {args.output}"
+    )
+    return 0 if nfit > 0 or ninput == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
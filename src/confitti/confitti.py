@@ -1,41 +1,208 @@
 """Fit conic section curves to data."""
 
 import json
-import yaml
+import math
+import time
+from functools import cached_property
 import numpy as np
-import lmfit
-from scipy.stats import circmean
+from . import profiling
+
+# Note that lmfit and yaml are only imported when they are needed,
+# since importing lmfit takes a large fraction of a second, which is
+# wasted when only the curves or saved results are wanted
 
 DEBUG = False
 
+# Order of the conic parameters, which is also the column order of
+# the jacobian returned by residual_jacobian()
+PARAM_NAMES = ("x0", "y0", "r0", "theta0", "eccentricity")
+
+
+def _blocks(n, block_size):
+    """Slices that divide range(n) into blocks of block_size"""
+    return (slice(start, start + block_size) for start in range(0, n, block_size))
+
+
+def _block_eps(eps, block):
+    """The part of eps for a block of points, if it is an array"""
+    return eps[block] if np.ndim(eps) else eps
+
+
+def conic_residual(p, x, y, eps=None, out=None, work=None, block_size=None):
+    """
+    Low-level version of residual() that works with a plain sequence
+    of parameter values p = [x0, y0, r0, theta0, eccentricity] instead
+    of lmfit Parameters.
+
+    The result is written in place into out, and work is used as
+    scratch space; both are allocated if not given, otherwise they
+    should be float64 arrays of shape (n,) and (2, n) respectively,
+    where n = len(x). The function can be passed directly to
+    scipy.optimize.least_squares with args=(x, y, eps), but in that case
+    do not pass an out buffer, since least_squares keeps hold of
+    previous residual vectors.
+
+    If block_size is given, the points are processed in blocks of that
+    many at a time, so that work only needs shape (2, block_size), and
+    the only array the size of the input is out. A block size of about
+    16384 keeps the scratch space in the cache of most processors, and
+    is then usually a little faster than a single pass over a very
+    large input, whereas much smaller blocks are slower because of the
+    overhead for each block. The data may also be float32 arrays, to
+    halve the memory needed for a very large point set, since each
+    block is converted to float64 as it is used, so the result is
+    always calculated in float64.
+    """
+    if block_size is not None and block_size < len(x):
+        if out is None:
+            out = np.empty(len(x))
+        if work is None:
+            work = np.empty((2, block_size))
+        for block in _blocks(len(x), block_size):
+            xb, yb = x[block], y[block]
+            conic_residual(
+                p, xb, yb, _block_eps(eps, block), out=out[block], work=work[:, : len(xb)]
+            )
+        return out
+    x0, y0, r0, theta0, eccentricity = p
+    theta0 = math.radians(theta0)
+    if work is None:
+        work = np.empty((2, len(x)))
+    dx, dy = work
+    np.subtract(x, x0, out=dx)
+    np.subtract(y, y0, out=dy)
+    # Radius from focus
+    out = np.hypot(dx, dy, out=out)
+    # Residual r - e d, where e d = (1 + e) r0 - e [(x - x0) cos(theta0)
+    # + (y - y0) sin(theta0)] is eccentricity times distance from
+    # directrix (positive for points on same side as the focus)
+    dx *= eccentricity * math.cos(theta0)
+    dy *= eccentricity * math.sin(theta0)
+    out += dx
+    out += dy
+    out -= (1 + eccentricity) * r0
+    if eps is not None:
+        out /= eps
+    return out
+
+
+def conic_jacobian(
+    p, x, y, eps=None, out=None, work=None, ivary=(0, 1, 2, 3, 4), block_size=None
+):
+    """
+    Low-level analytic jacobian of conic_residual() with respect to
+    the parameters with indices ivary (default: all of them, in the
+    order of PARAM_NAMES). Returns an array of shape (n, len(ivary)),
+    written in place into out if given. The work buffer, if given,
+    should have shape (3, n), or (3, block_size) if block_size is given,
+    in which case the points are processed in blocks as for
+    conic_residual(). Can be passed as the jac argument of
+    scipy.optimize.least_squares.
+    """
+    if block_size is not None and block_size < len(x):
+        if out is None:
+            out = np.empty((len(x), len(ivary)))
+        if work is None:
+            work = np.empty((3, block_size))
+        for block in _blocks(len(x), block_size):
+            xb, yb = x[block], y[block]
+            conic_jacobian(
+                p,
+                xb,
+                yb,
+                _block_eps(eps, block),
+                out=out[block],
+                work=work[:, : len(xb)],
+                ivary=ivary,
+            )
+        return out
+    x0, y0, r0, theta0, eccentricity = p
+    theta0 = math.radians(theta0)
+    cth0 = math.cos(theta0)
+    sth0 = math.sin(theta0)
+    if work is None:
+        work = np.empty((3, len(x)))
+    if out is None:
+        out = np.empty((len(x), len(ivary)))
+    dx, dy, r = work
+    np.subtract(x, x0, out=dx)
+    np.subtract(y, y0, out=dy)
+    np.hypot(dx, dy, out=r)
+    # Guard against a data point that coincides with the focus, where
+    # the gradient of r is undefined
+    r[r == 0.0] = 1.0
+    for j, i in enumerate(ivary):
+        col = out[:, j]
+        if i == 0:
+            np.divide(dx, r, out=col)
+            col *= -1
+            col -= eccentricity * cth0
+        elif i == 1:
+            np.divide(dy, r, out=col)
+            col *= -1
+            col -= eccentricity * sth0
+        elif i == 2:
+            col[:] = -(1 + eccentricity)
+        elif i == 3:
+            # theta0 is in degrees, hence the extra factor
+            np.multiply(dy, eccentricity * cth0 * np.pi / 180.0, out=col)
+            col -= dx * (eccentricity * sth0 * np.pi / 180.0)
+        else:
+            np.multiply(dx, cth0, out=col)
+            col += dy * sth0
+            col -= r0
+    if eps is not None:
+        out /= np.reshape(eps, (-1, 1)) if np.ndim(eps) else eps
+    return out
+
 
-def residual(pars, x, y, eps=None):
+def residual(pars, x, y, eps=None, block_size=None, work=None):
     """
     Objective function for minimizer: residual difference between
     radius from focus and (eccentricty times) distance from directrix
     for each data point.
+
+    This is a wrapper around conic_residual() for use with lmfit, which
+    also explains block_size. The scratch space work may have shape
+    (3, n), so that the same buffer can be shared with
+    residual_jacobian().
     """
     # unpack parameters: extract .value attribute for each parameter
     parvals = pars.valuesdict()
-    x0 = parvals["x0"]
-    y0 = parvals["y0"]
-    r0 = parvals["r0"]
-    theta0 = parvals["theta0"]
-    cth0 = np.cos(np.deg2rad(theta0))
-    sth0 = np.sin(np.deg2rad(theta0))
-    eccentricity = parvals["eccentricity"]
-    # Radius from focus
-    r = np.hypot(x - x0, y - y0)
-    # Distance from directrix (positive for points on same side as the
-    # focus). Note that we calculate e * d, not just d, to avoid
-    # problems when e is small.
-    e_times_d = (1 + eccentricity) * r0 - eccentricity * (
-        (x - x0) * cth0 + (y - y0) * sth0
-    )
+    p = [parvals[k] for k in PARAM_NAMES]
     if DEBUG:
+        x0, y0, r0, theta0, eccentricity = p
+        r = np.hypot(x - x0, y - y0)
+        e_times_d = (1 + eccentricity) * r0 - eccentricity * (
+            (x - x0) * np.cos(np.deg2rad(theta0))
+            + (y - y0) * np.sin(np.deg2rad(theta0))
+        )
         print(f"r = {r}\nd = {e_times_d / eccentricity}\ne d = {e_times_d}")
     # return the residuals from the conic section equation: r = e * d
-    return (r - e_times_d) / (1 if eps is None else eps)
+    if work is not None:
+        work = work[:2]
+    return conic_residual(p, x, y, eps, work=work, block_size=block_size)
+
+
+def residual_jacobian(pars, x, y, eps=None, block_size=None, work=None, out=None):
+    """
+    Analytic jacobian of the residual() objective function with
+    respect to the varying parameters, for use as the Dfun argument of
+    the minimizer. Returns an array with one row per data point and one
+    column per varying parameter (in the same order as pars), written
+    in place into out if given (see conic_jacobian()).
+    """
+    parvals = pars.valuesdict()
+    p = [parvals[k] for k in PARAM_NAMES]
+    ivary = [PARAM_NAMES.index(k) for k, v in pars.items() if v.vary and k in PARAM_NAMES]
+    return conic_jacobian(
+        p, x, y, eps, out=out, work=work, ivary=ivary, block_size=block_size
+    )
+
+
+def _circmean(angles):
+    """Circular mean of angles in radians, in the range [0, 2 pi)"""
+    return np.arctan2(np.sum(np.sin(angles)), np.sum(np.cos(angles))) % (2 * np.pi)
 
 
 def init_conic_from_xy(xdata, ydata):
@@ -44,16 +211,17 @@ def init_conic_from_xy(xdata, ydata):
     assert len(xdata) == len(ydata)
     assert len(xdata) > 4  # Need at least 5 points to fit a conic
     # Focus is initialized to be mean position of the data points
-    x0 = np.mean(xdata)
-    y0 = np.mean(ydata)
+    x0 = np.mean(xdata, dtype=float)
+    y0 = np.mean(ydata, dtype=float)
     # Scale is initialized to be average radius of the closest 5 points
     r = np.hypot(xdata - x0, ydata - y0)
     th = np.arctan2(ydata - y0, xdata - x0)
-    closest_points = np.argsort(r)[:5]
+    # Partial sort, since only the 5 smallest are needed, in any order
+    closest_points = np.argpartition(r, 4)[:5]
     r0 = np.mean(r[closest_points])
     # Angle is initialized to be the circular mean of angles of those
     # same closest points
-    theta0 = np.rad2deg(circmean(th[closest_points]))
+    theta0 = np.rad2deg(_circmean(th[closest_points]))
     if DEBUG:
         print(f"{closest_points=}")
         print(f"{r[closest_points]=}")
@@ -74,6 +242,162 @@ def init_conic_from_xy(xdata, ydata):
     }
 
 
+def _init_values(init):
+    """
+    Initial parameters as a dict, from a ConicFitResult, an lmfit
+    result or Parameters, a dict or a sequence of five values
+    """
+    if isinstance(init, ConicFitResult):
+        values = init.params
+    elif hasattr(init, "valuesdict"):
+        values = init.valuesdict()
+    elif hasattr(init, "params"):
+        values = init.params.valuesdict()
+    elif isinstance(init, dict):
+        values = init
+    else:
+        values = dict(zip(PARAM_NAMES, np.asarray(init, dtype=float).reshape(-1)))
+    return {k: float(values[k]) for k in PARAM_NAMES}
+
+
+def _move_inside_bounds(params, margin=0.001):
+    """
+    Move any varying parameter that starts on or very near one of its
+    bounds to a fraction margin of the way inside, since leastsq maps
+    bounded parameters through a transform whose gradient vanishes at
+    the bounds, so that a parameter starting there never moves
+    """
+    for par in params.values():
+        if not par.vary:
+            continue
+        if np.isfinite(par.min) and np.isfinite(par.max):
+            step = margin * (par.max - par.min)
+        else:
+            step = margin * max(abs(par.value), 1.0)
+        if np.isfinite(par.min) and par.value < par.min + step:
+            par.set(value=par.min + step)
+        if np.isfinite(par.max) and par.value > par.max - step:
+            par.set(value=par.max - step)
+
+
+def _stratified_subsample(xdata, ydata, size, rng):
+    """
+    Indices of a subsample of size points that is spread evenly along
+    the arc: the points are ordered by their angle about the mean
+    position, divided into size strata of equal numbers of points, and
+    one point is chosen at random from each stratum.
+
+    Each stage of a subsampled fit in fit_conic_to_xy() starts from the
+    best fit of the previous one and needs only a few iterations, so
+    most evaluations are on small subsamples, while the final fit to
+    all the points gives the same result as a single fit from a good
+    start. The initial parameters are found from the first subsample.
+    """
+    n = len(xdata)
+    th = np.arctan2(ydata - np.mean(ydata), xdata - np.mean(xdata))
+    order = np.argsort(th)
+    picks = ((np.arange(size) + rng.uniform(size=size)) * (n / size)).astype(int)
+    return np.sort(order[np.minimum(picks, n - 1)])
+
+
+# Weight functions of the scaled residual z for each robust option of
+# fit_conic_to_xy(), together with the tuning constant (in units of the
+# robust standard deviation) that gives 95% efficiency for gaussian
+# noise. The "clip" option has weights of 0 or 1 instead.
+_ROBUST_WEIGHTS = {
+    "huber": (1.345, lambda z: 1.0 / np.maximum(1.0, np.abs(z))),
+    "cauchy": (2.385, lambda z: 1.0 / (1.0 + z**2)),
+    "soft_l1": (1.0, lambda z: 1.0 / np.sqrt(1.0 + z**2)),
+    "clip": (None, None),
+}
+
+
+def _robust_weights(r, robust, robust_scale, clip_sigma):
+    """
+    Weights of the points with residuals r, and the scale of the
+    residuals, which is the median absolute residual (converted to a
+    gaussian standard deviation) unless robust_scale is given
+    """
+    if robust_scale is None:
+        sigma = 1.4826 * np.median(np.abs(r))
+    else:
+        sigma = robust_scale
+    if sigma == 0.0:
+        return np.ones(len(r)), sigma
+    if robust == "clip":
+        return (np.abs(r) <= clip_sigma * sigma).astype(float), sigma
+    tuning, weight = _ROBUST_WEIGHTS[robust]
+    return weight(r / (tuning * sigma)), sigma
+
+
+def _reweighted_fit(
+    minner,
+    params,
+    x,
+    y,
+    eps,
+    eps_weighted,
+    robust,
+    robust_scale,
+    clip_sigma,
+    max_reweight,
+    block_size,
+    method,
+    fit_kws,
+):
+    """
+    Iteratively reweighted least squares. The weights of the points
+    are found from their residuals for the parameters params, the fit
+    is repeated with those weights starting from params, and so on
+    until the weights no longer change, or for at most max_reweight
+    passes. The weights w are applied by setting the eps_weighted
+    buffer, which the minimizer uses as the uncertainties of the
+    points, to eps / sqrt(w).
+
+    There is no ordinary fit first, since outliers can drag it far
+    from the best fit. The residuals are scaled by robust_scale, or by
+    default by the median absolute residual of each pass, times the
+    tuning constant of the weight function (see _ROBUST_WEIGHTS). With
+    robust="clip", points with residuals larger than clip_sigma times
+    the scale get zero weight, and the others a weight of one.
+
+    The result has the weights of the final pass, a boolean array
+    outliers marking the points with residuals larger than clip_sigma
+    times the scale, the number of weighted fits in nreweight, and
+    reweight_converged, which is False if the weights were still
+    changing after max_reweight passes. The nfev and njev of the fit
+    count all the passes.
+    """
+    w = None
+    nfev = 0
+    converged = False
+    for npass in range(max_reweight + 1):
+        p = [params[k].value for k in PARAM_NAMES]
+        r = conic_residual(p, x, y, eps, block_size=block_size)
+        # Clipping the residuals for the initial parameters, which may
+        # be far from the best fit, can reject most of the good points,
+        # so the first weights are found with the huber function instead
+        weights = "huber" if robust == "clip" and w is None else robust
+        w_new, sigma = _robust_weights(r, weights, robust_scale, clip_sigma)
+        if w is not None and np.max(np.abs(w_new - w)) < 1e-3:
+            converged = True
+            break
+        if npass == max_reweight:
+            break
+        w = w_new
+        with np.errstate(divide="ignore"):
+            np.divide(1.0 if eps is None else eps, np.sqrt(w), out=eps_weighted)
+        result = minner.minimize(method=method, params=params, **fit_kws)
+        nfev += result.nfev
+        params = result.params
+    result.nfev = nfev
+    result.nreweight = npass
+    result.reweight_converged = converged
+    result.weights = w
+    result.outliers = np.abs(r) > clip_sigma * sigma
+    return result
+
+
 def fit_conic_to_xy(
     xdata,
     ydata,
@@ -82,10 +406,119 @@ def fit_conic_to_xy(
     restrict_xy=False,
     restrict_theta=False,
     allow_negative_theta=True,
+    analytic_jacobian=True,
+    method="leastsq",
+    loss="linear",
+    f_scale=1.0,
+    init=None,
+    subsample=None,
+    refine_factor=10,
+    seed=None,
+    block_size=None,
+    robust=None,
+    robust_scale=None,
+    clip_sigma=3.0,
+    max_reweight=10,
 ):
-    """Fit a conic section curve to discrete (x, y) data points."""
+    """Fit a conic section curve to discrete (x, y) data points.
+
+    The starting point is found with init_conic_from_xy(), or with
+    init_conic_multistart() if init="multistart" (less likely to end
+    in a bad local minimum) or init_conic_algebraic() if
+    init="algebraic". It may also be known parameters, such as the fit
+    to a previous epoch (see track_conics()): a ConicFitResult, an
+    lmfit result or Parameters, a dict, or a sequence in the order of
+    PARAM_NAMES.
+
+    The analytic jacobian of residual_jacobian() is used unless
+    analytic_jacobian=False. The default method="leastsq" is
+    Levenberg-Marquardt, whereas method="least_squares" treats the
+    bounds directly, which is better when the best fit is near a limit
+    on theta0 or eccentricity, and allows a robust loss and f_scale
+    (see scipy.optimize.least_squares). The result has the numbers of
+    residual and jacobian evaluations in nfev and njev.
+
+    For very many points, set subsample to fit first to that many
+    points spread along the arc, then to refine_factor times as many,
+    and so on, ending with all of them (see _stratified_subsample());
+    nfev and njev then count only the final stage. Set block_size to
+    evaluate the residuals in blocks of that many points, which saves
+    memory and allows float32 data (see conic_residual()).
+
+    For data with stray points, set robust to "huber", "cauchy",
+    "soft_l1" or "clip" to fit by iteratively reweighted least squares
+    (see _reweighted_fit()). The result then also has the final
+    weights and outliers of the points, nreweight and
+    reweight_converged, which are kept in the stats of ConicFitResult.
+
+    Inside a confitti.profile() block, the numbers of evaluations and
+    the time spent on initialization and optimization are recorded.
+    """
+    import lmfit
+
+    if loss != "linear" and method != "least_squares":
+        raise ValueError(f"loss={loss!r} requires method='least_squares'")
+    if robust is not None and robust not in _ROBUST_WEIGHTS:
+        raise ValueError(f"Unknown robust option: {robust!r}")
+    if robust is not None and max_reweight < 1:
+        raise ValueError("max_reweight must be at least 1")
+    prof = profiling._active
+    if prof is not None:
+        t_start = time.perf_counter()
+    # Subsets of the points for each stage of the fit, ending with all
+    # of them
+    stages = []
+    if subsample is not None:
+        xdata, ydata = np.asarray(xdata), np.asarray(ydata)
+        rng = np.random.default_rng(seed)
+        size = subsample
+        while size < len(xdata):
+            stages.append(_stratified_subsample(xdata, ydata, size, rng))
+            size *= refine_factor
+    stages.append(slice(None))
+
+    def subset(stage):
+        if np.ndim(eps_data) == 0:
+            return xdata[stage], ydata[stage], eps_data
+        return xdata[stage], ydata[stage], np.asarray(eps_data)[stage]
+
+    # The initial parameters are found from the first stage
+    xinit, yinit, epsinit = subset(stages[0])
+    wrap_theta = init is not None
+    if init is None:
+        init = init_conic_from_xy(xinit, yinit)
+    elif not isinstance(init, str):
+        init = _init_values(init)
+    elif init == "multistart":
+        from .batch import init_conic_multistart
+
+        init = init_conic_multistart(
+            xinit,
+            yinit,
+            epsinit,
+            only_parabola=only_parabola,
+            restrict_xy=restrict_xy,
+            allow_negative_theta=allow_negative_theta,
+        )
+    elif init == "algebraic":
+        from .batch import init_conic_algebraic
+
+        init = init_conic_algebraic(xinit, yinit, only_parabola=only_parabola)
+    else:
+        raise ValueError(f"Unknown init option: {init!r}")
+    if wrap_theta:
+        # Any other starting point may have theta0 on or beyond one of
+        # its bounds (see below), so wrap it to well inside them
+        if allow_negative_theta:
+            init["theta0"] = (init["theta0"] + 45.0) % 360.0 - 45.0
+        else:
+            init["theta0"] %= 360.0
+    if only_parabola:
+        init["eccentricity"] = 1.0
+    if prof is not None:
+        t_init = time.perf_counter()
     # create a set of Parameters with initial values
-    params = lmfit.create_params(**init_conic_from_xy(xdata, ydata))
+    params = lmfit.create_params(**init)
     # Set limits on parameters
     params["r0"].set(min=0.0)
     if allow_negative_theta:
@@ -109,49 +542,157 @@ def fit_conic_to_xy(
         params["theta0"].set(
             min=params["theta0"].value - 45.0, max=params["theta0"].value + 45.0
         )
-    # Create Minimizer object
-    minner = lmfit.Minimizer(
-        residual, params, fcn_args=(xdata, ydata), fcn_kws={"eps": eps_data}
-    )
-    # do the fit
-    result = minner.minimize(method="leastsq")
+    _move_inside_bounds(params)
+    # Scratch space for the residuals and jacobian, and the jacobian
+    # itself, which are allocated once and shared by all evaluations,
+    # stages and reweighting passes. The residuals are not written
+    # into a shared buffer, since least_squares keeps hold of previous
+    # residual vectors.
+    nmax = len(xdata)
+    work = np.empty((3, nmax if block_size is None else min(block_size, nmax)))
+    nvary = sum(params[k].vary for k in PARAM_NAMES)
+    jac_buffer = np.empty((nmax, nvary))
+    # Keep count of the jacobian evaluations
+    njev = 0
+
+    def jacobian(*args, **kwargs):
+        nonlocal njev
+        njev += 1
+        return residual_jacobian(*args, out=jac_out, **kwargs)
+
+    fit_kws = {}
+    if analytic_jacobian and method in ("leastsq", "least_squares"):
+        fit_kws["Dfun"] = jacobian
+    if method == "least_squares":
+        # Note that lmfit uses the "trf" algorithm of least_squares
+        fit_kws.update(x_scale="jac", loss=loss, f_scale=f_scale)
+    # do the fit, in stages if subsampling
+    for stage in stages:
+        if stage is not stages[0]:
+            # Start from the best fit of the previous stage
+            for k, v in result.params.items():
+                params[k].set(value=v.value)
+        njev = 0
+        x, y, eps = subset(stage)
+        jac_out = jac_buffer[: len(x)]
+        # Robust fits reweight the points of the final stage, through
+        # their uncertainties, in a buffer that is updated in place
+        # between passes
+        reweight = robust is not None and stage is stages[-1]
+        eps_fit = np.empty(len(x)) if reweight else eps
+        minner = lmfit.Minimizer(
+            residual,
+            params,
+            fcn_args=(x, y),
+            fcn_kws={
+                "eps": eps_fit,
+                "block_size": block_size,
+                "work": work[:, : min(len(x), work.shape[1])],
+            },
+        )
+        if reweight:
+            result = _reweighted_fit(
+                minner,
+                params,
+                x,
+                y,
+                eps,
+                eps_fit,
+                robust,
+                robust_scale,
+                clip_sigma,
+                max_reweight,
+                block_size,
+                method,
+                fit_kws,
+            )
+        else:
+            result = minner.minimize(method=method, **fit_kws)
+    if "Dfun" in fit_kws:
+        result.njev = njev
+    elif not hasattr(result, "njev"):
+        result.njev = None
+    if prof is not None:
+        prof.add_fit(
+            nfev=result.nfev,
+            njev=result.njev or 0,
+            init=t_init - t_start,
+            optimize=time.perf_counter() - t_init,
+        )
     return result
 
 
 class XYconic:
-    """Cartesian coordinate curve of conic section."""
+    """Cartesian coordinate curve of conic section.
+
+    The npts points along the curve (x_pts, y_pts) are only calculated
+    the first time that they are needed, so that the object is cheap to
+    create when only the parameters or the apex and mirror points are
+    required. Use the sample() method to evaluate the curve at other
+    angles.
+    """
 
-    def __init__(self, x0, y0, r0, theta0, eccentricity, **kwargs):
+    def __init__(self, x0, y0, r0, theta0, eccentricity, npts=200, **kwargs):
         self.x0 = x0
         self.y0 = y0
         self.r0 = r0
         self.theta0 = theta0
         theta0_rad = np.deg2rad(theta0)
         self.eccentricity = eccentricity
-        if eccentricity < 1.0:
-            theta_pts = np.linspace(-np.pi, np.pi, 200)
-        else:
-            # for hyperbolae we only want one of the branches, which
-            # means going up to the asymptotic angle
-            theta_inf = np.pi - np.arctan(np.sqrt(eccentricity**2 - 1))
-            theta_pts = np.linspace(-theta_inf, theta_inf, 200)
+        self.npts = npts
 
         if kwargs:
             self.extra_params = kwargs
 
-        r_pts = (
-            self.r0
-            * (1 + self.eccentricity)
-            / (1 + self.eccentricity * np.cos(theta_pts))
-        )
-        self.x_pts = self.x0 + r_pts * np.cos(theta0_rad + theta_pts)
-        self.y_pts = self.y0 + r_pts * np.sin(theta0_rad + theta_pts)
         self.x_apex = self.x0 + self.r0 * np.cos(theta0_rad)
         self.y_apex = self.y0 + self.r0 * np.sin(theta0_rad)
         d = self.r0 / self.eccentricity
         self.x_mirror = self.x0 + (self.r0 + d) * np.cos(theta0_rad)
         self.y_mirror = self.y0 + (self.r0 + d) * np.sin(theta0_rad)
 
+    @property
+    def theta_max(self):
+        """Largest angle from the axis (in radians) that is on the curve"""
+        if self.eccentricity < 1.0:
+            return np.pi
+        else:
+            # for hyperbolae we only want one of the branches, which
+            # means going up to the asymptotic angle
+            return np.pi - np.arctan(np.sqrt(self.eccentricity**2 - 1))
+
+    @cached_property
+    def theta_pts(self):
+        """Angles from the axis (in radians) of the points x_pts, y_pts"""
+        return np.linspace(-self.theta_max, self.theta_max, self.npts)
+
+    def sample(self, theta):
+        """
+        Return the cartesian coordinates (x, y) of points on the curve
+        at angles theta (in radians) from the axis, measured at the focus.
+        """
+        theta = np.asarray(theta)
+        r = (
+            self.r0
+            * (1 + self.eccentricity)
+            / (1 + self.eccentricity * np.cos(theta))
+        )
+        theta = np.deg2rad(self.theta0) + theta
+        return self.x0 + r * np.cos(theta), self.y0 + r * np.sin(theta)
+
+    @cached_property
+    def _xy_pts(self):
+        return self.sample(self.theta_pts)
+
+    @property
+    def x_pts(self):
+        """x coordinates of npts points along the curve"""
+        return self._xy_pts[0]
+
+    @property
+    def y_pts(self):
+        """y coordinates of npts points along the curve"""
+        return self._xy_pts[1]
+
     def __repr__(self):
         return (
             f"Conic(x0={self.x0}, y0={self.y0}, r0={self.r0}, "
@@ -166,21 +707,165 @@ class XYconic:
         )
 
 
+def _params_array(params, **fixed):
+    """
+    Array of shape (N, 5) of conic parameters, in the order of
+    PARAM_NAMES, from an array, a dict (or DataFrame) of columns, a
+    list of dicts, a ConicFitCatalog or a ConicChain. Any parameters
+    that are missing from params can be given as scalar keywords.
+    """
+    if hasattr(params, "params_array"):
+        # ConicChain
+        return params.params_array()
+    if hasattr(params, "params") and isinstance(params.params, dict):
+        # ConicFitCatalog
+        params = params.params
+    if isinstance(params, (list, tuple)) and params and isinstance(params[0], dict):
+        # List of records, such as flatchain.to_dict(orient="records")
+        params = {
+            k: [row[k] for row in params]
+            for k in PARAM_NAMES
+            if k in params[0]
+        }
+    if hasattr(params, "keys"):
+        columns = [params[k] if k in params else fixed[k] for k in PARAM_NAMES]
+        columns = np.broadcast_arrays(*[np.asarray(c, dtype=float) for c in columns])
+        return np.stack(columns, axis=-1).reshape(-1, len(PARAM_NAMES))
+    return np.asarray(params, dtype=float).reshape(-1, len(PARAM_NAMES))
+
+
+class XYconics:
+    """Cartesian coordinate curves of many conic sections at once.
+
+    This is the vectorized version of XYconic, which is useful for
+    plotting the curves of many samples from an MCMC chain. The params
+    may be an array of shape (N, 5), with columns in the order of
+    PARAM_NAMES, a dict or DataFrame of columns, a list of dicts, a
+    ConicFitCatalog or a ConicChain. Parameters that are not included
+    in params may be given as keywords, for instance eccentricity=1.0
+    for the chain of a parabola fit.
+
+    The attributes are arrays of length N, except for x_pts and y_pts,
+    which have shape (N, npts). Each curve spans its own range of
+    angles, depending on whether it is an ellipse or a hyperbola.
+    Indexing with an integer gives the XYconic of a single curve.
+    """
+
+    def __init__(self, params, npts=200, **fixed):
+        P = _params_array(params, **fixed)
+        self.x0, self.y0, self.r0, self.theta0, self.eccentricity = P.T
+        self.npts = npts
+        theta0_rad = np.deg2rad(self.theta0)
+        cos_theta0, sin_theta0 = np.cos(theta0_rad), np.sin(theta0_rad)
+        self.x_apex = self.x0 + self.r0 * cos_theta0
+        self.y_apex = self.y0 + self.r0 * sin_theta0
+        with np.errstate(divide="ignore"):
+            d = self.r0 / self.eccentricity
+        self.x_mirror = self.x0 + (self.r0 + d) * cos_theta0
+        self.y_mirror = self.y0 + (self.r0 + d) * sin_theta0
+
+    def __len__(self):
+        return len(self.x0)
+
+    def __getitem__(self, i):
+        return XYconic(
+            self.x0[i],
+            self.y0[i],
+            self.r0[i],
+            self.theta0[i],
+            self.eccentricity[i],
+            npts=self.npts,
+        )
+
+    @property
+    def theta_max(self):
+        """Largest angle from the axis (in radians) of each curve"""
+        e = self.eccentricity
+        return np.where(
+            e < 1.0, np.pi, np.pi - np.arctan(np.sqrt(np.maximum(e**2 - 1, 0.0)))
+        )
+
+    @cached_property
+    def theta_pts(self):
+        """Angles from the axis (in radians) of the points x_pts, y_pts"""
+        return np.linspace(-self.theta_max, self.theta_max, self.npts, axis=-1)
+
+    def sample(self, theta):
+        """
+        Return the cartesian coordinates (x, y) of points on all the
+        curves at angles theta (in radians) from the axis, measured at
+        the focus. If theta has shape (M,), then the same angles are
+        used for every curve, and x, y have shape (N, M).
+        """
+        theta = np.asarray(theta)
+        if theta.ndim < 2:
+            theta = theta[None, ...]
+        e = self.eccentricity[:, None]
+        with np.errstate(divide="ignore"):
+            r = self.r0[:, None] * (1 + e) / (1 + e * np.cos(theta))
+        theta = np.deg2rad(self.theta0)[:, None] + theta
+        return self.x0[:, None] + r * np.cos(theta), self.y0[:, None] + r * np.sin(theta)
+
+    @cached_property
+    def _xy_pts(self):
+        return self.sample(self.theta_pts)
+
+    @property
+    def x_pts(self):
+        """x coordinates of npts points along each curve, shape (N, npts)"""
+        return self._xy_pts[0]
+
+    @property
+    def y_pts(self):
+        """y coordinates of npts points along each curve, shape (N, npts)"""
+        return self._xy_pts[1]
+
+    def __repr__(self):
+        return f"XYconics with {len(self)} curves"
+
+
 class ConicFitResult:
     """Result of fitting a conic section to XY data points.
 
     Includes best-fit parameters (params) and uncertainties (uparams),
-    together with the xy curve (xy)
+    together with the xy curve (xy) and the covariance matrix (covar)
+    of the five conic parameters, in the order of PARAM_NAMES, which
+    has zeros in the rows and columns of any fixed parameters.
 
+    The parameter values are stored internally in small float64
+    arrays, in the order of PARAM_NAMES, and the params and uparams
+    dicts are created each time they are accessed. Any extra
+    parameters, such as __lnsigma from an emcee fit, are kept
+    separately. The xy curve is only created when it is first needed.
     """
 
-    def __init__(self, result: lmfit.minimizer.MinimizerResult=None):
+    __slots__ = (
+        "_values",
+        "_uvalues",
+        "_extra_params",
+        "_extra_uparams",
+        "_covar",
+        "_xy",
+        "stats",
+        "lmfit_result",
+    )
+
+    def __init__(self, result: "lmfit.minimizer.MinimizerResult" = None):
+        # Only the conversion of a fit result is profiled, since an
+        # empty object is filled in from a result that has already been
+        # counted, as by from_dict() in the parent process of fit_many()
+        prof = None if result is None else profiling._active
+        if prof is not None:
+            t_start = time.perf_counter()
+        self._xy = None
+        self._covar = None
+        self.lmfit_result = None
         if result is None:
             # Allow initialization with no result with a view to
             # filling things in later (see from_dict() method for instance)
             self.params = {}
             self.uparams = {}
-            self.xy = None
+            self.stats = {}
         else:
             # Make sure everything is is a standard float so that it will serialize nicely
             self.params = {k: float(v.value) for (k, v) in result.params.items()}
@@ -190,7 +875,91 @@ class ConicFitResult:
             # parabola-only case
             self.uparams = {k: (0.0 if v.stderr is None else float(v.stderr))
                             for (k, v) in result.params.items()}
-            self.xy = XYconic(**self.params)
+            # Expand the covariance of the varying parameters to all
+            # five conic parameters, leaving out any others such as __lnsigma
+            if getattr(result, "covar", None) is not None:
+                covar = np.zeros((len(PARAM_NAMES), len(PARAM_NAMES)))
+                index = [
+                    (PARAM_NAMES.index(k), j)
+                    for (j, k) in enumerate(result.var_names)
+                    if k in PARAM_NAMES
+                ]
+                i, j = np.array(index).T
+                covar[np.ix_(i, i)] = result.covar[np.ix_(j, j)]
+                self._covar = covar
+            # Summary of the fit, which allows the cost of different
+            # fitting methods to be compared
+            self.stats = {
+                "method": result.method,
+                "nfev": int(result.nfev),
+                "njev": None if getattr(result, "njev", None) is None else int(result.njev),
+                "chisqr": float(result.chisqr),
+                "redchi": float(result.redchi),
+                "success": bool(result.success),
+            }
+            if getattr(result, "outliers", None) is not None:
+                self.stats["noutliers"] = int(np.count_nonzero(result.outliers))
+                self.stats["reweight_converged"] = bool(result.reweight_converged)
+        if prof is not None:
+            prof.add_time("result", time.perf_counter() - t_start)
+
+    @staticmethod
+    def _to_dict(values, extra):
+        """Combine the array of conic parameters with any extra ones"""
+        if values is None:
+            return {}
+        d = dict(zip(PARAM_NAMES, values.tolist()))
+        if extra:
+            d.update(extra)
+        return d
+
+    @staticmethod
+    def _from_dict(d):
+        """Split a dict into an array of conic parameters and the rest"""
+        if not d:
+            return None, None
+        values = np.array([d[k] for k in PARAM_NAMES], dtype=float)
+        extra = {k: v for (k, v) in d.items() if k not in PARAM_NAMES}
+        return values, (extra or None)
+
+    @property
+    def params(self) -> dict:
+        """Best-fit parameters"""
+        return self._to_dict(self._values, self._extra_params)
+
+    @params.setter
+    def params(self, d: dict):
+        self._values, self._extra_params = self._from_dict(d)
+        self._xy = None
+
+    @property
+    def uparams(self) -> dict:
+        """Uncertainties of best-fit parameters"""
+        return self._to_dict(self._uvalues, self._extra_uparams)
+
+    @uparams.setter
+    def uparams(self, d: dict):
+        self._uvalues, self._extra_uparams = self._from_dict(d)
+
+    @property
+    def covar(self):
+        """Covariance matrix of the conic parameters, shape (5, 5), or None"""
+        return self._covar
+
+    @covar.setter
+    def covar(self, value):
+        self._covar = None if value is None else np.asarray(value, dtype=float)
+
+    @property
+    def xy(self):
+        """XYconic curve for the best-fit parameters"""
+        if self._xy is None and self._values is not None:
+            self._xy = XYconic(**self.params)
+        return self._xy
+
+    @xy.setter
+    def xy(self, value):
+        self._xy = value
 
     def __repr__(self):
         return f"ConicFitResult({self.params})"
@@ -203,10 +972,14 @@ class ConicFitResult:
         This may be used to serialize the object to JSON or YAML.
         The XYconic object is omitted since it can be recreated from the params.
         """
-        return {
+        d = {
             "params": self.params,
             "uparams": self.uparams,
+            "stats": self.stats,
         }
+        if self._covar is not None:
+            d["covar"] = self._covar.tolist()
+        return d
 
     @classmethod
     def from_dict(cls, d: dict):
@@ -217,14 +990,17 @@ class ConicFitResult:
         rslt = cls()
         rslt.params = d["params"]
         rslt.uparams = d["uparams"]
-        rslt.xy = XYconic(**d["params"])
-        rslt.lmfit_result = None
+        # Files written by older versions do not have the fit statistics
+        rslt.stats = d.get("stats", {})
+        rslt.covar = d.get("covar")
         return rslt
- 
+
     def write(self, filename: str):
         """Save the ConicFitResult object to a file in JSON/YAML format."""
         with open(filename, "w") as f:
             if filename.lower().endswith(".yaml"):
+                import yaml
+
                 yaml.safe_dump(self.to_dict(), f)
             else:
                 json.dump(self.to_dict(), f)
@@ -234,6 +1010,8 @@ class ConicFitResult:
         """Read the ConicFitResult object from a file in JSON format."""
         with open(filename, "r") as f:
             if filename.lower().endswith(".yaml"):
+                import yaml
+
                 d = yaml.safe_load(f)
             else:
                 d = json.load(f)
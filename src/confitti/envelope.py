@@ -0,0 +1,208 @@
+"""Percentile envelopes of the radius of many conics on a polar grid."""
+
+import warnings
+import numpy as np
+from .confitti import PARAM_NAMES, _params_array
+
+__all__ = ["RadiusEnvelope", "conic_radius_envelope"]
+
+
+def _ray_conic_radius(P, origin, phi):
+    """
+    Distance from the point origin = (x, y) along rays at position
+    angles phi (in radians) to the curves of the conics whose
+    parameters are the rows of P, an array of shape (N, 5). Returns an
+    array of shape (N, len(phi)), which is inf where the ray does not
+    cross the curve, as happens towards the open side of a parabola or
+    hyperbola.
+
+    The curve is the locus where the distance to the focus is
+    eccentricity times the distance to the directrix, which gives a
+    quadratic equation for the distance s along the ray. We take the
+    nearest positive root on the same side of the directrix as the
+    focus, since the other root belongs to the second branch of a
+    hyperbola.
+    """
+    x0, y0, r0, theta0, e = (c[:, None] for c in P.T)
+    theta0 = np.deg2rad(theta0)
+    # Unit vectors along the rays and the conic axes
+    ux, uy = np.cos(phi), np.sin(phi)
+    nx, ny = np.cos(theta0), np.sin(theta0)
+    # Origin relative to the focus
+    wx, wy = origin[0] - x0, origin[1] - y0
+    un = ux * nx + uy * ny
+    wu = wx * ux + wy * uy
+    # e times the distance of the origin from the directrix
+    g = r0 * (1 + e) - e * (wx * nx + wy * ny)
+    a = 1 - (e * un) ** 2
+    b = wu + e * un * g
+    c = wx**2 + wy**2 - g**2
+    s = np.full(np.broadcast_shapes(un.shape, g.shape), np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        disc = np.sqrt(b**2 - a * c)
+        roots = [(-b - disc) / a, (-b + disc) / a]
+        linear = np.abs(a) < 1e-12
+        if linear.any():
+            # The ray is parallel to the axis of a parabola
+            roots.append(np.where(linear, -c / (2 * b), np.nan))
+        for root in roots:
+            valid = (root > 0) & (root < s) & (g >= e * un * root)
+            np.copyto(s, root, where=valid)
+    return s
+
+
+class RadiusEnvelope:
+    """Percentiles of the radius of a set of conics, as a function of angle.
+
+    The radius is measured from the fixed point origin = (x, y), along
+    rays at position angles phi (in degrees, measured in the same way
+    as theta0). The array radius has shape (len(percentiles), len(phi)),
+    and is inf wherever that percentile of the curves do not cross the
+    ray at all.
+    """
+
+    def __init__(self, origin, phi, percentiles, radius, nsamples):
+        self.origin = origin
+        self.phi = phi
+        self.percentiles = percentiles
+        self.radius = radius
+        self.nsamples = nsamples
+
+    def __repr__(self):
+        return (
+            f"RadiusEnvelope of {self.nsamples} conics at {len(self.phi)} angles, "
+            f"percentiles {list(self.percentiles)}"
+        )
+
+    def xy(self, percentile):
+        """Cartesian coordinates (x, y) of the envelope for one percentile"""
+        r = self.radius[list(self.percentiles).index(percentile)]
+        phi = np.deg2rad(self.phi)
+        return self.origin[0] + r * np.cos(phi), self.origin[1] + r * np.sin(phi)
+
+
+def _sample_chunks(samples, mean, cov, nsamples, chunk_size, seed):
+    """
+    Yield successive arrays of shape (chunk_size, 5) of parameters,
+    either taken from samples, or drawn from a multivariate normal
+    distribution with the given mean and covariance
+    """
+    if samples is not None:
+        if hasattr(samples, "flatchain"):
+            # ConicChain: expand to all five parameters one chunk at a time
+            n = len(samples)
+            flat = samples.flatchain
+            for start in range(0, n, chunk_size):
+                P = np.empty((min(chunk_size, n - start), len(PARAM_NAMES)))
+                for i, k in enumerate(PARAM_NAMES):
+                    if k in samples.var_names:
+                        j = samples.var_names.index(k)
+                        P[:, i] = flat[start : start + chunk_size, j]
+                    else:
+                        P[:, i] = samples.fixed[k]
+                yield P
+            return
+        if not (isinstance(samples, np.ndarray) and samples.ndim == 2):
+            samples = _params_array(samples)
+        for start in range(0, len(samples), chunk_size):
+            yield np.asarray(samples[start : start + chunk_size], dtype=float)
+        return
+    rng = np.random.default_rng(seed)
+    mean = _params_array(mean)[0]
+    cov = np.asarray(cov, dtype=float)
+    for start in range(0, nsamples, chunk_size):
+        yield rng.multivariate_normal(
+            mean, cov, size=min(chunk_size, nsamples - start), method="eigh"
+        )
+
+
+def conic_radius_envelope(
+    samples=None,
+    mean=None,
+    cov=None,
+    nsamples=10000,
+    origin=None,
+    phi=None,
+    percentiles=(2.5, 16.0, 50.0, 84.0, 97.5),
+    chunk_size=10000,
+    nbins=2000,
+    span=10.0,
+    seed=None,
+):
+    """Percentile envelopes of the radius of conics about a fixed origin.
+
+    The conics are either given as samples (a ConicChain, an array of
+    shape (N, 5), which may be memory-mapped, or anything else that is
+    accepted by XYconics), or else nsamples of them are drawn from a
+    multivariate normal distribution with mean (a dict or array of the
+    five parameters) and covariance matrix cov (shape (5, 5) in the
+    order of PARAM_NAMES).
+
+    The origin defaults to the median focus position of the first
+    chunk of samples (or the mean), and the position angles phi (in
+    degrees) default to 361 angles spanning a full circle, centered on
+    the median axis direction.
+
+    The samples are processed in chunks of chunk_size, so that very
+    long chains do not have to fit in memory at once. For each angle,
+    the radii are accumulated in a histogram of nbins logarithmic bins
+    between 1/span and span times the median radius of the first chunk,
+    and the percentiles are found by interpolating in the cumulative
+    histogram. Percentiles that fall below the histogram range are
+    given as the lowest bin edge, and those above as inf.
+
+    Returns a RadiusEnvelope.
+    """
+    chunks = _sample_chunks(samples, mean, cov, nsamples, chunk_size, seed)
+    P = next(chunks)
+    if origin is None:
+        origin = np.median(P[:, 0]), np.median(P[:, 1])
+    if phi is None:
+        theta0 = np.deg2rad(P[:, 3])
+        axis = np.rad2deg(np.arctan2(np.sin(theta0).sum(), np.cos(theta0).sum()))
+        phi = axis + np.linspace(-180.0, 180.0, 361)
+    phi = np.asarray(phi, dtype=float)
+    phi_rad = np.deg2rad(phi)
+    nphi = len(phi)
+
+    R = _ray_conic_radius(P, origin, phi_rad)
+    # Reference radius for each angle, which sets the histogram range
+    with warnings.catch_warnings():
+        # Angles at which no curve is crossed are handled below
+        warnings.simplefilter("ignore", RuntimeWarning)
+        rref = np.nanmedian(np.where(np.isfinite(R), R, np.nan), axis=0)
+    rref = np.where(np.isfinite(rref), rref, np.nanmedian(rref))
+    rref = np.where(np.isfinite(rref) & (rref > 0), rref, 1.0)
+    lnspan = np.log(span)
+    # Bin 0 is for underflow and bin nbins + 1 for overflow
+    counts = np.zeros((nphi, nbins + 2), dtype=np.int64)
+    offsets = np.arange(nphi) * (nbins + 2)
+    n = 0
+    while R is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            u = (np.log(R / rref) + lnspan) / (2 * lnspan)
+        ibin = np.floor(np.nan_to_num(u, nan=2.0, posinf=2.0, neginf=-1.0) * nbins)
+        ibin = np.clip(ibin, -1, nbins).astype(np.int64) + 1
+        counts += np.bincount(
+            (ibin + offsets).ravel(), minlength=nphi * (nbins + 2)
+        ).reshape(nphi, nbins + 2)
+        n += len(R)
+        P = next(chunks, None)
+        R = None if P is None else _ray_conic_radius(P, origin, phi_rad)
+
+    # Percentiles by linear interpolation within the bins, in log radius
+    cumulative = np.cumsum(counts, axis=1)
+    radius = np.empty((len(percentiles), nphi))
+    for i, q in enumerate(percentiles):
+        target = q / 100 * n
+        ibin = np.argmax(cumulative >= target, axis=1)
+        below = np.take_along_axis(cumulative, ibin[:, None] - 1, axis=1)[:, 0]
+        below = np.where(ibin > 0, below, 0)
+        inbin = counts[np.arange(nphi), ibin]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frac = np.clip((target - below) / inbin, 0.0, 1.0)
+        u = (ibin - 1 + np.nan_to_num(frac)) / nbins
+        r = rref * np.exp(2 * lnspan * u - lnspan)
+        r = np.where(ibin == 0, rref / span, r)
+        radius[i] = np.where(ibin == nbins + 1, np.inf, r)
+    return RadiusEnvelope(origin, phi, tuple(percentiles), radius, n)
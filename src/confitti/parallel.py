@@ -0,0 +1,153 @@
+"""Fit conic sections to many datasets using a pool of worker processes."""
+
+import os
+import itertools
+from collections import deque
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from .confitti import fit_conic_to_xy, ConicFitResult
+from . import profiling
+
+__all__ = ["fit_many"]
+
+
+def _fit_chunk(chunk, fit_kws, skip_errors=False, profile_pid=None, keep_records=False):
+    """
+    Worker function: fit each dataset in a chunk and return only the
+    lightweight to_dict() payloads, since the lmfit results do not
+    pickle well. With skip_errors, datasets whose fit raises an
+    exception are left out, and the index and error message of each
+    are returned instead.
+
+    If profile_pid is the id of a parent process that is profiling the
+    fits, and we are running in a different process, then a FitProfile
+    of the chunk is also returned, to be merged by the parent.
+    """
+    profile = None
+    if profile_pid is not None and profile_pid != os.getpid():
+        profile = profiling.FitProfile(keep_records=keep_records)
+        profiling._active = profile
+    payloads = []
+    errors = []
+    try:
+        for index, data in chunk:
+            xdata, ydata, *rest = data
+            eps_data = rest[0] if rest else None
+            try:
+                result = fit_conic_to_xy(xdata, ydata, eps_data, **fit_kws)
+            except Exception as exc:
+                if not skip_errors:
+                    raise
+                message = type(exc).__name__
+                if str(exc):
+                    message += f": {exc}"
+                errors.append((index, message))
+                continue
+            payloads.append((index, ConicFitResult(result).to_dict()))
+    finally:
+        if profile is not None:
+            profiling._active = None
+    return payloads, errors, profile
+
+
+def _chunked(iterable, size):
+    """Split an iterable into lists of length size (the last may be shorter)"""
+    it = iter(iterable)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+
+def _submit_bounded(executor, fn, tasks, max_pending, ordered):
+    """
+    Submit fn(*args) to the executor for each args tuple in tasks,
+    with no more than max_pending in flight at any one time, and yield
+    the return values in order (if ordered=True) or as they complete.
+    """
+    tasks = iter(tasks)
+    pending = deque(
+        executor.submit(fn, *args) for args in itertools.islice(tasks, max_pending)
+    )
+    while pending:
+        if ordered:
+            done = [pending.popleft()]
+        else:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+        for future in done:
+            yield future.result()
+        # Top up the queue with as many new tasks as were completed
+        for args in itertools.islice(tasks, len(done)):
+            pending.append(executor.submit(fn, *args))
+
+
+def fit_many(
+    datasets,
+    workers=None,
+    chunksize=16,
+    ordered=True,
+    max_pending=None,
+    executor=None,
+    skip_errors=False,
+    **fit_kws,
+):
+    """Fit conic sections to many datasets in parallel.
+
+    Each dataset is a tuple (xdata, ydata) or (xdata, ydata, eps_data),
+    and any extra keyword arguments are passed on to fit_conic_to_xy().
+    Datasets are sent to a pool of workers processes in chunks of
+    chunksize, and no more than max_pending chunks (default: twice the
+    number of workers) are in flight at any one time, so datasets may
+    be a lazy iterable of arbitrary length.
+
+    This is a generator that yields (index, ConicFitResult) pairs,
+    where index is the position of the dataset in the input. Results
+    are yielded in input order if ordered=True, or else as soon as
+    each chunk is completed. With workers=1, the fits are done in the
+    current process.
+
+    An existing concurrent.futures executor may be given, so that the
+    same pool of workers can be reused for several calls, in which
+    case it is not shut down afterwards.
+
+    If skip_errors=True, then any dataset whose fit raises an exception
+    (for instance, because it has too few points) is skipped, so there
+    will be gaps in the sequence of indices that are yielded. It may
+    also be a function, which is then called in the current process
+    with the index and the error message of each dataset that is
+    skipped, for instance to report them.
+    """
+    on_error = skip_errors if callable(skip_errors) else None
+    skip_errors = bool(skip_errors)
+    chunks = _chunked(enumerate(datasets), chunksize)
+    if executor is None and workers == 1:
+        for chunk in chunks:
+            payloads, errors, _ = _fit_chunk(chunk, fit_kws, skip_errors)
+            if on_error is not None:
+                for index, message in errors:
+                    on_error(index, message)
+            for index, d in payloads:
+                yield index, ConicFitResult.from_dict(d)
+        return
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    prof = profiling._active
+    if prof is None:
+        profile_args = ()
+    else:
+        keep_records = bool(prof.hooks) or prof.records is not None
+        profile_args = (os.getpid(), keep_records)
+    tasks = ((chunk, fit_kws, skip_errors, *profile_args) for chunk in chunks)
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        for payloads, errors, profile in _submit_bounded(
+            executor, _fit_chunk, tasks, max_pending, ordered
+        ):
+            if profile is not None:
+                prof.merge(profile)
+            if on_error is not None:
+                for index, message in errors:
+                    on_error(index, message)
+            for index, d in payloads:
+                yield index, ConicFitResult.from_dict(d)
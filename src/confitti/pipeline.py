@@ -0,0 +1,227 @@
+"""Stream groups of points from large files, fit them, and save the results."""
+
+import csv
+import itertools
+from collections import deque
+import numpy as np
+from .catalog import CatalogWriter
+from .parallel import fit_many
+
+__all__ = ["iter_groups_csv", "iter_groups_array", "fit_groups", "fit_file"]
+
+
+def _split_groups(blocks):
+    """
+    Yield (id, (x, y)) or (id, (x, y, eps)) for each run of consecutive
+    rows with the same id, from an iterable of blocks of rows given as
+    (ids, x, y, eps) arrays, where eps may be None. A group may span
+    more than one block.
+    """
+    carry = None
+    for ids, x, y, eps in blocks:
+        if carry is not None:
+            # Prepend the unfinished group from the previous block
+            ids, x, y = (
+                np.concatenate([a, b]) for (a, b) in zip(carry[:3], (ids, x, y))
+            )
+            if eps is not None:
+                eps = np.concatenate([carry[3], eps])
+        if len(ids) == 0:
+            continue
+        starts = np.flatnonzero(ids[1:] != ids[:-1]) + 1
+        bounds = np.concatenate([[0], starts, [len(ids)]])
+        # All but the last group are complete
+        for i, j in zip(bounds[:-2], bounds[1:-1]):
+            data = (x[i:j], y[i:j]) if eps is None else (x[i:j], y[i:j], eps[i:j])
+            yield ids[i].item(), data
+        i = bounds[-2]
+        carry = (ids[i:], x[i:], y[i:], None if eps is None else eps[i:])
+    if carry is not None and len(carry[0]):
+        ids, x, y, eps = carry
+        yield ids[0].item(), ((x, y) if eps is None else (x, y, eps))
+
+
+def iter_groups_csv(
+    filename,
+    id_column="id",
+    x_column="x",
+    y_column="y",
+    eps_column=None,
+    block_rows=100_000,
+    **csv_kws,
+):
+    """Stream groups of points from a CSV file.
+
+    The file must have a header row that names the columns, and the
+    rows of each group (arc) must be consecutive, with the same value
+    in the id column. The file is read in blocks of block_rows rows, so
+    only a little more than one block needs to be held in memory. Any
+    extra keyword arguments are passed on to csv.reader (for instance
+    delimiter).
+
+    This is a generator that yields (id, (x, y)) pairs, or
+    (id, (x, y, eps)) if eps_column is given, where x, y and eps are
+    float arrays, and id is a string.
+    """
+    with open(filename, newline="") as f:
+        reader = csv.reader(f, **csv_kws)
+        header = next(reader)
+        columns = [id_column, x_column, y_column]
+        if eps_column is not None:
+            columns.append(eps_column)
+        icols = [header.index(c) for c in columns]
+
+        def blocks():
+            while rows := list(itertools.islice(reader, block_rows)):
+                ids = np.array([row[icols[0]] for row in rows])
+                values = np.array(
+                    [[row[i] for i in icols[1:]] for row in rows], dtype=float
+                )
+                eps = values[:, 2] if eps_column is not None else None
+                yield ids, values[:, 0], values[:, 1], eps
+
+        yield from _split_groups(blocks())
+
+
+def iter_groups_array(
+    data,
+    id_column="id",
+    x_column="x",
+    y_column="y",
+    eps_column=None,
+    block_rows=100_000,
+):
+    """Stream groups of points from an array or a .npy file.
+
+    If data is a filename, the file is memory-mapped so that only the
+    rows in use are read from disk. The array is either a structured
+    array with fields named by id_column, x_column, y_column (and
+    optionally eps_column), or a 2d array with columns (id, x, y) or
+    (id, x, y, eps), in which case the column arguments are ignored
+    and the ids are converted to integers. The rows of each group must
+    be consecutive.
+
+    This is a generator that yields (id, (x, y)) or (id, (x, y, eps))
+    pairs, as for iter_groups_csv().
+    """
+    if isinstance(data, str):
+        data = np.load(data, mmap_mode="r")
+    if data.dtype.names is not None:
+        with_eps = eps_column is not None
+        columns = (id_column, x_column, y_column, eps_column)
+    else:
+        with_eps = data.shape[1] > 3
+        columns = (0, 1, 2, 3)
+
+    def column(block, c):
+        return block[c] if data.dtype.names is not None else block[:, c]
+
+    def blocks():
+        for start in range(0, len(data), block_rows):
+            block = data[start : start + block_rows]
+            ids, x, y = (np.array(column(block, c)) for c in columns[:3])
+            if data.dtype.names is None:
+                ids = ids.astype(np.int64)
+            eps = np.array(column(block, columns[3]), dtype=float) if with_eps else None
+            yield ids, x.astype(float), y.astype(float), eps
+
+    yield from _split_groups(blocks())
+
+
+def fit_groups(
+    groups,
+    output=None,
+    workers=None,
+    chunksize=16,
+    max_pending=None,
+    min_points=5,
+    flush_every=1024,
+    **fit_kws,
+):
+    """Fit conic sections to a stream of groups of points.
+
+    The groups are (id, data) pairs, such as produced by
+    iter_groups_csv() or iter_groups_array(), where data is
+    (xdata, ydata) or (xdata, ydata, eps_data). They are fitted with
+    fit_many(), which also accepts skip_errors and executor, and passes
+    any other keyword arguments on to fit_conic_to_xy(). Groups are
+    read from the input only as fast as the workers fit them, since no
+    more than max_pending chunks of chunksize groups are in flight at
+    once, which keeps the memory use bounded however large the input
+    is. Groups with fewer than min_points points are skipped, since
+    they cannot be fitted. If skip_errors is a function, it is called
+    with the id, rather than the index, of each group whose fit fails.
+
+    If output is given, the results are appended to a bulk .npz
+    catalog file with that name (see CatalogWriter), which includes the
+    id of each group, flushing to disk every flush_every results.
+
+    This is a generator that yields (id, ConicFitResult) pairs in the
+    order of the input.
+    """
+    # Index in the stream of datasets and id of each group that has
+    # been passed to fit_many(), but whose result has not yet arrived
+    pending_ids = deque()
+
+    def datasets():
+        index = 0
+        for id, data in groups:
+            if len(data[0]) < min_points:
+                continue
+            pending_ids.append((index, id))
+            index += 1
+            yield data
+
+    # Report the errors of skipped groups by their ids
+    on_error = fit_kws.get("skip_errors")
+    if callable(on_error):
+        fit_kws["skip_errors"] = lambda index, message: on_error(
+            dict(pending_ids)[index], message
+        )
+
+    def pop_id(index):
+        # Drop the ids of any earlier groups whose fit failed, which
+        # only happens with skip_errors=True
+        i, id = pending_ids.popleft()
+        while i != index:
+            i, id = pending_ids.popleft()
+        return id
+
+    results = fit_many(
+        datasets(),
+        workers=workers,
+        chunksize=chunksize,
+        ordered=True,
+        max_pending=max_pending,
+        **fit_kws,
+    )
+    if output is None:
+        for index, result in results:
+            yield pop_id(index), result
+        return
+    with CatalogWriter(output, flush_every=flush_every) as writer:
+        for index, result in results:
+            id = pop_id(index)
+            writer.append(result, id)
+            yield id, result
+
+
+def fit_file(filename, output, **kws):
+    """Fit all the groups of points in a file and save the results.
+
+    The input file is a CSV file or a .npy file (see iter_groups_csv()
+    and iter_groups_array()), and the results are written to the bulk
+    .npz catalog file output. The keyword arguments are passed to the
+    group reader if they are accepted by it, and otherwise to
+    fit_groups(). Returns the number of groups that were fitted.
+    """
+    reader_args = ("id_column", "x_column", "y_column", "eps_column", "block_rows")
+    reader_kws = {k: kws.pop(k) for k in reader_args if k in kws}
+    if str(filename).lower().endswith(".npy"):
+        groups = iter_groups_array(str(filename), **reader_kws)
+    else:
+        groups = iter_groups_csv(filename, **reader_kws)
+    count = 0
+    for _ in fit_groups(groups, output=output, **kws):
+        count += 1
+    return count
@@ -0,0 +1,119 @@
+"""Optional instrumentation of where the time goes in conic fits."""
+
+from contextlib import contextmanager
+
+__all__ = ["FitProfile", "profile"]
+
+# The profile that is currently collecting statistics, or None when
+# profiling is switched off, in which case the only cost to each fit
+# is checking this variable
+_active = None
+
+STAGES = ("init", "optimize", "result")
+
+
+class FitProfile:
+    """Counters and timings aggregated over many fits.
+
+    For each fit, the number of residual evaluations (nfev) and
+    jacobian evaluations (njev) are counted, and the wall time in
+    seconds is accumulated separately for three stages: finding the
+    initial parameters (init), running the minimizer (optimize) and
+    creating the ConicFitResult from the minimizer result (result).
+
+    Each hook is called after every fit with a dict of the counts and
+    the times of the init and optimize stages for that fit. If
+    keep_records=True, those dicts are also saved in the records list.
+    """
+
+    def __init__(self, hooks=(), keep_records=False):
+        self.nfits = 0
+        self.nfev = 0
+        self.njev = 0
+        self.time = dict.fromkeys(STAGES, 0.0)
+        self.hooks = list(hooks)
+        self.records = [] if keep_records else None
+
+    def add_fit(self, nfits=1, nfev=0, njev=0, **times):
+        """Record the counts and stage timings of one (or a batch of) fits"""
+        self.nfits += nfits
+        self.nfev += nfev
+        self.njev += njev
+        for stage, seconds in times.items():
+            self.time[stage] += seconds
+        if self.hooks or self.records is not None:
+            record = {"nfits": nfits, "nfev": nfev, "njev": njev, **times}
+            self._notify(record)
+
+    def add_time(self, stage, seconds):
+        """Add time to one stage without counting a new fit"""
+        self.time[stage] += seconds
+
+    def _notify(self, record):
+        if self.records is not None:
+            self.records.append(record)
+        for hook in self.hooks:
+            hook(record)
+
+    def merge(self, other):
+        """
+        Add the statistics of another profile, such as one collected in
+        a worker process, calling the hooks for each of its records
+        """
+        self.nfits += other.nfits
+        self.nfev += other.nfev
+        self.njev += other.njev
+        for stage, seconds in other.time.items():
+            self.time[stage] += seconds
+        for record in other.records or ():
+            self._notify(record)
+        return self
+
+    def to_dict(self) -> dict:
+        """Summary of the profile as a dict"""
+        return {
+            "nfits": self.nfits,
+            "nfev": self.nfev,
+            "njev": self.njev,
+            "time": dict(self.time),
+        }
+
+    def __repr__(self):
+        return f"FitProfile({self.to_dict()})"
+
+    def __str__(self):
+        n = max(self.nfits, 1)
+        total = sum(self.time.values())
+        lines = [
+            f"{self.nfits} fits, {self.nfev / n:.1f} residual and "
+            f"{self.njev / n:.1f} jacobian evaluations per fit",
+        ]
+        for stage, seconds in self.time.items():
+            fraction = seconds / total if total > 0 else 0.0
+            lines.append(
+                f"  {stage:<10} {seconds:10.4f} s {1e3 * seconds / n:10.4f} ms/fit "
+                f"{100 * fraction:6.1f}%"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def profile(hook=None, keep_records=False):
+    """Collect a FitProfile of all the fits done inside a with block.
+
+    This includes fits done by fit_conic_to_xy(), fit_conics_batch(),
+    and fit_many(), whose worker processes send back their statistics
+    to be merged in. The optional hook is called after every fit, as
+    described for FitProfile. For example:
+
+        with confitti.profile() as prof:
+            results = list(confitti.fit_many(datasets))
+        print(prof)
+    """
+    global _active
+    previous = _active
+    _active = FitProfile(hooks=[hook] if hook else [], keep_records=keep_records)
+    try:
+        yield _active
+    finally:
+        _active = previous
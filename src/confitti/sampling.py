@@ -0,0 +1,391 @@
+"""Sample the posterior probability of conic parameters with emcee.
+
+This is a faster alternative to lmfit.minimize(..., method="emcee"),
+since the log probability of all the walkers is evaluated in a single
+vectorized NumPy calculation, rather than by calling residual() once
+per walker per step.
+"""
+
+import os
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from .confitti import PARAM_NAMES, ConicFitResult
+from .batch import _residual_batch
+from .parallel import _submit_bounded
+
+__all__ = [
+    "ConicChain",
+    "ChainStore",
+    "sample_conic_posterior",
+    "sample_conic_posteriors",
+]
+
+LNSIGMA = "__lnsigma"
+
+
+class ConicChain:
+    """Compact MCMC chain of conic parameters.
+
+    The samples array has shape (nsteps, nwalkers, ndim), with one
+    column for each of the varying parameters listed in var_names,
+    which may include the noise parameter "__lnsigma". The values of
+    any parameters that were held fixed are in the fixed dict.
+    """
+
+    def __init__(self, samples, lnprob, acceptance_fraction, var_names, fixed):
+        self.samples = np.asarray(samples, dtype=float)
+        self.lnprob = np.asarray(lnprob, dtype=float)
+        self.acceptance_fraction = np.asarray(acceptance_fraction, dtype=float)
+        self.var_names = list(var_names)
+        self.fixed = dict(fixed)
+
+    def __repr__(self):
+        nsteps, nwalkers, _ = self.samples.shape
+        return f"ConicChain({nsteps} steps x {nwalkers} walkers of {self.var_names})"
+
+    def __len__(self):
+        return self.samples.shape[0] * self.samples.shape[1]
+
+    @property
+    def flatchain(self):
+        """Samples from all the walkers as an array of shape (n, ndim)"""
+        return self.samples.reshape(-1, self.samples.shape[-1])
+
+    def params_array(self):
+        """
+        All five conic parameters for each sample, including fixed
+        ones, as an array of shape (n, 5) in the order of PARAM_NAMES.
+        """
+        P = np.empty((len(self), len(PARAM_NAMES)))
+        flat = self.flatchain
+        for i, k in enumerate(PARAM_NAMES):
+            if k in self.var_names:
+                P[:, i] = flat[:, self.var_names.index(k)]
+            else:
+                P[:, i] = self.fixed[k]
+        return P
+
+    def median(self) -> dict:
+        """Median of each varying parameter"""
+        return dict(zip(self.var_names, np.median(self.flatchain, axis=0).tolist()))
+
+    def std(self) -> dict:
+        """Standard deviation of each varying parameter"""
+        return dict(zip(self.var_names, np.std(self.flatchain, axis=0).tolist()))
+
+    def _to_arrays(self) -> dict:
+        """All the contents as a dict of plain arrays, for storage"""
+        return {
+            "samples": self.samples,
+            "lnprob": self.lnprob,
+            "acceptance_fraction": self.acceptance_fraction,
+            "var_names": np.array(self.var_names, dtype=str),
+            "fixed_names": np.array(list(self.fixed), dtype=str),
+            "fixed_values": np.array(list(self.fixed.values()), dtype=float),
+        }
+
+    @classmethod
+    def _from_arrays(cls, d: dict):
+        """Inverse of _to_arrays()"""
+        return cls(
+            d["samples"],
+            d["lnprob"],
+            d["acceptance_fraction"],
+            d["var_names"].tolist(),
+            dict(zip(d["fixed_names"].tolist(), d["fixed_values"].tolist())),
+        )
+
+
+class ChainStore:
+    """Directory store of the MCMC chains of many arcs.
+
+    Each chain is saved as its own uncompressed .npz file in the
+    directory (readable with numpy.load), named by the integer index of
+    the arc, such as 12.npz. A chain is first written to a temporary
+    file, which is then renamed, so every chain file is either complete
+    or absent. If a long run is interrupted, even in the middle of
+    saving a chain, all the chains that were completed are kept, and
+    the run can be resumed.
+    """
+
+    def __init__(self, directory):
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self._indices = set()
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext == ".npz" and stem.isdigit():
+                self._indices.add(int(stem))
+
+    def __repr__(self):
+        return f"ChainStore({self.directory!r}) with {len(self)} chains"
+
+    def __len__(self):
+        return len(self._indices)
+
+    def __contains__(self, index):
+        return index in self._indices
+
+    def __iter__(self):
+        return iter(sorted(self._indices))
+
+    def _path(self, index):
+        return os.path.join(self.directory, f"{index}.npz")
+
+    def append(self, index: int, chain: ConicChain):
+        """Save the chain for arc number index"""
+        if index in self:
+            raise ValueError(f"Chain {index} is already in {self.directory}")
+        path = self._path(index)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **chain._to_arrays())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self._indices.add(index)
+
+    def __getitem__(self, index: int) -> ConicChain:
+        if index not in self:
+            raise KeyError(index)
+        with np.load(self._path(index)) as d:
+            return ConicChain._from_arrays({k: d[k] for k in d.files})
+
+
+class _LogPosterior:
+    """
+    Vectorized log posterior probability for emcee: takes an array of
+    shape (nwalkers, ndim) and returns an array of shape (nwalkers,).
+    Priors are uniform within the bounds lo, hi.
+    """
+
+    def __init__(self, x, y, eps, p_fixed, ivary, lo, hi, is_weighted):
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.eps = 1.0 if eps is None else np.asarray(eps, dtype=float)
+        self.p_fixed = p_fixed
+        self.ivary = ivary
+        self.lo = lo
+        self.hi = hi
+        self.is_weighted = is_weighted
+
+    def __call__(self, theta):
+        lnp = np.full(len(theta), -np.inf)
+        inside = np.all((theta >= self.lo) & (theta <= self.hi), axis=1)
+        theta = theta[inside]
+        P = np.tile(self.p_fixed, (len(theta), 1))
+        P[:, self.ivary] = theta[:, : len(self.ivary)]
+        r2 = _residual_batch(P, self.x, self.y, self.eps) ** 2
+        if self.is_weighted:
+            lnp[inside] = -0.5 * np.sum(r2, axis=1)
+        else:
+            lnsigma = theta[:, [-1]]
+            lnp[inside] = -0.5 * np.sum(
+                r2 * np.exp(-2 * lnsigma) + np.log(2 * np.pi) + 2 * lnsigma, axis=1
+            )
+        return lnp
+
+
+def _unpack_params(params, lnsigma, lnsigma_bounds, is_weighted):
+    """
+    Starting values, bounds and varying parameters from lmfit
+    Parameters (or a MinimizerResult), a ConicFitResult or a dict.
+    Returns the full parameter vector, the names and indices of the
+    varying parameters, and the starting values and bounds of the
+    varying parameters (with __lnsigma appended if not is_weighted).
+    """
+    if hasattr(params, "params"):
+        # MinimizerResult or ConicFitResult
+        params = params.params
+    if isinstance(params, ConicFitResult):
+        params = params.params
+    if hasattr(params, "valuesdict"):
+        # lmfit Parameters: use their values, bounds and vary flags
+        values = np.array([params[k].value for k in PARAM_NAMES])
+        vary = [params[k].vary for k in PARAM_NAMES]
+        lo = np.array([-np.inf if params[k].min is None else params[k].min for k in PARAM_NAMES])
+        hi = np.array([np.inf if params[k].max is None else params[k].max for k in PARAM_NAMES])
+        if LNSIGMA in params:
+            p = params[LNSIGMA]
+            lnsigma = p.value
+            lnsigma_bounds = (p.min, p.max)
+    else:
+        # Plain dict: same bounds as the defaults of fit_conic_to_xy(),
+        # with the eccentricity fixed only if it is exactly 1
+        values = np.array([params[k] for k in PARAM_NAMES], dtype=float)
+        vary = [True, True, True, True, values[4] != 1.0]
+        lo = np.array([-np.inf, -np.inf, 0.0, -90.0, 0.0])
+        hi = np.array([np.inf, np.inf, np.inf, 360.0, np.inf])
+        if LNSIGMA in params:
+            lnsigma = params[LNSIGMA]
+    ivary = [i for i, v in enumerate(vary) if v]
+    var_names = [PARAM_NAMES[i] for i in ivary]
+    start, lo, hi = values[ivary], lo[ivary], hi[ivary]
+    if not is_weighted:
+        var_names.append(LNSIGMA)
+        start = np.append(start, lnsigma)
+        lo = np.append(lo, -np.inf if lnsigma_bounds[0] is None else lnsigma_bounds[0])
+        hi = np.append(hi, np.inf if lnsigma_bounds[1] is None else lnsigma_bounds[1])
+    return values, ivary, var_names, start, lo, hi
+
+
+def _run_chain(
+    xdata, ydata, eps_data, spec, is_weighted, nwalkers, steps, burn, thin, seed, progress
+):
+    """
+    Run emcee for one arc, starting from the parameter specification
+    returned by _unpack_params(). This is also the worker function of
+    sample_conic_posteriors(), so everything passed must be picklable.
+    """
+    import emcee
+
+    values, ivary, var_names, start, lo, hi = spec
+    logpost = _LogPosterior(xdata, ydata, eps_data, values, ivary, lo, hi, is_weighted)
+    rng = np.random.default_rng(seed)
+    ndim = len(start)
+    scale = 1e-4 * np.where(start != 0.0, np.abs(start), 1.0)
+    p0 = np.clip(start + scale * rng.standard_normal((nwalkers, ndim)), lo, hi)
+    sampler = emcee.EnsembleSampler(nwalkers, ndim, logpost, vectorize=True)
+    if seed is not None:
+        sampler.random_state = np.random.RandomState(seed).get_state()
+    sampler.run_mcmc(p0, steps, progress=progress)
+    fixed = {k: float(values[i]) for (i, k) in enumerate(PARAM_NAMES) if i not in ivary}
+    return ConicChain(
+        sampler.get_chain(discard=burn, thin=thin),
+        sampler.get_log_prob(discard=burn, thin=thin),
+        sampler.acceptance_fraction,
+        var_names,
+        fixed,
+    )
+
+
+def sample_conic_posterior(
+    xdata,
+    ydata,
+    params,
+    eps_data=None,
+    nwalkers=100,
+    steps=1000,
+    burn=0,
+    thin=1,
+    is_weighted=None,
+    lnsigma=np.log(0.1),
+    lnsigma_bounds=(-np.inf, np.inf),
+    seed=None,
+    progress=False,
+):
+    """Sample the posterior probability of the conic parameters.
+
+    The params may be the result of fit_conic_to_xy() or a
+    ConicFitResult, or lmfit Parameters for finer control over the
+    bounds (used as uniform priors) and which parameters vary. The
+    walkers start in a small ball around the parameter values.
+
+    The log likelihood is the same as used by lmfit's emcee method. If
+    is_weighted is False (the default when eps_data is not given), then
+    the uncertainty of the data points is also sampled, as the
+    parameter __lnsigma, which starts at lnsigma and is restricted to
+    lnsigma_bounds, unless a __lnsigma parameter is included in params.
+
+    Returns a ConicChain, from which the first burn steps have been
+    discarded, keeping only every thin-th step thereafter.
+    """
+    if is_weighted is None:
+        is_weighted = eps_data is not None
+    spec = _unpack_params(params, lnsigma, lnsigma_bounds, is_weighted)
+    return _run_chain(
+        xdata, ydata, eps_data, spec, is_weighted, nwalkers, steps, burn, thin, seed, progress
+    )
+
+
+def sample_conic_posteriors(
+    datasets,
+    params,
+    store=None,
+    workers=None,
+    executor=None,
+    ordered=False,
+    max_pending=None,
+    nwalkers=100,
+    steps=1000,
+    burn=0,
+    thin=1,
+    is_weighted=None,
+    lnsigma=np.log(0.1),
+    lnsigma_bounds=(-np.inf, np.inf),
+    seed=None,
+):
+    """Sample the posterior probabilities of many arcs in parallel.
+
+    The datasets are tuples (xdata, ydata) or (xdata, ydata, eps_data),
+    as for fit_many(), and params is a matching sequence of fit results
+    or parameters, as for sample_conic_posterior(). The chains of
+    different arcs are run concurrently by a pool of worker processes
+    (with workers=1 they are run in the current process). An existing
+    concurrent.futures executor, either process or thread based, may be
+    given instead so that the same pool can be reused for many calls.
+    Within each arc, all the walkers are already evaluated together in
+    a single vectorized calculation.
+
+    If store is given (a ChainStore or a directory name), each chain is
+    added to it as soon as it is finished, and any arcs that already
+    have a chain in the store are skipped, so an interrupted run can be
+    resumed by calling this again with the same arguments. If seed is
+    given, then arc number i uses the seed (seed + i), so the results
+    do not depend on the order in which the arcs are run.
+
+    This is a generator that yields (index, ConicChain) pairs for each
+    arc that is sampled, as soon as it is completed (or in input order
+    if ordered=True).
+    """
+    if store is not None and not isinstance(store, ChainStore):
+        store = ChainStore(store)
+
+    def tasks():
+        for index, (data, p) in enumerate(zip(datasets, params)):
+            if store is not None and index in store:
+                continue
+            xdata, ydata, *rest = data
+            eps_data = rest[0] if rest else None
+            weighted = eps_data is not None if is_weighted is None else is_weighted
+            # Unpack the parameters here, since fit results may not pickle
+            spec = _unpack_params(p, lnsigma, lnsigma_bounds, weighted)
+            arc_seed = None if seed is None else seed + index
+            yield (
+                index,
+                xdata,
+                ydata,
+                eps_data,
+                spec,
+                weighted,
+                nwalkers,
+                steps,
+                burn,
+                thin,
+                arc_seed,
+            )
+
+    def finish(index, chain):
+        if store is not None:
+            store.append(index, chain)
+        return index, chain
+
+    if executor is None and workers == 1:
+        for index, *args in tasks():
+            yield finish(index, _run_chain(*args, False))
+        return
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ProcessPoolExecutor(max_workers=workers))
+        for index, chain in _submit_bounded(
+            executor, _indexed_chain, tasks(), max_pending, ordered
+        ):
+            yield finish(index, chain)
+
+
+def _indexed_chain(index, *args):
+    """Worker function for sample_conic_posteriors()"""
+    return index, _run_chain(*args, False)
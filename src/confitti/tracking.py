@@ -0,0 +1,164 @@
+"""Fit the same arc at successive epochs, starting each fit from the last."""
+
+import numpy as np
+from .confitti import PARAM_NAMES, ConicFitResult, fit_conic_to_xy, _init_values
+
+__all__ = ["track_conics"]
+
+
+def _extrapolate(history):
+    """
+    Prediction of the next parameters at a constant rate of change
+    from the last two, allowing for the wrap-around of theta0
+    """
+    step = history[-1] - history[-2]
+    i = PARAM_NAMES.index("theta0")
+    step[i] = (step[i] + 180.0) % 360.0 - 180.0
+    return history[-1] + step
+
+
+def _apex_and_focus(values):
+    """Positions of the apex and the focus of a conic"""
+    x0, y0, r0, theta0, _ = values
+    x_apex = x0 + r0 * np.cos(np.deg2rad(theta0))
+    y_apex = y0 + r0 * np.sin(np.deg2rad(theta0))
+    return np.array([[x_apex, y_apex], [x0, y0]])
+
+
+def _ran_away(result, xdata, ydata):
+    """
+    Whether a fit did not converge, or has run away to a conic whose
+    apex is further from all of the points than the size of the whole
+    set of points, which can give deceptively small residuals
+    """
+    values = [result.params[k].value for k in PARAM_NAMES]
+    if not result.success or not np.all(np.isfinite(values)):
+        return True
+    (x_apex, y_apex), _ = _apex_and_focus(values)
+    xdata, ydata = np.asarray(xdata), np.asarray(ydata)
+    size = max(np.ptp(xdata), np.ptp(ydata))
+    return np.min(np.hypot(xdata - x_apex, ydata - y_apex)) > size
+
+
+def _on_bound(result):
+    """
+    Whether any varying parameter has ended up on one of its bounds,
+    where leastsq cannot move it
+    """
+    for par in result.params.values():
+        if not par.vary:
+            continue
+        tol = 1e-6 * max(abs(par.value), 1.0)
+        if abs(par.value - par.min) < tol or abs(par.max - par.value) < tol:
+            return True
+    return False
+
+
+def _failed(result, xdata, ydata, redchi_limit, guess, max_jump):
+    """
+    Whether a warm-started fit has run away, or is stuck on a bound,
+    or is much worse than expected, or has jumped far from the
+    predicted parameters guess
+    """
+    if _ran_away(result, xdata, ydata) or _on_bound(result):
+        return True
+    if redchi_limit is not None and result.redchi > redchi_limit:
+        return True
+    values = [result.params[k].value for k in PARAM_NAMES]
+    predicted = [_init_values(guess)[k] for k in PARAM_NAMES]
+    size = max(np.ptp(xdata), np.ptp(ydata))
+    jump = np.hypot(*(_apex_and_focus(values) - _apex_and_focus(predicted)).T)
+    return np.max(jump) > max_jump * size
+
+
+def track_conics(
+    datasets,
+    start=None,
+    init=None,
+    motion=None,
+    redchi_jump=10.0,
+    max_jump=0.5,
+    **fit_kws,
+):
+    """Fit conic sections to successive epochs of the same arc.
+
+    The datasets are (xdata, ydata) or (xdata, ydata, eps_data) for
+    each epoch, in time order. The first epoch is fitted from the
+    initial parameters start if given (in any of the forms accepted
+    by the init argument of fit_conic_to_xy(), such as a
+    ConicFitResult), and otherwise with the usual initialization given
+    by init (None, "multistart" or "algebraic"). Each later epoch then
+    starts from a prediction based on the fits to the earlier epochs:
+    with motion=None this is just the previous fit, with
+    motion="linear" it is extrapolated at a constant rate from the
+    last two fits, and otherwise motion is a function that takes an
+    array of shape (nepochs, 5) of the previous parameters, in the
+    order of PARAM_NAMES, and returns the predicted parameters. Epochs
+    whose fit ran away (see below) are rows of NaN in this array, and
+    the epoch after one of them is fitted with the usual
+    initialization.
+
+    Since each fit starts close to the best fit, it usually needs
+    fewer iterations than a fit from scratch. The fit is taken to have
+    found the wrong minimum if it fails to converge, or runs away so
+    that the apex is further from all the points than the size of the
+    whole set of points, or ends with a parameter on one of its
+    bounds, or with a reduced chi-square more than redchi_jump times
+    that of the previous epoch, or if its apex or focus is further
+    from the predicted one than max_jump times the size of the set of
+    points. The epoch is then fitted again with the usual
+    initialization, and the fit with the lower chi-square is kept,
+    unless only one of the two has converged without running away.
+
+    Other keyword arguments are passed to fit_conic_to_xy(). This is a
+    generator that yields a ConicFitResult for each epoch, whose stats
+    have an extra item "restarted", which is True if the fit had to
+    fall back on the usual initialization.
+    """
+    if motion not in (None, "linear") and not callable(motion):
+        raise ValueError(f"Unknown motion model: {motion!r}")
+    history = []
+    previous = None
+    for data in datasets:
+        if not history:
+            guess = start
+        elif not np.all(np.isfinite(history[-1])):
+            guess = None
+        elif motion == "linear" and len(history) > 1:
+            guess = _extrapolate(history)
+            if not np.all(np.isfinite(guess)):
+                guess = history[-1]
+        elif callable(motion):
+            guess = motion(np.array(history))
+        else:
+            guess = history[-1]
+        restarted = bool(history) and guess is None
+        if guess is None:
+            result = fit_conic_to_xy(*data, init=init, **fit_kws)
+        else:
+            result = fit_conic_to_xy(*data, init=guess, **fit_kws)
+            redchi_limit = None
+            if previous is not None and previous.redchi > 0:
+                redchi_limit = redchi_jump * previous.redchi
+            if _failed(result, *data[:2], redchi_limit, guess, max_jump):
+                restarted = True
+                retry = fit_conic_to_xy(*data, init=init, **fit_kws)
+                # The residuals of a fit that has run away can be very
+                # small, so they are only compared between fits that
+                # have both run away or both not
+                warm_ran_away = _ran_away(result, *data[:2])
+                retry_ran_away = _ran_away(retry, *data[:2])
+                if warm_ran_away != retry_ran_away:
+                    if warm_ran_away:
+                        result = retry
+                elif retry.chisqr < result.chisqr:
+                    result = retry
+        if _ran_away(result, *data[:2]):
+            previous = None
+            history.append(np.full(len(PARAM_NAMES), np.nan))
+        else:
+            previous = result
+            history.append(np.array([result.params[k].value for k in PARAM_NAMES]))
+        fit = ConicFitResult(result)
+        fit.stats["restarted"] = restarted
+        yield fit
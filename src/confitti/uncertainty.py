@@ -0,0 +1,141 @@
+"""Propagate the covariance of the conic parameters to derived quantities."""
+
+import numpy as np
+from .confitti import PARAM_NAMES, _params_array
+
+__all__ = ["conic_derived_quantities", "propagate_linear", "propagate_unscented"]
+
+
+def conic_derived_quantities(P) -> dict:
+    """Geometric quantities derived from the conic parameters.
+
+    P is an array of shape (N, 5) of parameters in the order of
+    PARAM_NAMES. Returns a dict of arrays of shape (N,) with the apex
+    and mirror points (x_apex, y_apex, x_mirror, y_mirror) as defined
+    for XYconic, the radius of curvature at the apex r_curvature, which
+    is the semi-latus rectum r0 (1 + e), and the asymptotic angle of a
+    hyperbola or parabola from the axis theta_inf (in degrees, NaN for
+    ellipses).
+    """
+    x0, y0, r0, theta0, e = np.asarray(P, dtype=float).T
+    theta0 = np.deg2rad(theta0)
+    cos_theta0, sin_theta0 = np.cos(theta0), np.sin(theta0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        d = r0 / e
+        theta_inf = 180.0 - np.rad2deg(np.arctan(np.sqrt(e**2 - 1)))
+    return {
+        "x_apex": x0 + r0 * cos_theta0,
+        "y_apex": y0 + r0 * sin_theta0,
+        "x_mirror": x0 + (r0 + d) * cos_theta0,
+        "y_mirror": y0 + (r0 + d) * sin_theta0,
+        "r_curvature": r0 * (1 + e),
+        "theta_inf": theta_inf,
+    }
+
+
+def _unpack(params, covar):
+    """
+    Parameters as an array of shape (N, 5) and covariance matrices as
+    an array of shape (N, 5, 5), from a ConicFitResult, a
+    ConicFitCatalog, or explicit parameters and covariance. Also
+    returns whether there was only a single set of parameters.
+    """
+    if covar is None:
+        covar = params.covar
+        if covar is None:
+            raise ValueError("No covariance matrix is available for these parameters")
+    covar = np.asarray(covar, dtype=float)
+    single = covar.ndim == 2
+    P = _params_array(params)
+    C = covar.reshape(-1, len(PARAM_NAMES), len(PARAM_NAMES))
+    return P, C, single
+
+
+def _pack(values, variances, single):
+    """Dicts of values and standard deviations, as scalars if single"""
+    uvalues = {k: np.sqrt(v) for (k, v) in variances.items()}
+    if single:
+        values = {k: float(v[0]) for (k, v) in values.items()}
+        uvalues = {k: float(v[0]) for (k, v) in uvalues.items()}
+    return values, uvalues
+
+
+def propagate_linear(params, covar=None, func=conic_derived_quantities, step=1e-6):
+    """Linear propagation of the parameter covariance to derived quantities.
+
+    The params may be a ConicFitResult or ConicFitCatalog, which carry
+    their own covariance matrices, or else an array of shape (N, 5) or
+    (5,) (or a dict) of parameters, together with covar of shape
+    (N, 5, 5) or (5, 5). The func takes an array of parameters of shape
+    (M, 5) and returns a dict of arrays of shape (M,), by default the
+    quantities of conic_derived_quantities().
+
+    The jacobian of func is found by central differences with relative
+    step size step, evaluating func only once for all the fits.
+
+    Returns two dicts: the derived quantities and their standard
+    deviations, which are floats for a single set of parameters or
+    arrays of shape (N,) otherwise.
+    """
+    P, C, single = _unpack(params, covar)
+    n, ndim = P.shape
+    h = step * np.maximum(np.abs(P), 1.0)
+    # Array of shape (2 ndim + 1, N, ndim) of the central and displaced
+    # parameters, evaluated all at once
+    dP = np.einsum("ij,nj->inj", np.eye(ndim), h)
+    Pall = np.concatenate([P[None], P + dP, P - dP])
+    f = func(Pall.reshape(-1, ndim))
+    fixed = np.einsum("nii->ni", C) == 0.0
+    values, variances = {}, {}
+    for k, v in f.items():
+        v = v.reshape(2 * ndim + 1, n)
+        with np.errstate(invalid="ignore"):
+            J = ((v[1 : ndim + 1] - v[ndim + 1 :]) / (2 * h.T)).T
+        # Fixed parameters do not contribute, even if the derivative is
+        # undefined, such as for theta_inf of a parabola
+        J[fixed] = 0.0
+        values[k] = v[0]
+        variances[k] = np.einsum("ni,nij,nj->n", J, C, J)
+    return _pack(values, variances, single)
+
+
+def propagate_unscented(
+    params, covar=None, func=conic_derived_quantities, alpha=1.0, beta=2.0, kappa=0.0
+):
+    """Unscented-transform propagation of the parameter covariance.
+
+    This takes the same arguments and returns the same as
+    propagate_linear(), but evaluates func at 2 n + 1 sigma points for
+    each fit (where n = 5 is the number of parameters), which is more
+    accurate than linear propagation when func is strongly nonlinear
+    over the range of the uncertainties, for instance for the mirror
+    point when the eccentricity is poorly constrained. The alpha,
+    beta, kappa parameters have their usual meanings and control the
+    spread and weights of the sigma points. The values returned are
+    the means over the sigma points.
+    """
+    P, C, single = _unpack(params, covar)
+    n, ndim = P.shape
+    lam = alpha**2 * (ndim + kappa) - ndim
+    # Weights for the mean and covariance
+    wm = np.full(2 * ndim + 1, 0.5 / (ndim + lam))
+    wc = wm.copy()
+    wm[0] = lam / (ndim + lam)
+    wc[0] = wm[0] + 1 - alpha**2 + beta
+    # A square root of the covariance, which also works
+    # when it is singular because some parameters are fixed
+    bad = ~np.all(np.isfinite(C), axis=(1, 2))
+    w, V = np.linalg.eigh(np.where(bad[:, None, None], 0.0, C))
+    S = np.sqrt((ndim + lam) * np.clip(w, 0.0, None))[:, None, :] * V
+    # Sigma points: array of shape (2 ndim + 1, N, ndim)
+    dP = np.moveaxis(S, 2, 0)
+    Pall = np.concatenate([P[None], P + dP, P - dP])
+    f = func(Pall.reshape(-1, ndim))
+    values, variances = {}, {}
+    for k, v in f.items():
+        v = v.reshape(2 * ndim + 1, n)
+        mean = np.einsum("i,in->n", wm, v)
+        var = np.einsum("i,in->n", wc, (v - mean) ** 2)
+        values[k] = np.where(bad, np.nan, mean)
+        variances[k] = np.where(bad, np.nan, var)
+    return _pack(values, variances, single)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import confitti
+
+
+def conic_points(rng, npts=50, theta0=30.0, eccentricity=1.0, noise=0.02):
+    """
+    Points along a conic with unit scale, focus at a random position
+    and axis angle theta0 (degrees), with gaussian noise. Returns x, y
+    and a dict of the true parameters.
+    """
+    x0, y0 = rng.uniform(-10.0, 10.0, 2)
+    e = eccentricity
+    thmax = np.pi if e < 1 else np.pi - np.arctan(np.sqrt(e**2 - 1))
+    th = np.sort(rng.uniform(-0.6 * thmax, 0.6 * thmax, npts))
+    r = (1 + e) / (1 + e * np.cos(th))
+    phi = np.deg2rad(theta0) + th
+    x = x0 + r * np.cos(phi) + noise * rng.normal(size=npts)
+    y = y0 + r * np.sin(phi) + noise * rng.normal(size=npts)
+    return x, y, dict(zip(confitti.PARAM_NAMES, (x0, y0, 1.0, theta0, e)))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(42)
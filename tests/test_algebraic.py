@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+CASES = [
+    # eccentricity, theta0
+    (0.5, 30.0),
+    (1.0, 120.0),
+    (1.6, 250.0),
+    # Axis angles either side of zero, which must come out in [0, 360)
+    (0.8, 355.0),
+    (1.0, 2.0),
+]
+
+
+def _angle_difference(a, b):
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+def _assert_recovered(values, truth, rtol=1e-6):
+    values = dict(zip(confitti.PARAM_NAMES, values))
+    assert 0.0 <= values["theta0"] < 360.0
+    assert _angle_difference(values["theta0"], truth["theta0"]) == pytest.approx(
+        0.0, abs=360.0 * rtol
+    )
+    for k in ["x0", "y0", "r0", "eccentricity"]:
+        assert values[k] == pytest.approx(truth[k], rel=rtol, abs=rtol)
+
+
+@pytest.mark.parametrize("eccentricity, theta0", CASES)
+def test_exact_points(rng, eccentricity, theta0):
+    """Points that lie exactly on a conic give back its parameters"""
+    x, y, truth = conic_points(rng, 30, theta0, eccentricity, noise=0.0)
+    init = confitti.init_conic_algebraic(x, y)
+    _assert_recovered([init[k] for k in confitti.PARAM_NAMES], truth)
+
+
+def test_batch_matches_single(rng):
+    """A batch of point sets of different lengths gives the same
+    parameters as each set on its own"""
+    xs, ys, truths = [], [], []
+    for n, (eccentricity, theta0) in zip([12, 40, 25, 60, 8], CASES):
+        x, y, truth = conic_points(rng, n, theta0, eccentricity, noise=0.0)
+        xs.append(x)
+        ys.append(y)
+        truths.append(truth)
+    catalog = confitti.fit_conics_algebraic(xs, ys)
+    assert np.all(catalog.success)
+    for i, truth in enumerate(truths):
+        _assert_recovered([catalog.params[k][i] for k in confitti.PARAM_NAMES], truth)
+
+
+def test_noisy_points(rng):
+    """With noise, the result is close enough to start a fit"""
+    x, y, truth = conic_points(rng, 100, 75.0, 0.8, noise=0.01)
+    init = confitti.init_conic_algebraic(x, y)
+    _assert_recovered([init[k] for k in confitti.PARAM_NAMES], truth, rtol=0.05)
+
+
+@pytest.mark.parametrize("eccentricity", [0.5, 1.6])
+def test_only_parabola(rng, eccentricity):
+    """The parabola has the apex and apex curvature of the conic"""
+    x, y, truth = conic_points(rng, 30, 40.0, eccentricity, noise=0.0)
+    init = confitti.init_conic_algebraic(x, y, only_parabola=True)
+    assert init["eccentricity"] == 1.0
+    assert init["theta0"] == pytest.approx(truth["theta0"])
+    conic = confitti.XYconic(**truth)
+    parabola = confitti.XYconic(**init)
+    assert parabola.x_apex == pytest.approx(conic.x_apex)
+    assert parabola.y_apex == pytest.approx(conic.y_apex)
+    assert 2 * init["r0"] == pytest.approx(truth["r0"] * (1 + eccentricity))
+
+
+def test_collinear_points_fail():
+    x = np.linspace(0.0, 1.0, 10)
+    catalog = confitti.fit_conics_algebraic([x], [2 * x + 1])
+    assert not catalog.success[0]
+    assert np.all(np.isfinite(list(catalog.params.values())))
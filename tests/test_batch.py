@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+def _point_sets(rng, nsets, eccentricity):
+    sets = [
+        conic_points(rng, rng.integers(20, 60), rng.uniform(0.0, 360.0), eccentricity)
+        for _ in range(nsets)
+    ]
+    return [x for x, _, _ in sets], [y for _, y, _ in sets]
+
+
+def _angle_difference(a, b):
+    return (np.asarray(a) - np.asarray(b) + 180.0) % 360.0 - 180.0
+
+
+@pytest.mark.parametrize("only_parabola", [True, False])
+def test_batch_matches_leastsq(rng, only_parabola):
+    """The batch fits agree with fit_conic_to_xy() to well within
+    the parameter uncertainties"""
+    xs, ys = _point_sets(rng, 12, 1.0 if only_parabola else 0.8)
+    catalog = confitti.fit_conics_batch(xs, ys, only_parabola=only_parabola)
+    assert len(catalog) == len(xs)
+    assert np.all(catalog.stats["success"])
+    for row, x, y in zip(catalog, xs, ys):
+        result = confitti.ConicFitResult(
+            confitti.fit_conic_to_xy(x, y, only_parabola=only_parabola)
+        )
+        for k in confitti.PARAM_NAMES:
+            diff = row.params[k] - result.params[k]
+            if k == "theta0":
+                diff = _angle_difference(row.params[k], result.params[k])
+            assert abs(diff) <= 0.05 * result.uparams[k] + 1e-6, k
+        assert row.stats["chisqr"] == pytest.approx(result.stats["chisqr"], rel=1e-4)
+
+
+def test_batch_padded_arrays_match_ragged(rng):
+    xs, ys = _point_sets(rng, 5, 1.0)
+    X = np.full((len(xs), max(len(x) for x in xs)), np.nan)
+    Y = np.full_like(X, np.nan)
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        X[i, : len(x)] = x
+        Y[i, : len(y)] = y
+    ragged = confitti.fit_conics_batch(xs, ys)
+    padded = confitti.fit_conics_batch(X, Y)
+    for k in confitti.PARAM_NAMES:
+        np.testing.assert_allclose(padded.params[k], ragged.params[k])
+
+
+def test_batch_too_few_points(rng):
+    """Point sets with fewer than 5 points are not fitted"""
+    xs, ys = _point_sets(rng, 3, 1.0)
+    xs[1], ys[1] = xs[1][:4], ys[1][:4]
+    catalog = confitti.fit_conics_batch(xs, ys)
+    assert list(catalog.stats["success"]) == [True, False, True]
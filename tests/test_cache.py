@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+@pytest.fixture
+def points(rng):
+    x, y, _ = conic_points(rng, 40, 60.0, 1.0)
+    return x, y
+
+
+def test_key_ignores_explicit_defaults(points):
+    cache = confitti.FitCache()
+    assert cache.key(*points) == cache.key(
+        *points, eps_data=None, only_parabola=True, method="leastsq"
+    )
+    assert cache.key(*points) != cache.key(*points, only_parabola=False)
+
+
+def test_key_depends_on_data(points):
+    cache = confitti.FitCache()
+    x, y = points
+    key = cache.key(x, y)
+    assert cache.key(x.copy(), y.copy()) == key
+    assert cache.key(x.astype(np.float32), y) != key
+    assert cache.key(x, y, 0.1) != key
+    x = x.copy()
+    x[0] += 1e-12
+    assert cache.key(x, y) != key
+
+
+def test_key_same_for_every_form_of_init(points):
+    cache = confitti.FitCache()
+    result = confitti.fit_conic_to_xy(*points)
+    values = {k: result.params[k].value for k in confitti.PARAM_NAMES}
+    forms = [
+        values,
+        dict(reversed(values.items())),
+        [values[k] for k in confitti.PARAM_NAMES],
+        tuple(values[k] for k in confitti.PARAM_NAMES),
+        np.array([values[k] for k in confitti.PARAM_NAMES]),
+        result,
+        result.params,
+        confitti.ConicFitResult(result),
+    ]
+    keys = {cache.key(*points, init=init) for init in forms}
+    assert len(keys) == 1
+    assert keys != {cache.key(*points)}
+
+
+def test_key_rejects_unhashable_option(points):
+    with pytest.raises(TypeError):
+        confitti.FitCache().key(*points, init=object())
+
+
+def test_memory_hits(points):
+    cache = confitti.FitCache(maxsize=1)
+    first = cache.fit(*points)
+    assert cache.fit(*points) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # Pushed out of memory by a different fit
+    cache.fit(*points, only_parabola=False)
+    assert cache.key(*points) not in cache
+    assert len(cache) == 1
+
+
+def test_disk_hits(tmp_path, points):
+    cache = confitti.FitCache(tmp_path)
+    result = cache.fit(*points, robust="huber")
+    key = cache.key(*points, robust="huber")
+    # A new cache on the same directory, as in a later session
+    cache = confitti.FitCache(tmp_path)
+    assert key in cache
+    cached = cache.fit(*points, robust="huber")
+    assert (cache.hits, cache.misses) == (1, 0)
+    assert cached.params == pytest.approx(result.params, rel=1e-12)
+    assert cached.stats == result.stats
+    cache.invalidate(key)
+    assert key not in cache
+    cache.fit(*points, robust="huber")
+    assert cache.misses == 1
+
+
+def test_max_bytes_evicts_files(tmp_path, points):
+    cache = confitti.FitCache(tmp_path, max_bytes=1)
+    cache.fit(*points)
+    cache.fit(*points, only_parabola=False)
+    assert not list(tmp_path.glob("*/*.npz"))
+    cache.clear()
+    assert len(cache) == 0
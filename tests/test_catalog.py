@@ -0,0 +1,143 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+@pytest.fixture
+def results(rng):
+    """A few fits, with different methods and options"""
+    fits = []
+    for theta0, only_parabola in [(10.0, True), (120.0, False), (250.0, True)]:
+        x, y, _ = conic_points(rng, 40, theta0, 1.0)
+        fits.append(
+            confitti.ConicFitResult(
+                confitti.fit_conic_to_xy(x, y, only_parabola=only_parabola)
+            )
+        )
+    # A method name longer than any of the standard lmfit ones
+    fits[1].stats["method"] = "differential_evolution"
+    return fits
+
+
+def assert_catalogs_equal(a, b):
+    assert len(a) == len(b)
+    for k in confitti.PARAM_NAMES:
+        np.testing.assert_allclose(a.params[k], b.params[k], rtol=1e-12)
+        np.testing.assert_allclose(a.uparams[k], b.uparams[k], rtol=1e-12)
+    np.testing.assert_allclose(a.covar, b.covar, rtol=1e-12)
+    assert list(a.stats) == list(b.stats)
+    for k in a.stats:
+        np.testing.assert_array_equal(a.stats[k], b.stats[k])
+    if a.ids is None:
+        assert b.ids is None
+    else:
+        np.testing.assert_array_equal(a.ids, b.ids)
+
+
+@pytest.mark.parametrize("suffix", [".npz", ".json", ".yaml"])
+@pytest.mark.parametrize("ids", [None, [3, 1, 2], ["arc-a", "b", "arc-c"]])
+def test_catalog_round_trip(tmp_path, results, suffix, ids):
+    if suffix == ".yaml":
+        pytest.importorskip("yaml")
+    catalog = confitti.ConicFitCatalog.from_results(results)
+    catalog.ids = None if ids is None else np.array(ids)
+    filename = str(tmp_path / f"fits{suffix}")
+    catalog.write(filename)
+    assert_catalogs_equal(catalog, confitti.ConicFitCatalog.read(filename))
+
+
+def test_catalog_rows_match_results(results):
+    catalog = confitti.ConicFitCatalog.from_results(results)
+    for row, result in zip(catalog, results):
+        assert row.params == pytest.approx(result.params)
+        assert row.stats["method"] == result.stats["method"]
+
+
+@pytest.mark.parametrize("ids", [None, [3, 1, 2], ["arc-a", "b", "a-much-longer-id"]])
+def test_writer_matches_write(tmp_path, results, ids):
+    """CatalogWriter makes the same catalog as ConicFitCatalog.write(),
+    even when the results are flushed one at a time"""
+    catalog = confitti.ConicFitCatalog.from_results(results)
+    catalog.ids = None if ids is None else np.array(ids)
+    filename = str(tmp_path / "written.npz")
+    with confitti.CatalogWriter(filename, flush_every=1) as writer:
+        for i, result in enumerate(results):
+            writer.append(result, None if ids is None else ids[i])
+    assert writer.count == len(results)
+    for mmap in True, False:
+        assert_catalogs_equal(
+            catalog, confitti.ConicFitCatalog.read(filename, mmap=mmap)
+        )
+    assert list(tmp_path.iterdir()) == [tmp_path / "written.npz"]
+
+
+def test_writer_empty(tmp_path):
+    filename = str(tmp_path / "empty.npz")
+    with confitti.CatalogWriter(filename):
+        pass
+    assert len(confitti.ConicFitCatalog.read(filename)) == 0
+
+
+@pytest.mark.parametrize("flush_every", [1, 2, 5])
+@pytest.mark.parametrize(
+    "ids", [[None, None, 5], [None, "arc1", None], ["a", None, "c"]]
+)
+def test_writer_rejects_mixed_ids(tmp_path, results, flush_every, ids):
+    """Results with and without ids cannot be mixed, since the ids
+    column would be shorter than the others"""
+    filename = tmp_path / "mixed.npz"
+    with pytest.raises(ValueError):
+        with confitti.CatalogWriter(str(filename), flush_every=flush_every) as writer:
+            for result, id in zip(results, ids):
+                writer.append(result, id)
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.fixture
+def robust_results(rng, results):
+    """The fits of results, followed by two robust fits, which have
+    extra stats"""
+    fits = list(results)
+    for theta0 in 60.0, 300.0:
+        x, y, _ = conic_points(rng, 40, theta0, 1.0)
+        result = confitti.fit_conic_to_xy(x, y, robust="huber")
+        fits.append(confitti.ConicFitResult(result))
+    fits[-1].stats["restarted"] = True
+    return fits
+
+
+def test_catalog_keeps_extra_stats(tmp_path, robust_results):
+    catalog = confitti.ConicFitCatalog.from_results(robust_results)
+    assert list(catalog.noutliers) == [-1, -1, -1] + [
+        r.stats["noutliers"] for r in robust_results[3:]
+    ]
+    assert list(catalog.restarted) == [False] * 4 + [True]
+    assert catalog[4].stats == robust_results[4].stats
+    for suffix in ".npz", ".json":
+        filename = str(tmp_path / f"fits{suffix}")
+        catalog.write(filename)
+        assert_catalogs_equal(catalog, confitti.ConicFitCatalog.read(filename))
+    # The extra columns are filled in for catalogs without them
+    joined = confitti.ConicFitCatalog.concatenate([catalog[3:], catalog[:3]])
+    assert list(joined.noutliers[2:]) == [-1, -1, -1]
+
+
+@pytest.mark.parametrize("flush_every", [1, 2, 1024])
+def test_writer_keeps_extra_stats(tmp_path, robust_results, flush_every):
+    """Extra stats that first appear after some results have been
+    flushed are filled in for those results"""
+    catalog = confitti.ConicFitCatalog.from_results(robust_results)
+    filename = str(tmp_path / "written.npz")
+    with confitti.CatalogWriter(filename, flush_every=flush_every) as writer:
+        for result in robust_results:
+            writer.append(result)
+    assert_catalogs_equal(catalog, confitti.ConicFitCatalog.read(filename))
+
+
+def test_extra_params_warn(results):
+    results[0].params = {**results[0].params, "__lnsigma": -3.0}
+    with pytest.warns(UserWarning, match="__lnsigma"):
+        catalog = confitti.ConicFitCatalog.from_results(results)
+    assert set(catalog[0].params) == set(confitti.PARAM_NAMES)
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+import pytest
+
+from confitti.cli import main
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """A file with a parabola, and one with too few points to fit"""
+    x = np.linspace(-2.0, 2.0, 20)
+    np.save(tmp_path / "good.npy", np.column_stack([x, x**2]))
+    np.save(tmp_path / "short.npy", np.column_stack([x[:3], x[:3] ** 2]))
+    return [str(tmp_path / "good.npy"), str(tmp_path / "short.npy")]
+
+
+def test_cli_reports_failed_fits(tmp_path, inputs, capsys):
+    output = str(tmp_path / "fits.json")
+    assert main([*inputs, "-o", output, "-j", "1"]) == 0
+    captured = capsys.readouterr()
+    assert f"cannot fit {inputs[1]}" in captured.err
+    assert "1 fits of 2 point sets" in captured.out
+    with open(output) as f:
+        assert [row["id"] for row in json.load(f)] == [inputs[0]]
+
+
+def test_cli_rejects_loss_without_least_squares(tmp_path, inputs, capsys):
+    output = str(tmp_path / "fits.npz")
+    with pytest.raises(SystemExit) as exc:
+        main([inputs[0], "-o", output, "--loss", "soft_l1"])
+    assert exc.value.code == 2
+    assert "--loss requires --method least_squares" in capsys.readouterr().err
+    args = [inputs[0], "-o", output, "-j", "1", "--loss", "soft_l1"]
+    assert main([*args, "--method", "least_squares"]) == 0
+
+
+@pytest.mark.parametrize("method", ["shgo", "differential_evolution"])
+def test_cli_rejects_methods_needing_finite_bounds(tmp_path, inputs, method):
+    with pytest.raises(SystemExit):
+        main([inputs[0], "-o", str(tmp_path / "fits.npz"), "--method", method])
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import confitti
+from confitti.envelope import _ray_conic_radius
+
+MEAN = np.array([1.0, -2.0, 1.0, 60.0, 0.8])
+COV = np.diag([0.05, 0.05, 0.05, 5.0, 0.05]) ** 2
+
+
+@pytest.mark.parametrize("eccentricity", [0.5, 1.0, 1.6])
+def test_ray_radius_from_focus(eccentricity):
+    """From the focus, the radius is that of the polar equation"""
+    p = np.array([[1.0, -2.0, 1.5, 60.0, eccentricity]])
+    phi = np.deg2rad(60.0 + np.linspace(-150.0, 150.0, 31))
+    s = _ray_conic_radius(p, (1.0, -2.0), phi)[0]
+    expected = 1.5 * (1 + eccentricity) / (1 + eccentricity * np.cos(phi - np.pi / 3))
+    expected[expected < 0] = np.inf
+    np.testing.assert_allclose(s, expected)
+
+
+@pytest.mark.parametrize("eccentricity", [0.5, 1.0, 1.6])
+def test_ray_radius_on_curve(eccentricity):
+    """From another point inside the curve, the ends of the rays are on
+    the curve, and rays towards the open side of a parabola or
+    hyperbola never reach it"""
+    p = np.array([1.0, -2.0, 1.5, 60.0, eccentricity])
+    origin = (1.5, -1.0)
+    phi = np.deg2rad(np.arange(0.0, 360.0, 5.0))
+    s = _ray_conic_radius(p[None], origin, phi)[0]
+    finite = np.isfinite(s)
+    x = origin[0] + s[finite] * np.cos(phi[finite])
+    y = origin[1] + s[finite] * np.sin(phi[finite])
+    np.testing.assert_allclose(confitti.conic_residual(p, x, y), 0.0, atol=1e-10)
+    assert finite[12] and finite[13]  # towards the apex
+    if eccentricity < 1:
+        assert np.all(finite)
+    else:
+        assert not finite[48]  # away from the apex
+
+
+def test_envelope_matches_exact_percentiles():
+    """The percentiles from the histograms agree with those of the exact
+    radii, even when the samples are processed in chunks"""
+    rng = np.random.default_rng(7)
+    P = rng.multivariate_normal(MEAN, COV, size=20000)
+    phi = 60.0 + np.linspace(-120.0, 120.0, 25)
+    origin = (1.0, -2.0)
+    exact = np.percentile(
+        _ray_conic_radius(P, origin, np.deg2rad(phi)), [2.5, 50.0, 97.5], axis=0
+    )
+    for chunk_size in [20000, 3000]:
+        envelope = confitti.conic_radius_envelope(
+            P,
+            origin=origin,
+            phi=phi,
+            percentiles=(2.5, 50.0, 97.5),
+            chunk_size=chunk_size,
+        )
+        assert envelope.nsamples == len(P)
+        assert envelope.radius.shape == (3, len(phi))
+        np.testing.assert_allclose(envelope.radius, exact, rtol=2e-3)
+    x, y = envelope.xy(50.0)
+    np.testing.assert_allclose(np.hypot(x - 1.0, y + 2.0), envelope.radius[1])
+
+
+def test_envelope_open_side():
+    """Percentiles of rays that miss most of the curves are inf"""
+    P = np.tile([0.0, 0.0, 1.0, 0.0, 1.0], (100, 1))
+    envelope = confitti.conic_radius_envelope(P, origin=(0.0, 0.0), phi=[0.0, 180.0])
+    # Within the width of one bin
+    assert envelope.radius[:, 0] == pytest.approx(np.ones(5), rel=2.5e-3)
+    assert np.all(envelope.radius[:, 1] == np.inf)
+
+
+def test_envelope_from_covariance_and_chain():
+    """Drawn samples are reproducible with a seed, and a chain gives the
+    same envelope as the array of its parameters"""
+    kws = dict(nsamples=5000, chunk_size=2000, seed=3)
+    a = confitti.conic_radius_envelope(mean=MEAN, cov=COV, **kws)
+    mean = dict(zip(confitti.PARAM_NAMES, MEAN))
+    b = confitti.conic_radius_envelope(mean=mean, cov=COV, **kws)
+    assert a.nsamples == 5000
+    assert len(a.phi) == 361
+    np.testing.assert_array_equal(a.radius, b.radius)
+    rng = np.random.default_rng(8)
+    samples = rng.multivariate_normal(MEAN[:4], COV[:4, :4], size=(300, 10))
+    chain = confitti.ConicChain(
+        samples,
+        np.zeros((300, 10)),
+        np.ones(10),
+        confitti.PARAM_NAMES[:4],
+        {"eccentricity": 1.0},
+    )
+    from_chain = confitti.conic_radius_envelope(chain, chunk_size=1000)
+    from_array = confitti.conic_radius_envelope(chain.params_array(), chunk_size=1000)
+    np.testing.assert_array_equal(from_chain.radius, from_array.radius)
+    np.testing.assert_array_equal(from_chain.phi, from_array.phi)
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+import time
+
+
+def _import_time(code, repeat=3):
+    """Shortest wall time of several fresh interpreters running code"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, timeout=60)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_import_does_not_load_lmfit():
+    code = "import confitti, sys; assert 'lmfit' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True, timeout=60)
+
+
+def test_import_time():
+    """Importing confitti costs much less than importing lmfit, as it
+    did before lmfit and the other heavy dependencies were deferred.
+    Both are measured relative to an interpreter that imports nothing,
+    so that this does not depend on the speed of the machine."""
+    bare = _import_time("pass")
+    confitti = _import_time("import confitti") - bare
+    lmfit = _import_time("import confitti, lmfit") - bare
+    assert confitti < 0.5 * lmfit
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+def _ran_away(result, x, y):
+    """The focus has gone off to many times the size of the data"""
+    size = np.hypot(np.ptp(x), np.ptp(y))
+    p = result.params
+    return np.hypot(p["x0"] - np.mean(x), p["y0"] - np.mean(y)) > 10 * size
+
+
+def test_start_on_eccentricity_bound(rng):
+    """A fit that starts with the eccentricity on its lower bound of
+    zero is not stuck there"""
+    x, y, _ = conic_points(rng, 40, 70.0, 0.5, 0.01)
+    best = confitti.fit_conic_to_xy(x, y, only_parabola=False)
+    init = best.params.valuesdict()
+    init["eccentricity"] = 0.0
+    result = confitti.fit_conic_to_xy(x, y, only_parabola=False, init=init)
+    assert result.params["eccentricity"].value == pytest.approx(
+        best.params["eccentricity"].value, rel=1e-4
+    )
+    assert result.chisqr == pytest.approx(best.chisqr, rel=1e-6)
+
+
+@pytest.mark.parametrize("eccentricity", [0.5, 0.8, 1.5])
+def test_multistart_no_worse_than_default(rng, eccentricity):
+    """Unless the default fit has run away to the degenerate solution
+    with vanishing residuals, the fit from the multistart
+    initialization is at least as good"""
+    for _ in range(6):
+        x, y, _ = conic_points(rng, 40, rng.uniform(0.0, 360.0), eccentricity)
+        default = confitti.fit_conic_to_xy(x, y, only_parabola=False)
+        multi = confitti.fit_conic_to_xy(x, y, only_parabola=False, init="multistart")
+        if not _ran_away(default, x, y):
+            assert multi.chisqr <= default.chisqr * (1 + 1e-4)
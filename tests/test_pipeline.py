@@ -0,0 +1,70 @@
+import csv
+
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+@pytest.fixture
+def groups(rng):
+    """Point sets keyed by id, including one that is too small to fit"""
+    sets = {}
+    for i, theta0 in enumerate([20.0, 140.0, 200.0, 300.0]):
+        x, y, _ = conic_points(rng, 30, theta0, 1.0)
+        sets[i + 1] = (x, y)
+    sets[5] = (sets[4][0][:3], sets[4][1][:3])
+    return sets
+
+
+def _rows(groups):
+    return [(id, x, y) for (id, xy) in groups.items() for (x, y) in zip(*xy)]
+
+
+def test_iter_groups_across_blocks(groups):
+    data = np.array(_rows(groups))
+    found = dict(confitti.iter_groups_array(data, block_rows=7))
+    assert list(found) == list(groups)
+    for id, (x, y) in groups.items():
+        np.testing.assert_array_equal(found[id][0], x)
+        np.testing.assert_array_equal(found[id][1], y)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".npy"])
+def test_fit_file_round_trip(tmp_path, groups, suffix):
+    """Fitting a file gives the same results as fitting each group,
+    and the catalog file keeps the ids"""
+    filename = tmp_path / f"points{suffix}"
+    if suffix == ".csv":
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["id", "x", "y"])
+            writer.writerows(_rows(groups))
+    else:
+        np.save(filename, np.array(_rows(groups)))
+    output = str(tmp_path / "fits.npz")
+    count = confitti.fit_file(str(filename), output, block_rows=16, workers=1)
+    assert count == 4
+    catalog = confitti.ConicFitCatalog.read(output)
+    ids = [1, 2, 3, 4]
+    if suffix == ".csv":
+        ids = [str(id) for id in ids]
+    assert list(catalog.ids) == ids
+    for row, id in zip(catalog, [1, 2, 3, 4]):
+        expected = confitti.ConicFitResult(confitti.fit_conic_to_xy(*groups[id]))
+        assert row.params == pytest.approx(expected.params, rel=1e-8)
+
+
+def test_fit_groups_reports_errors_by_id(groups):
+    errors = []
+    fits = dict(
+        confitti.fit_groups(
+            groups.items(),
+            workers=1,
+            min_points=0,
+            skip_errors=lambda id, message: errors.append(id),
+        )
+    )
+    assert list(fits) == [1, 2, 3, 4]
+    assert errors == [5]
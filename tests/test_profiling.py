@@ -0,0 +1,23 @@
+import confitti
+from conftest import conic_points
+
+
+def test_profile_fit_many(rng):
+    """Each fit is counted once, with the time to create its result
+    counted in the worker and not again when it is unpacked"""
+    datasets = [conic_points(rng, 30, theta0)[:2] for theta0 in [10.0, 100.0, 200.0]]
+    with confitti.profile(keep_records=True) as prof:
+        results = dict(confitti.fit_many(datasets, workers=1))
+    assert prof.nfits == len(prof.records) == 3
+    assert prof.nfev == sum(r.stats["nfev"] for r in results.values())
+    assert prof.nfev == sum(record["nfev"] for record in prof.records)
+    assert all(t > 0.0 for t in prof.time.values())
+
+
+def test_unpacking_is_not_profiled(rng):
+    x, y, _ = conic_points(rng, 30)
+    d = confitti.ConicFitResult(confitti.fit_conic_to_xy(x, y)).to_dict()
+    with confitti.profile() as prof:
+        confitti.ConicFitResult.from_dict(d)
+    assert prof.time["result"] == 0.0
+    assert prof.nfits == 0
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+def _numerical_jacobian(p, x, y, eps, step=1e-6):
+    """Central finite differences of conic_residual()"""
+    columns = []
+    for i in range(len(p)):
+        dp = np.zeros(len(p))
+        dp[i] = step * max(abs(p[i]), 1.0)
+        plus = confitti.conic_residual(p + dp, x, y, eps)
+        minus = confitti.conic_residual(p - dp, x, y, eps)
+        columns.append((plus - minus) / (2 * dp[i]))
+    return np.column_stack(columns)
+
+
+@pytest.mark.parametrize("eccentricity", [0.5, 1.0, 1.6])
+@pytest.mark.parametrize("eps", [None, 0.1, "array"])
+def test_jacobian_matches_finite_differences(rng, eccentricity, eps):
+    x, y, truth = conic_points(rng, 30, 75.0, eccentricity, 0.05)
+    if eps == "array":
+        eps = rng.uniform(0.05, 0.2, len(x))
+    # Away from the best fit, so that the residuals are not small
+    p = np.array([truth[k] for k in confitti.PARAM_NAMES]) + [0.1, -0.2, 0.1, 5.0, 0.05]
+    expected = _numerical_jacobian(p, x, y, eps)
+    jac = confitti.conic_jacobian(p, x, y, eps)
+    assert jac.shape == (len(x), 5)
+    np.testing.assert_allclose(jac, expected, rtol=1e-6, atol=1e-6)
+    # A subset of the parameters, in any order
+    ivary = [3, 0, 2]
+    np.testing.assert_allclose(
+        confitti.conic_jacobian(p, x, y, eps, ivary=ivary),
+        expected[:, ivary],
+        rtol=1e-6,
+        atol=1e-6,
+    )
+
+
+def test_jacobian_buffers(rng):
+    """The result is written into out, whatever was in it before"""
+    x, y, truth = conic_points(rng, 20)
+    p = [truth[k] for k in confitti.PARAM_NAMES]
+    out = np.full((len(x), 4), np.nan)
+    work = np.full((3, len(x)), np.nan)
+    jac = confitti.conic_jacobian(p, x, y, out=out, work=work, ivary=(0, 1, 2, 3))
+    assert jac is out
+    np.testing.assert_array_equal(jac, confitti.conic_jacobian(p, x, y)[:, :4])
+
+
+@pytest.mark.parametrize("block_size", [7, 64, 1000])
+@pytest.mark.parametrize("eps", [None, 0.1, "array"])
+def test_blocks_match_single_pass(rng, block_size, eps):
+    x, y, truth = conic_points(rng, 100)
+    if eps == "array":
+        eps = rng.uniform(0.05, 0.2, len(x))
+    p = [truth[k] for k in confitti.PARAM_NAMES]
+    np.testing.assert_array_equal(
+        confitti.conic_residual(p, x, y, eps, block_size=block_size),
+        confitti.conic_residual(p, x, y, eps),
+    )
+    np.testing.assert_array_equal(
+        confitti.conic_jacobian(p, x, y, eps, ivary=[1, 4], block_size=block_size),
+        confitti.conic_jacobian(p, x, y, eps, ivary=[1, 4]),
+    )
+
+
+def test_float32_data(rng):
+    """Float32 points give float64 results, the same as for the same
+    values in float64, whether or not they are processed in blocks"""
+    x, y, truth = conic_points(rng, 100)
+    x32, y32 = x.astype(np.float32), y.astype(np.float32)
+    x64, y64 = x32.astype(float), y32.astype(float)
+    p = [truth[k] for k in confitti.PARAM_NAMES]
+    expected = confitti.conic_residual(p, x64, y64)
+    for block_size in [None, 16]:
+        r = confitti.conic_residual(p, x32, y32, block_size=block_size)
+        assert r.dtype == np.float64
+        np.testing.assert_array_equal(r, expected)
+        jac = confitti.conic_jacobian(p, x32, y32, block_size=block_size)
+        assert jac.dtype == np.float64
+        np.testing.assert_array_equal(jac, confitti.conic_jacobian(p, x64, y64))
+
+
+def test_fit_in_blocks(rng):
+    x, y, _ = conic_points(rng, 1000, eccentricity=0.8)
+    x32, y32 = x.astype(np.float32), y.astype(np.float32)
+    single = confitti.fit_conic_to_xy(x32, y32, only_parabola=False)
+    result = confitti.fit_conic_to_xy(x32, y32, only_parabola=False, block_size=64)
+    assert result.params.valuesdict() == single.params.valuesdict()
+    assert result.nfev == single.nfev
+    # The initial parameters are found in float32, so the fit to the
+    # same points in float64 converges to nearly the same values
+    expected = confitti.fit_conic_to_xy(
+        x32.astype(float), y32.astype(float), only_parabola=False
+    )
+    for k, p in expected.params.items():
+        assert result.params[k].value == pytest.approx(p.value, abs=1e-3 * p.stderr)
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+
+def _apex(params):
+    return confitti.XYconic(**{k: params[k] for k in confitti.PARAM_NAMES})
+
+
+def _distance(a, b):
+    return np.hypot(a.x_apex - b.x_apex, a.y_apex - b.y_apex)
+
+
+def _with_outliers(rng, noutliers=8):
+    """Parabola points of which noutliers are moved well off the arc,
+    along the normal to the curve"""
+    x, y, truth = conic_points(rng, 60, 60.0, 1.0, 0.01)
+    bad = rng.choice(len(x), noutliers, replace=False)
+    p = [truth[k] for k in confitti.PARAM_NAMES]
+    # The gradient of the residual with respect to the position of a
+    # point is minus its derivative with respect to the focus
+    normal = -confitti.conic_jacobian(p, x[bad], y[bad], ivary=(0, 1))
+    normal /= np.hypot(*normal.T)[:, None]
+    shift = rng.choice([-1.0, 1.0], noutliers) * rng.uniform(0.3, 0.6, noutliers)
+    x[bad] += shift * normal[:, 0]
+    y[bad] += shift * normal[:, 1]
+    return x, y, truth, bad
+
+
+@pytest.mark.parametrize("robust", ["huber", "cauchy", "soft_l1", "clip"])
+def test_robust_ignores_outliers(rng, robust):
+    x, y, truth, bad = _with_outliers(rng)
+    true_apex = _apex(truth)
+    # soft_l1 weights decrease slowly, so take a few more passes to settle
+    result = confitti.fit_conic_to_xy(x, y, robust=robust, max_reweight=20)
+    fit_apex = _apex(result.params.valuesdict())
+    assert _distance(fit_apex, true_apex) < 0.02
+    # An ordinary fit is dragged away by the outliers
+    plain = _apex(confitti.fit_conic_to_xy(x, y).params.valuesdict())
+    assert _distance(plain, true_apex) > 0.05
+    assert result.reweight_converged
+    assert set(np.flatnonzero(result.outliers)) == set(bad)
+    stats = confitti.ConicFitResult(result).stats
+    assert stats["noutliers"] == len(bad)
+    assert stats["reweight_converged"]
+    if robust == "clip":
+        assert np.all(result.weights[bad] == 0.0)
+
+
+def test_robust_least_squares(rng):
+    x, y, _, bad = _with_outliers(rng)
+    leastsq = confitti.fit_conic_to_xy(x, y, robust="cauchy")
+    trf = confitti.fit_conic_to_xy(x, y, robust="cauchy", method="least_squares")
+    for k in confitti.PARAM_NAMES:
+        assert trf.params[k].value == pytest.approx(leastsq.params[k].value, abs=1e-4)
+
+
+def test_robust_max_reweight(rng):
+    x, y, _, _ = _with_outliers(rng)
+    result = confitti.fit_conic_to_xy(x, y, robust="cauchy", max_reweight=1)
+    assert result.nreweight == 1
+    assert not result.reweight_converged
+    with pytest.raises(ValueError):
+        confitti.fit_conic_to_xy(x, y, robust="cauchy", max_reweight=0)
+    with pytest.raises(ValueError):
+        confitti.fit_conic_to_xy(x, y, robust="tukey")
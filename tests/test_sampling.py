@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+pytest.importorskip("emcee")
+
+
+@pytest.fixture
+def arc(rng):
+    x, y, _ = conic_points(rng, 50, 30.0, 1.0, 0.02)
+    return x, y, confitti.fit_conic_to_xy(x, y)
+
+
+def test_posterior_matches_fit(arc):
+    """For a well-constrained parabola, the posterior is centred on the
+    best fit with widths close to the fitted uncertainties, and the
+    sampled noise matches the scatter of the residuals"""
+    x, y, result = arc
+    chain = confitti.sample_conic_posterior(
+        x, y, result, nwalkers=32, steps=1500, burn=500, seed=1
+    )
+    assert chain.var_names == ["x0", "y0", "r0", "theta0", "__lnsigma"]
+    assert chain.fixed == {"eccentricity": 1.0}
+    assert chain.samples.shape == (1000, 32, 5)
+    assert 0.2 < np.mean(chain.acceptance_fraction) < 0.8
+    median, std = chain.median(), chain.std()
+    for k in ["x0", "y0", "r0", "theta0"]:
+        p = result.params[k]
+        assert median[k] == pytest.approx(p.value, abs=0.5 * p.stderr)
+        assert std[k] == pytest.approx(p.stderr, rel=0.3)
+    rms = np.sqrt(np.mean(result.residual**2))
+    assert np.exp(median["__lnsigma"]) == pytest.approx(rms, rel=0.2)
+    P = chain.params_array()
+    assert P.shape == (len(chain), 5)
+    assert np.all(P[:, 4] == 1.0)
+
+
+def test_posterior_log_probability(arc):
+    """The vectorized log probability is that of gaussian residuals,
+    and is zero outside the bounds"""
+    x, y, result = arc
+    eps = np.full(len(x), 0.02)
+    chain = confitti.sample_conic_posterior(
+        x, y, result, eps_data=eps, nwalkers=10, steps=20, seed=2
+    )
+    assert "__lnsigma" not in chain.var_names
+    P = chain.params_array()
+    for i in [0, len(P) // 2, len(P) - 1]:
+        r = confitti.conic_residual(P[i], x, y, eps)
+        assert chain.lnprob.reshape(-1)[i] == pytest.approx(-0.5 * np.sum(r**2))
+    params = result.params.copy()
+    params["r0"].set(max=params["r0"].value)
+    chain = confitti.sample_conic_posterior(
+        x, y, params, eps_data=eps, nwalkers=10, steps=50, seed=3
+    )
+    assert np.all(chain.params_array()[:, 2] <= params["r0"].value)
+
+
+def test_posterior_seed(arc):
+    x, y, result = arc
+    kws = dict(nwalkers=10, steps=30, thin=3, seed=4)
+    a = confitti.sample_conic_posterior(x, y, result, **kws)
+    b = confitti.sample_conic_posterior(x, y, result, **kws)
+    assert a.samples.shape == (10, 10, 5)
+    np.testing.assert_array_equal(a.samples, b.samples)
+
+
+def _arcs(rng, n):
+    datasets, fits = [], []
+    for _ in range(n):
+        x, y, _ = conic_points(rng, 30, rng.uniform(0.0, 360.0))
+        datasets.append((x, y))
+        fits.append(confitti.fit_conic_to_xy(x, y))
+    return datasets, fits
+
+
+def test_chain_store_round_trip(tmp_path, arc):
+    x, y, result = arc
+    chain = confitti.sample_conic_posterior(x, y, result, nwalkers=10, steps=20, seed=5)
+    store = confitti.ChainStore(tmp_path / "chains")
+    store.append(3, chain)
+    with pytest.raises(ValueError):
+        store.append(3, chain)
+    # A file left by a crash in the middle of saving is ignored
+    (tmp_path / "chains" / "4.npz.123.tmp").write_bytes(b"partial")
+    reopened = confitti.ChainStore(tmp_path / "chains")
+    assert list(reopened) == [3]
+    assert 4 not in reopened
+    copy = reopened[3]
+    np.testing.assert_array_equal(copy.samples, chain.samples)
+    np.testing.assert_array_equal(copy.lnprob, chain.lnprob)
+    assert copy.var_names == chain.var_names
+    assert copy.fixed == chain.fixed
+    with pytest.raises(KeyError):
+        reopened[4]
+
+
+def test_resume_sampling(tmp_path, rng):
+    """A run that stopped part way through is resumed by repeating the
+    call, which samples only the missing arcs, with the same chains as
+    a run without the interruption"""
+    datasets, fits = _arcs(rng, 4)
+    kws = dict(nwalkers=10, steps=20, seed=10, workers=1)
+    full = dict(confitti.sample_conic_posteriors(datasets, fits, **kws))
+    assert sorted(full) == [0, 1, 2, 3]
+    store = confitti.ChainStore(tmp_path)
+    run = confitti.sample_conic_posteriors(datasets, fits, store=store, **kws)
+    next(run)
+    next(run)
+    run.close()
+    assert len(store) == 2
+    resumed = dict(
+        confitti.sample_conic_posteriors(datasets, fits, store=tmp_path, **kws)
+    )
+    assert sorted(resumed) == [2, 3]
+    store = confitti.ChainStore(tmp_path)
+    assert list(store) == [0, 1, 2, 3]
+    for index in store:
+        np.testing.assert_array_equal(store[index].samples, full[index].samples)
+
+
+def test_sampling_executor(rng):
+    """Chains run on a shared pool are the same as serial ones"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    datasets, fits = _arcs(rng, 3)
+    kws = dict(nwalkers=10, steps=20, seed=20)
+    serial = dict(confitti.sample_conic_posteriors(datasets, fits, workers=1, **kws))
+    with ThreadPoolExecutor(2) as executor:
+        pooled = list(
+            confitti.sample_conic_posteriors(
+                datasets, fits, executor=executor, ordered=True, **kws
+            )
+        )
+    assert [index for index, _ in pooled] == [0, 1, 2]
+    for index, chain in pooled:
+        np.testing.assert_array_equal(chain.samples, serial[index].samples)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import confitti
+from confitti.confitti import _stratified_subsample
+from conftest import conic_points
+
+
+def test_stratified_subsample(rng):
+    """One point from each of size equal strata in angle along the arc"""
+    x, y, _ = conic_points(rng, 1000)
+    index = _stratified_subsample(x, y, 50, rng)
+    assert len(index) == 50
+    assert np.all(np.diff(index) > 0)
+    th = np.arctan2(y - np.mean(y), x - np.mean(x))
+    rank = np.argsort(np.argsort(th))
+    np.testing.assert_array_equal(np.sort(rank[index]) // 20, np.arange(50))
+
+
+@pytest.mark.parametrize("eccentricity, only_parabola", [(1.0, True), (0.7, False)])
+def test_subsample_matches_full_fit(rng, eccentricity, only_parabola):
+    """The final stage is a fit to all the points, so the result is the
+    same as a single fit, well within the uncertainties, with fewer
+    evaluations on all the points"""
+    x, y, _ = conic_points(rng, 20000, 30.0, eccentricity)
+    eps = rng.uniform(0.01, 0.03, len(x))
+    full = confitti.fit_conic_to_xy(x, y, eps, only_parabola=only_parabola)
+    staged = confitti.fit_conic_to_xy(
+        x, y, eps, only_parabola=only_parabola, subsample=200, seed=1
+    )
+    for k, p in full.params.items():
+        if p.vary:
+            assert staged.params[k].value == pytest.approx(p.value, abs=0.01 * p.stderr)
+    assert staged.chisqr == pytest.approx(full.chisqr, rel=1e-6)
+    assert staged.nfev <= full.nfev
+    again = confitti.fit_conic_to_xy(
+        x, y, eps, only_parabola=only_parabola, subsample=200, seed=1
+    )
+    assert again.params.valuesdict() == staged.params.valuesdict()
+
+
+def test_subsample_larger_than_data(rng):
+    """A subsample that is not smaller than the data is a single fit"""
+    x, y, _ = conic_points(rng, 100)
+    full = confitti.fit_conic_to_xy(x, y)
+    staged = confitti.fit_conic_to_xy(x, y, subsample=100)
+    assert staged.params.valuesdict() == full.params.valuesdict()
+    assert staged.nfev == full.nfev
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+import confitti
+
+
+def _arc(rng, epoch, eccentricity=1.0, npts=50, noise=0.02):
+    """An arc whose focus, scale and orientation change slowly"""
+    x0, y0 = 1.0 + 0.02 * epoch, -2.0 + 0.01 * epoch
+    r0, theta0 = 1.0 + 0.01 * epoch, 40.0 + epoch
+    e = eccentricity
+    thmax = np.pi if e < 1 else np.pi - np.arctan(np.sqrt(e**2 - 1))
+    th = np.sort(rng.uniform(-0.6 * thmax, 0.6 * thmax, npts))
+    r = r0 * (1 + e) / (1 + e * np.cos(th))
+    phi = np.deg2rad(theta0) + th
+    x = x0 + r * np.cos(phi) + noise * rng.normal(size=npts)
+    y = y0 + r * np.sin(phi) + noise * rng.normal(size=npts)
+    return x, y
+
+
+@pytest.mark.parametrize("motion", [None, "linear"])
+@pytest.mark.parametrize("only_parabola", [True, False])
+def test_track_matches_cold_fits(rng, motion, only_parabola):
+    """Warm-started fits are as good as fits from scratch, with fewer
+    evaluations. General conics sometimes need a restart, since some
+    fits from a nearby start still run away."""
+    data = [_arc(rng, t, 1.0 if only_parabola else 0.8) for t in range(12)]
+    fits = list(
+        confitti.track_conics(data, motion=motion, only_parabola=only_parabola)
+    )
+    assert len(fits) == len(data)
+    nfev_warm = nfev_cold = 0
+    for fit, (x, y) in zip(fits, data):
+        cold = confitti.fit_conic_to_xy(x, y, only_parabola=only_parabola)
+        if only_parabola:
+            assert not fit.stats["restarted"]
+        assert fit.stats["chisqr"] <= cold.chisqr * (1 + 1e-4)
+        if not fit.stats["restarted"]:
+            nfev_warm += fit.stats["nfev"]
+            nfev_cold += cold.nfev
+    assert nfev_warm < nfev_cold
+
+
+def test_track_restarts_after_jump(rng):
+    """If the arc changes suddenly, the epoch is fitted again from
+    scratch"""
+    data = [_arc(rng, t) for t in range(4)]
+    x, y = _arc(rng, 0)
+    # The same arc turned through 180 degrees about the origin
+    data.append((-x, -y))
+    fits = list(confitti.track_conics(data))
+    assert [fit.stats["restarted"] for fit in fits] == [False] * 4 + [True]
+    cold = confitti.fit_conic_to_xy(-x, -y)
+    assert fits[-1].stats["chisqr"] == pytest.approx(cold.chisqr, rel=1e-4)
+
+
+def test_track_bad_start(rng):
+    """A poor starting guess for the first epoch is not kept"""
+    x, y = _arc(rng, 0)
+    start = {"x0": 1.0, "y0": -2.0, "r0": 1.0, "theta0": 220.0, "eccentricity": 1.0}
+    (fit,) = confitti.track_conics([(x, y)], start=start)
+    assert fit.stats["restarted"]
+    assert fit.params["theta0"] == pytest.approx(40.0, abs=3.0)
+
+
+def test_track_custom_motion(rng):
+    data = [_arc(rng, t) for t in range(4)]
+    shapes = []
+
+    def motion(history):
+        shapes.append(history.shape)
+        return history[-1]
+
+    fits = list(confitti.track_conics(data, motion=motion))
+    assert shapes == [(1, 5), (2, 5), (3, 5)]
+    assert not any(fit.stats["restarted"] for fit in fits)
+
+
+def test_track_unknown_motion():
+    with pytest.raises(ValueError):
+        list(confitti.track_conics([], motion="quadratic"))
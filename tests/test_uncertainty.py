@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import confitti
+from conftest import conic_points
+
+P = np.array([1.0, -2.0, 1.0, 60.0, 1.5])
+COV = np.diag([0.02, 0.02, 0.02, 2.0, 0.01]) ** 2
+PROPAGATE = [confitti.propagate_linear, confitti.propagate_unscented]
+
+
+def _monte_carlo(mean, cov, n=400000, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = rng.multivariate_normal(mean, cov, size=n)
+    return confitti.conic_derived_quantities(samples)
+
+
+@pytest.mark.parametrize("propagate", PROPAGATE)
+def test_linear_function_is_exact(propagate):
+    a = np.array([1.0, -2.0, 0.5, 0.1, 3.0])
+    cov = COV + 1e-4 * np.ones((5, 5))
+    values, uvalues = propagate(P, cov, func=lambda P: {"f": P @ a})
+    assert values["f"] == pytest.approx(P @ a)
+    assert uvalues["f"] == pytest.approx(np.sqrt(a @ cov @ a))
+
+
+@pytest.mark.parametrize("propagate", PROPAGATE)
+def test_matches_monte_carlo(propagate):
+    """For small uncertainties, both methods agree with the scatter of
+    the derived quantities of samples from the covariance"""
+    samples = _monte_carlo(P, COV)
+    values, uvalues = propagate(P, COV)
+    for k, v in samples.items():
+        assert values[k] == pytest.approx(np.mean(v), abs=0.1 * np.std(v))
+        assert uvalues[k] == pytest.approx(np.std(v), rel=0.02)
+
+
+def test_unscented_mean_of_nonlinear_quantity():
+    """With a poorly constrained eccentricity, the mirror point depends
+    nonlinearly on the parameters, and the unscented mean is much
+    closer to the true mean than the value at the best fit"""
+    p = np.array([1.0, -2.0, 1.0, 60.0, 0.8])
+    cov = np.diag([0.02, 0.02, 0.02, 2.0, 0.1]) ** 2
+    mean = np.mean(_monte_carlo(p, cov)["x_mirror"])
+    linear, _ = confitti.propagate_linear(p, cov)
+    unscented, _ = confitti.propagate_unscented(p, cov)
+    assert abs(unscented["x_mirror"] - mean) < 0.1 * abs(linear["x_mirror"] - mean)
+
+
+@pytest.mark.parametrize("propagate", PROPAGATE)
+def test_fit_result_with_fixed_eccentricity(rng, propagate):
+    """A parabola fit has zero variance for the eccentricity, so the
+    asymptotic angle is exact, rather than undefined"""
+    x, y, _ = conic_points(rng, 50, 30.0)
+    fit = confitti.ConicFitResult(confitti.fit_conic_to_xy(x, y))
+    values, uvalues = propagate(fit)
+    assert values["theta_inf"] == pytest.approx(180.0)
+    assert uvalues["theta_inf"] == 0.0
+    assert values["x_apex"] == pytest.approx(fit.xy.x_apex, rel=1e-4)
+    assert 0.0 < uvalues["x_apex"] < 0.1
+    with pytest.raises(ValueError):
+        propagate(confitti.ConicFitResult())
+
+
+@pytest.mark.parametrize("propagate", PROPAGATE)
+def test_catalog(rng, propagate):
+    """A whole catalog at once gives the same as each fit on its own"""
+    fits = []
+    for theta0 in [20.0, 150.0, 280.0]:
+        x, y, _ = conic_points(rng, 40, theta0)
+        fits.append(confitti.ConicFitResult(confitti.fit_conic_to_xy(x, y)))
+    catalog = confitti.ConicFitCatalog.from_results(fits)
+    values, uvalues = propagate(catalog)
+    assert values["x_apex"].shape == uvalues["x_apex"].shape == (3,)
+    for i, fit in enumerate(fits):
+        single, usingle = propagate(fit)
+        for k in single:
+            assert values[k][i] == pytest.approx(single[k])
+            assert uvalues[k][i] == pytest.approx(usingle[k])
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import confitti
+
+# An ellipse, a parabola and a hyperbola
+P = np.array(
+    [
+        [0.0, 1.0, 0.5, 10.0, 0.6],
+        [-2.0, 3.0, 1.5, 200.0, 1.0],
+        [4.0, -1.0, 2.0, 300.0, 1.8],
+    ]
+)
+
+
+# XYconic warns about the points at infinity at the ends of a parabola
+@pytest.mark.filterwarnings("ignore:divide by zero")
+def test_matches_single_curves():
+    conics = confitti.XYconics(P, npts=50)
+    assert len(conics) == 3
+    assert conics.x_pts.shape == conics.y_pts.shape == (3, 50)
+    for i, p in enumerate(P):
+        conic = confitti.XYconic(*p, npts=50)
+        for name in ["x_apex", "y_apex", "x_mirror", "y_mirror", "theta_max"]:
+            assert getattr(conics, name)[i] == pytest.approx(getattr(conic, name))
+        np.testing.assert_allclose(conics.theta_pts[i], conic.theta_pts)
+        np.testing.assert_allclose(conics.x_pts[i], conic.x_pts)
+        np.testing.assert_allclose(conics.y_pts[i], conic.y_pts)
+        single = conics[i]
+        assert isinstance(single, confitti.XYconic)
+        assert single.eccentricity == p[4]
+
+
+def test_sample():
+    conics = confitti.XYconics(P)
+    theta = np.linspace(-1.0, 1.0, 7)
+    x, y = conics.sample(theta)
+    assert x.shape == (3, 7)
+    # Different angles for each curve
+    x2, y2 = conics.sample(np.stack([theta, 0.5 * theta, -theta]))
+    for i, (p, scale) in enumerate(zip(P, [1.0, 0.5, -1.0])):
+        conic = confitti.XYconic(*p)
+        np.testing.assert_allclose((x[i], y[i]), conic.sample(theta))
+        np.testing.assert_allclose((x2[i], y2[i]), conic.sample(scale * theta))
+    # The points satisfy r = e d for the conic
+    for i, p in enumerate(P):
+        assert np.abs(confitti.conic_residual(p, x[i], y[i])).max() < 1e-12
+
+
+def test_parameter_formats():
+    """The same curves from any of the supported containers"""
+    columns = dict(zip(confitti.PARAM_NAMES, P.T))
+    expected = confitti.XYconics(P)
+    records = [dict(zip(confitti.PARAM_NAMES, p)) for p in P]
+    catalog = confitti.ConicFitCatalog(P.T)
+    for params in [columns, records, catalog]:
+        conics = confitti.XYconics(params)
+        np.testing.assert_array_equal(conics.x_pts, expected.x_pts)
+        np.testing.assert_array_equal(conics.y_pts, expected.y_pts)
+
+
+def test_fixed_parameters():
+    """Parameters that are missing, such as the eccentricity of a
+    parabola chain, are given as keywords"""
+    samples = P[None, :, :4]
+    chain = confitti.ConicChain(
+        samples,
+        np.zeros(samples.shape[:2]),
+        np.ones(3),
+        confitti.PARAM_NAMES[:4],
+        {"eccentricity": 1.0},
+    )
+    from_chain = confitti.XYconics(chain)
+    assert np.all(from_chain.eccentricity == 1.0)
+    columns = {k: P[:, i] for i, k in enumerate(confitti.PARAM_NAMES[:4])}
+    from_columns = confitti.XYconics(columns, eccentricity=1.0)
+    np.testing.assert_array_equal(from_columns.x_pts, from_chain.x_pts)
+    with pytest.raises(KeyError):
+        confitti.XYconics(columns)